@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
 
 
 class OrganizationResponse(BaseModel):
@@ -29,4 +31,14 @@ class Auth0User(BaseModel):
     name: str
 
 class OrganizationInvite(BaseModel):
-    email_id: str
\ No newline at end of file
+    email_id: str
+
+
+class OrganizationBulkInvite(BaseModel):
+    email_ids: List[str] = Field(min_length=1, max_length=100)
+
+
+class OrganizationInviteResult(BaseModel):
+    email_id: str
+    invited: bool
+    detail: Optional[str] = None
@@ -1,4 +1,5 @@
 import datetime
+import enum
 from typing import Optional
 from pydantic import BaseModel
 
@@ -25,4 +26,41 @@ class PublicService(BaseModel):
 class PublicStatus(BaseModel):
     organization: OrganizationResponse
     public_services: list[PublicService]
-    incidents: list[IncidentRead]
\ No newline at end of file
+    incidents: list[IncidentRead]
+
+class PublicStatusFormat(str, enum.Enum):
+    DEFAULT = "default"  # uptime_history as one object per day
+    COMPACT_V1 = "compact-v1"  # uptime_history as columnar arrays, see CompactUptimeHistory
+
+
+# Media types clients can ask for in Accept instead of the format query parameter
+PUBLIC_STATUS_MEDIA_TYPES = {
+    PublicStatusFormat.DEFAULT: "application/json",
+    PublicStatusFormat.COMPACT_V1: "application/vnd.statuspage.compact-v1+json",
+}
+
+
+class CompactUptimeHistory(BaseModel):
+    """Day i is start_date + i days, status holds indexes into CompactPublicStatus.status_codes"""
+    start_date: datetime.date
+    downtime_seconds: list[float]
+    status: list[int]
+
+
+class CompactPublicService(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    current_status: ServiceStatus
+    latest_incident_message: Optional[str] = None
+    latest_incident_status: Optional[IncidentStatus] = None
+    uptime_history: CompactUptimeHistory
+
+
+class CompactPublicStatus(BaseModel):
+    format: PublicStatusFormat = PublicStatusFormat.COMPACT_V1
+    # Status of every code used in uptime_history.status, ordered by severity
+    status_codes: list[ServiceStatus]
+    organization: OrganizationResponse
+    public_services: list[CompactPublicService]
+    incidents: list[IncidentRead]
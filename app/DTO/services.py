@@ -50,3 +50,16 @@ class ServiceResponse(BaseModel):
 class ServiceWithHistoryResponse(ServiceResponse):
     status_history: List[StatusHistoryResponse] = []
     uptime_percentage: Optional[float] = None
+
+
+class ServiceUptimeResponse(BaseModel):
+    service_id: int
+    name: str
+    start: datetime
+    end: datetime
+    # Any non-operational status counts as downtime
+    uptime_percentage: float
+    downtime_seconds: float
+    # Degraded time counts as 50% downtime, maintenance doesn't count
+    weighted_uptime_percentage: float
+    weighted_downtime_seconds: float
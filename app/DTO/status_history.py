@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.db.models import ServiceStatus
 
@@ -22,3 +23,23 @@ class StatusHistoryCreate(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class StatusSample(BaseModel):
+    service_id: int
+    status: ServiceStatus
+    # When the monitor saw the status, defaults to the time the batch is received
+    observed_at: Optional[datetime] = None
+
+
+class StatusSampleBatch(BaseModel):
+    samples: List[StatusSample] = Field(..., min_length=1, max_length=10000)
+
+
+class StatusIngestResponse(BaseModel):
+    received: int
+    written: int
+    unchanged: int  # Same status as the service already had
+    stale: int  # Observed before the service's last status change
+    unknown_service_ids: List[int] = []
+    updated_service_ids: List[int] = []
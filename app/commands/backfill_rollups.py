@@ -0,0 +1,41 @@
+"""
+Rebuilds the daily downtime rollups from raw status history.
+
+Usage:
+    python -m app.commands.backfill_rollups [--org <org_slug>] [--days 90]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.db.database import get_async_db
+from app.db.models import Organization
+from app.services.rollup import StatusRollupCRUD
+
+
+async def backfill(org_slug: str, days: int):
+    async with get_async_db() as db:
+        organization_id = None
+        if org_slug:
+            org = (await db.execute(select(Organization).filter(Organization.name == org_slug,
+                                                                Organization.is_deleted == False))).scalars().first()
+            if not org:
+                raise SystemExit(f"Organization {org_slug} not found")
+            organization_id = org.organization_id
+
+        count = await StatusRollupCRUD().backfill(db, organization_id=organization_id, days=days)
+    print(f"Backfilled rollups for {count} services over the last {days} days")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill service daily downtime rollups")
+    parser.add_argument("--org", help="Organization slug to backfill, defaults to every organization")
+    parser.add_argument("--days", type=int, default=90, help="Number of days to rebuild")
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.org, args.days))
+
+
+if __name__ == "__main__":
+    main()
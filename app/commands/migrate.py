@@ -0,0 +1,35 @@
+"""
+Applies pending schema migrations.
+
+Usage:
+    python -m app.commands.migrate [--target <version>] [--list]
+"""
+import argparse
+import logging
+
+from app.db.database import engine
+from app.db.migrations import applied_versions, discover, run_migrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--target", type=int, help="Stop after this version, defaults to the latest")
+    parser.add_argument("--list", action="store_true", help="Show every migration and whether it is applied")
+    args = parser.parse_args()
+    # Progress of run_migrations is logged
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.list:
+        with engine.begin() as conn:
+            applied = applied_versions(conn)
+        for migration in discover():
+            state = "applied" if migration.version in applied else "pending"
+            print(f"{migration.version:04d} {state:<8} {migration.description}")
+        return
+
+    migrations = run_migrations(engine, target=args.target)
+    print(f"Applied {len(migrations)} migrations" if migrations else "Database schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Maintains the monthly status_history partitions, meant to run daily from cron.
+
+Usage:
+    python -m app.commands.partitions ensure [--months-ahead 3] [--keep-months 12]
+    python -m app.commands.partitions archive [--keep-months 12] [--dir ./archive]
+"""
+import argparse
+import logging
+
+from app.config import settings
+from app.db.database import engine
+from app.db.partitions import archive_partitions, ensure_partitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage status_history partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ensure = commands.add_parser("ensure", help="Create the upcoming and retained monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=3, help="Months to create past the current one")
+    ensure.add_argument("--keep-months", type=int, default=settings.STATUS_HISTORY_RETENTION_MONTHS,
+                        help="Months to create before the current one, samples up to that old are accepted")
+
+    archive = commands.add_parser("archive", help="Detach, export and drop partitions past the retention")
+    archive.add_argument("--keep-months", type=int, default=settings.STATUS_HISTORY_RETENTION_MONTHS,
+                         help="Months of status history kept in the database, besides the current one")
+    archive.add_argument("--dir", default=settings.STATUS_HISTORY_ARCHIVE_DIR, help="Directory for the .csv.gz files")
+    args = parser.parse_args()
+    # Progress of archive_partitions is logged
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "ensure":
+        created = ensure_partitions(engine, months_ahead=args.months_ahead, keep_months=args.keep_months)
+        print(f"Created partitions: {', '.join(created)}" if created else "Partitions are up to date")
+    else:
+        archived = archive_partitions(engine, keep_months=args.keep_months, directory=args.dir)
+        print(f"Archived {len(archived)} partitions")
+
+
+if __name__ == "__main__":
+    main()
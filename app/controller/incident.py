@@ -15,21 +15,21 @@ incident_crud = IncidentService()
 async def create_incident(request: Request, background_tasks: BackgroundTasks, data: IncidentCreate):
     user = request.state.user
     organization = request.state.organization
-    return incident_crud.create_incident(data, user, organization, background_tasks)
+    return await incident_crud.create_incident(data, user, organization, background_tasks)
 
 
 @router.get("/", response_model=List[IncidentRead])
-def list_incidents(request: Request, resolved: str = Query(default="none")):
+async def list_incidents(request: Request, resolved: str = Query(default="none")):
     user = request.state.user
     organization = request.state.organization
-    return incident_crud.get_all_incidents(resolved, user, organization)
+    return await incident_crud.get_all_incidents(resolved, user, organization)
 
 
 @router.get("/{incident_id}", response_model=IncidentResponse)
-def get_incident(request: Request, incident_id: int):
+async def get_incident(request: Request, incident_id: int):
     user = request.state.user
     organization = request.state.organization
-    incident = incident_crud.get_incident(incident_id, user, organization)
+    incident = await incident_crud.get_incident(incident_id, user, organization)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return incident
@@ -40,17 +40,17 @@ async def update_incident(request: Request, background_tasks: BackgroundTasks, i
                           updates: IncidentUpdateRequest):
     user = request.state.user
     organization = request.state.organization
-    incident = incident_crud.update_incident(incident_id, updates, user, organization, background_tasks)
+    incident = await incident_crud.update_incident(incident_id, updates, user, organization, background_tasks)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return incident
 
 
 @router.delete("/{incident_id}")
-def delete_incident(request: Request, background_tasks: BackgroundTasks, incident_id: int):
+async def delete_incident(request: Request, background_tasks: BackgroundTasks, incident_id: int):
     user = request.state.user
     organization = request.state.organization
-    incident = incident_crud.delete_incident(incident_id, user, organization, background_tasks)
+    incident = await incident_crud.delete_incident(incident_id, user, organization, background_tasks)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return {"detail": "Incident deleted"}
@@ -58,14 +58,14 @@ def delete_incident(request: Request, background_tasks: BackgroundTasks, inciden
 
 # Incident Updates
 @router.post("/updates", response_model=IncidentUpdateRead)
-def create_update(request: Request, background_tasks: BackgroundTasks, data: IncidentUpdateCreate):
+async def create_update(request: Request, background_tasks: BackgroundTasks, data: IncidentUpdateCreate):
     user = request.state.user
     organization = request.state.organization
-    return incident_crud.create_incident_update(data, user, organization, background_tasks)
+    return await incident_crud.create_incident_update(data, user, organization, background_tasks)
 
 
 @router.get("/{incident_id}/updates", response_model=List[IncidentUpdateRead])
-def get_updates(request: Request, incident_id: int):
+async def get_updates(request: Request, incident_id: int):
     user = request.state.user
     organization = request.state.organization
-    return incident_crud.get_incident_updates(incident_id, user, organization)
+    return await incident_crud.get_incident_updates(incident_id, user, organization)
@@ -1,7 +1,10 @@
+from typing import List
+
 from fastapi import APIRouter, status, Request
 
-from app.DTO.organization import OrganizationResponse, OrganizationCreate, OrganizationInvite
-from app.core.auth import Auth0Manager
+from app.DTO.organization import OrganizationResponse, OrganizationCreate, OrganizationInvite, \
+    OrganizationBulkInvite, OrganizationInviteResult
+from app.core.auth import auth0_manager
 from app.db.models import Organization, User
 from app.db.database import get_db
 from app.utils.utils import slugify, get_username_from_email
@@ -12,8 +15,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-auth0_manager = Auth0Manager()
-
 
 @router.post("", response_model=OrganizationResponse, status_code=status.HTTP_201_CREATED)
 async def create_organization(request: Request, org_in: OrganizationCreate):
@@ -21,7 +22,6 @@ async def create_organization(request: Request, org_in: OrganizationCreate):
     Create a new organization and add the current user as a member.
     This is the entry point for new users in the system.
     """
-    await auth0_manager.initialize()
     org_name = slugify(org_in.org_name)
     display_name = org_in.org_name
     user_name = get_username_from_email(org_in.email_id)
@@ -63,8 +63,14 @@ async def invite_user_to_organization(request: Request, invite_in: OrganizationI
     organization = request.state.organization
     user = request.state.user
 
-    await auth0_manager.initialize()
-
     print("Inviting the users to organization", organization.auth0_org_id)
     await auth0_manager.invite_user_to_organization(invite_in.email_id, user, organization)
 
+
+@router.post("/invite/bulk", response_model=List[OrganizationInviteResult], status_code=status.HTTP_200_OK)
+async def invite_users_to_organization(request: Request, invite_in: OrganizationBulkInvite):
+    organization = request.state.organization
+    user = request.state.user
+
+    print(f"Inviting {len(invite_in.email_ids)} users to organization", organization.auth0_org_id)
+    return await auth0_manager.invite_users_to_organization(invite_in.email_ids, user, organization)
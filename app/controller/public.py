@@ -1,7 +1,10 @@
-from fastapi import APIRouter,Request
+from typing import Optional
 
+from fastapi import APIRouter, Query, Request, Response, status
+
+from app.core.cache import etag_matches
 from app.services.public import PublicStatusCRUD
-from app.DTO.public import PublicStatus
+from app.DTO.public import PublicStatus, PublicStatusFormat, PUBLIC_STATUS_MEDIA_TYPES
 
 router = APIRouter(
     prefix="/public",
@@ -11,7 +14,36 @@ router = APIRouter(
 
 public_status = PublicStatusCRUD()
 
-@router.get("/{org_slug}", response_model=PublicStatus)
-async def get_public_services(org_slug: str):
-    response = public_status.get_status(org_slug=org_slug)
-    return response
+
+def negotiate_format(accept: Optional[str], fmt: Optional[PublicStatusFormat]) -> PublicStatusFormat:
+    """The format query parameter wins over Accept, clients asking for neither get the default shape"""
+    if fmt:
+        return fmt
+    media_types = {media_range.split(";")[0].strip().lower() for media_range in (accept or "").split(",")}
+    for candidate, media_type in PUBLIC_STATUS_MEDIA_TYPES.items():
+        if candidate != PublicStatusFormat.DEFAULT and media_type in media_types:
+            return candidate
+    return PublicStatusFormat.DEFAULT
+
+
+@router.get("/{org_slug}", response_model=PublicStatus, responses={
+    200: {"content": {PUBLIC_STATUS_MEDIA_TYPES[PublicStatusFormat.COMPACT_V1]: {}},
+          "description": "PublicStatus, or CompactPublicStatus with format=compact-v1 or the compact media type "
+                         "in Accept"},
+    304: {"description": "Not modified"},
+})
+async def get_public_services(
+        request: Request,
+        org_slug: str,
+        fmt: Optional[PublicStatusFormat] = Query(None, alias="format",
+                                                  description="Response format, overrides the Accept header"),
+):
+    fmt = negotiate_format(request.headers.get("accept"), fmt)
+    snapshot = await public_status.get_snapshot(org_slug=org_slug, fmt=fmt)
+    # The body depends on Accept, shared caches must not hand one format to clients asking for another
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=snapshot.body, media_type=PUBLIC_STATUS_MEDIA_TYPES[fmt], headers=headers)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, HTTPException, status, Query, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 
 from app.DTO.services import (
@@ -6,10 +8,13 @@ from app.DTO.services import (
     ServiceWithHistoryResponse,
     ServiceCreate,
     ServiceUpdate,
-    ServiceStatusUpdate
+    ServiceStatusUpdate,
+    ServiceUptimeResponse,
 )
-from app.DTO.status_history import StatusHistoryRead, StatusHistoryCreate
+from app.DTO.status_history import StatusHistoryRead, StatusHistoryCreate, StatusSampleBatch, StatusIngestResponse
+from app.core.responses import ORJSONResponse
 from app.services.services import ServiceCRUD
+from app.utils.utils import decode_cursor, encode_cursor, ensure_utc
 
 router = APIRouter(
     prefix="/services",
@@ -21,27 +26,29 @@ service_crud = ServiceCRUD()
 
 
 @router.get("/", response_model=List[ServiceWithHistoryResponse])
-def get_services(request: Request):
+async def get_services(request: Request):
     """Get services for the current user"""
     user = request.state.user
     organization = request.state.organization
-    services = service_crud.get_services(
+    services = await service_crud.get_services(
         user=user,
         organization=organization
     )
 
-    return services
+    # Trusted models, serialized by orjson without running them through response_model again
+    return ORJSONResponse(services)
 
 
 @router.post("/", response_model=Optional[ServiceResponse], status_code=status.HTTP_201_CREATED)
-def create_service(request: Request, background_tasks: BackgroundTasks, service_in: ServiceCreate):
+async def create_service(request: Request, background_tasks: BackgroundTasks, service_in: ServiceCreate):
     """Create a new service"""
 
     user = request.state.user
     organization = request.state.organization
     try:
-        service_response = service_crud.create_service(service_in=service_in, user=user, organization=organization,
-                                                       background_tasks=background_tasks)
+        service_response = await service_crud.create_service(service_in=service_in, user=user,
+                                                             organization=organization,
+                                                             background_tasks=background_tasks)
         return service_response
     except ValueError as e:
         raise HTTPException(
@@ -50,14 +57,52 @@ def create_service(request: Request, background_tasks: BackgroundTasks, service_
         )
 
 
+@router.post("/status/batch", response_model=StatusIngestResponse)
+async def ingest_status_samples(request: Request, background_tasks: BackgroundTasks, batch: StatusSampleBatch):
+    """Apply a batch of status samples from automated monitors"""
+    user = request.state.user
+    organization = request.state.organization
+
+    return await service_crud.ingest_status_samples(samples=batch.samples, user=user, organization=organization,
+                                                    background_tasks=background_tasks)
+
+
+@router.get("/uptime", response_model=List[ServiceUptimeResponse])
+async def get_services_uptime(
+        request: Request,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        days: int = Query(30, ge=1, le=3650),
+        service_ids: Optional[List[int]] = Query(None),
+):
+    """Uptime of many services over a custom range, defaults to the last `days` days"""
+    user = request.state.user
+    organization = request.state.organization
+
+    end = ensure_utc(end) if end else None
+    start = ensure_utc(start) if start else (end or datetime.now(timezone.utc)) - timedelta(days=days)
+    if end is not None and end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must be after start"
+        )
+
+    return await service_crud.get_services_uptime(start=start, end=end, service_ids=service_ids, user=user,
+                                                  organization=organization)
+
+
 @router.get("/{service_id}", response_model=ServiceWithHistoryResponse)
-async def get_service(request: Request, background_tasks: BackgroundTasks, service_id: int):
-    """Get service by ID with status history"""
+async def get_service(
+        request: Request,
+        service_id: int,
+        history_limit: int = Query(10, ge=0, le=100, description="Latest status changes to include"),
+):
+    """Get service by ID with its latest status history"""
     user = request.state.user
     organization = request.state.organization
 
-    service = service_crud.get_service(service_id=service_id, user=user, organization=organization,
-                                       background_tasks=background_tasks)
+    service = await service_crud.get_service(service_id=service_id, user=user, organization=organization,
+                                             history_limit=history_limit)
 
     return service
 
@@ -73,7 +118,7 @@ async def update_service(
     user = request.state.user
     organization = request.state.organization
 
-    service_response = service_crud.update_service(
+    service_response = await service_crud.update_service(
         service_id=service_id,
         service_in=service_in,
         user=user,
@@ -102,7 +147,7 @@ async def update_service_status(
     user = request.state.user
     organization = request.state.organization
 
-    service_response = service_crud.update_service_status(
+    service_response = await service_crud.update_service_status(
         service_id=service_id,
         status_update=status_update,
         user=user,
@@ -125,8 +170,8 @@ async def delete_service(request: Request, background_tasks: BackgroundTasks, se
     user = request.state.user
     organization = request.state.organization
 
-    success = service_crud.delete_service(service_id=service_id, user=user, organization=organization,
-                                          background_tasks=background_tasks)
+    success = await service_crud.delete_service(service_id=service_id, user=user, organization=organization,
+                                                background_tasks=background_tasks)
 
     if not success:
         raise HTTPException(
@@ -136,25 +181,17 @@ async def delete_service(request: Request, background_tasks: BackgroundTasks, se
 
 
 @router.get("/{service_id}/uptime", response_model=dict)
-def get_service_uptime(
+async def get_service_uptime(
         request: Request,
         service_id: int,
         days: int = Query(30, ge=1, le=365),
 ):
     """Get service uptime percentage for specified period"""
-    # Verify service access
-
     user = request.state.user
     organization = request.state.organization
 
-    service = service_crud.get_service(service_id=service_id, user=user, organization=organization)
-    if not service:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Service not found"
-        )
-
-    uptime_percentage = service_crud.get_service_uptime(
+    # Raises 404 when the service doesn't exist or belongs to another organization
+    uptime_percentage = await service_crud.get_service_uptime(
         service_id=service_id,
         days=days,
         user=user,
@@ -168,18 +205,46 @@ def get_service_uptime(
     }
 
 
-@router.get("/{service_id}/status-history", response_model=List[StatusHistoryRead])
-def list_status_history(request: Request, service_id: int):
+@router.get("/{service_id}/status-history", response_model=List[StatusHistoryRead],
+            responses={200: {"content": {"application/x-ndjson": {}},
+                             "description": "A page of rows, or every row as NDJSON when streamed"}})
+async def list_status_history(
+        request: Request,
+        response: Response,
+        service_id: int,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+        start: Optional[datetime] = Query(None, description="Only rows created at or after start"),
+        end: Optional[datetime] = Query(None, description="Only rows created before end"),
+        stream: bool = Query(False, description="Export every row in the range as NDJSON, ignores limit and cursor"),
+):
+    """Status history newest first, paged by keyset. The next page's cursor is sent in X-Next-Cursor"""
     user = request.state.user
     organization = request.state.organization
-    return service_crud.get_status_history_for_service(service_id, user, organization)
+    start, end = start and ensure_utc(start), end and ensure_utc(end)
+
+    if stream:
+        lines = await service_crud.stream_status_history(service_id, user, organization, start=start, end=end)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    try:
+        keyset = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    items, next_keyset = await service_crud.get_status_history_for_service(
+        service_id, user, organization, limit=limit, cursor=keyset, start=start, end=end)
+    if next_keyset:
+        response.headers["X-Next-Cursor"] = encode_cursor(*next_keyset)
+    return items
 
 
 @router.post("/status-history/", response_model=StatusHistoryRead)
-def add_status_history(
+async def add_status_history(
         request: Request,
+        background_tasks: BackgroundTasks,
         status: StatusHistoryCreate,
 ):
     user = request.state.user
     organization = request.state.organization
-    return service_crud.create_status_history(status, user, organization)
+    return await service_crud.create_status_history(status, user, organization, background_tasks)
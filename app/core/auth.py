@@ -1,134 +1,209 @@
 from fastapi import HTTPException
 from app.config import settings
-from app.DTO.organization import Auth0Organization, Auth0User
+from app.DTO.organization import Auth0Organization, Auth0User, OrganizationInviteResult
 from app.db.models import User, Organization
+from typing import List, Optional
+import asyncio
 import httpx
+import time
+
+# Management tokens are refreshed this long before Auth0 says they expire
+TOKEN_EXPIRY_MARGIN_SECONDS = 60
+
 
 class Auth0Manager:
+    """
+    Auth0 Management API client. One pooled HTTP client is kept for the life of the process
+    and the management token is reused until shortly before it expires.
+    """
+
     def __init__(self):
         self.domain = settings.AUTH0_DOMAIN
         self.client_id = settings.AUTH0_CLIENT_ID
         self.client_secret = settings.AUTH0_CLIENT_SECRET
         self.api_audience = settings.AUTH0_AUDIENCE
-        self.token = None
+        # Points at a local Auth0 stand-in when set
+        self.base_url = settings.AUTH0_API_BASE_URL or f"https://{self.domain}"
+        self.token: Optional[str] = None
+        self.token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=10,
+                limits=httpx.Limits(max_connections=settings.AUTH0_MAX_CONNECTIONS,
+                                    max_keepalive_connections=settings.AUTH0_MAX_CONNECTIONS),
+            )
+        return self._client
 
     async def initialize(self):
-        """Call this after creating the instance"""
-        self.token = await self.get_management_token()
+        """Fetches the management token ahead of the first call, optional"""
+        await self.get_token()
         return self
 
-    async def get_management_token(self) -> str:
-        """Get Management API access token"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"https://{settings.AUTH0_DOMAIN}/oauth/token",
-                    json={
-                        "client_id": self.client_id,
-                        "client_secret": self.client_secret,
-                        "audience": self.api_audience,
-                        "grant_type": "client_credentials"
-                    }
-                )
-                return response.json()["access_token"]
-        except Exception as e:
-            print(e)
-            return ""
+    async def get_token(self) -> str:
+        """Cached management token, only one caller fetches a new one when it is about to expire"""
+        if self.token and time.monotonic() < self.token_expires_at:
+            return self.token
 
-    async def create_organization(self, org_name: str, org_display_name: str) -> Auth0Organization:
-        token = self.token
+        async with self._token_lock:
+            # Another caller may have refreshed it while we waited for the lock
+            if self.token and time.monotonic() < self.token_expires_at:
+                return self.token
+
+            token, expires_in = await self.get_management_token()
+            if token:
+                self.token = token
+                self.token_expires_at = time.monotonic() + max(expires_in - TOKEN_EXPIRY_MARGIN_SECONDS, 0)
+            return token
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://{settings.AUTH0_DOMAIN}/api/v2/organizations",
-                headers={"Authorization": f"Bearer {token}", 'Content-Type': 'application/json'},
+    async def get_management_token(self) -> tuple[str, int]:
+        """Get Management API access token and its lifetime in seconds"""
+        try:
+            response = await self.client.post(
+                "/oauth/token",
                 json={
-                    "name": org_name,
-                    "display_name": org_display_name,
-                    "metadata": {
-                        "created_via": "fastAPI"
-                    },
-                    "enabled_connections": [
-                        {
-                            "connection_id": "con_YSVwsH8TW8qkt1Q2",
-                            "assign_membership_on_login": True,
-                            "show_as_button": True,
-                            "is_signup_enabled": True
-                        }
-                    ]
-                },
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "audience": self.api_audience,
+                    "grant_type": "client_credentials"
+                }
             )
             res = response.json()
-            if response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=res.get("message"))
-            print("Organization created", response.status_code, response.json())
-            return Auth0Organization(**res)
+            return res["access_token"], res.get("expires_in", 0)
+        except Exception as e:
+            print(e)
+            return "", 0
 
-    async def create_user(self, email: str, password: str, name: str) -> Auth0User:
-        token = self.token
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Management API call, retried once with a fresh token if Auth0 rejects the cached one"""
+        headers = {"Content-Type": "application/json", **kwargs.pop("headers", {})}
+        token = await self.get_token()
+        response = await self.client.request(method, url, headers={"Authorization": f"Bearer {token}", **headers},
+                                             **kwargs)
+        if response.status_code == 401:
+            if self.token == token:
+                self.token, self.token_expires_at = None, 0.0
+            token = await self.get_token()
+            response = await self.client.request(method, url, headers={"Authorization": f"Bearer {token}", **headers},
+                                                 **kwargs)
+        return response
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://{settings.AUTH0_DOMAIN}/api/v2/users",
-                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                json={
-                    "email": email,
-                    "password": password,
-                    "name": name,
-                    "nickname": name.lower(),
-                    "connection": "Username-Password-Authentication"
+    async def aclose(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def create_organization(self, org_name: str, org_display_name: str) -> Auth0Organization:
+        response = await self._request(
+            "POST",
+            "/api/v2/organizations",
+            json={
+                "name": org_name,
+                "display_name": org_display_name,
+                "metadata": {
+                    "created_via": "fastAPI"
                 },
-            )
-            res = response.json()
-            if response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=res.get("message"))
-            print("User created", response.status_code, response.json())
-            return Auth0User(**response.json())
+                "enabled_connections": [
+                    {
+                        "connection_id": "con_YSVwsH8TW8qkt1Q2",
+                        "assign_membership_on_login": True,
+                        "show_as_button": True,
+                        "is_signup_enabled": True
+                    }
+                ]
+            },
+        )
+        res = response.json()
+        if response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=res.get("message"))
+        print("Organization created", response.status_code, res)
+        return Auth0Organization(**res)
+
+    async def create_user(self, email: str, password: str, name: str) -> Auth0User:
+        response = await self._request(
+            "POST",
+            "/api/v2/users",
+            json={
+                "email": email,
+                "password": password,
+                "name": name,
+                "nickname": name.lower(),
+                "connection": "Username-Password-Authentication"
+            },
+        )
+        res = response.json()
+        if response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=res.get("message"))
+        print("User created", response.status_code, res)
+        return Auth0User(**res)
 
     async def add_user_to_organization(self, user_id: str, org_id: str):
         """Add user to organization with optional roles"""
-        token = self.token
+        # Add user to organization
+        response = await self._request(
+            "POST",
+            f"/api/v2/organizations/{org_id}/members",
+            json={
+                "members": [user_id],
+            }
+        )
+        if response.status_code != 204:
+            res = response.json()
+            raise HTTPException(status_code=response.status_code, detail=res.get("message"))
 
-        async with httpx.AsyncClient() as client:
-            # Add user to organization
-            response = await client.post(
-                f"https://{self.domain}/api/v2/organizations/{org_id}/members",
-                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                json={
-                    "members": [user_id],
-                }
-            )
-            if response.status_code != 204:
-                res = response.json()
-                raise HTTPException(status_code=response.status_code, detail=res.get("message"))
-
-            response = await client.post(
-                f"https://{self.domain}/api/v2/organizations/{org_id}/members/{user_id}/roles",
-                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                json={"roles": ["rol_0SNxlWyrpyXzGncw"]}
-            )
-            if response.status_code != 204:
-                res = response.json()
-                raise HTTPException(status_code=response.status_code, detail=res.get("message"))
+        response = await self._request(
+            "POST",
+            f"/api/v2/organizations/{org_id}/members/{user_id}/roles",
+            json={"roles": ["rol_0SNxlWyrpyXzGncw"]}
+        )
+        if response.status_code != 204:
+            res = response.json()
+            raise HTTPException(status_code=response.status_code, detail=res.get("message"))
 
     async def invite_user_to_organization(self, email_id: str, user: User, organization: Organization):
         """Invite user to organization with optional roles"""
-        token = self.token
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://{self.domain}/api/v2/organizations/{organization.auth0_org_id}/invitations",
-                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json", 'Accept': 'application/json'},
-                json={
-                    "inviter": {
-                        "name": user.name,
-                    },
-                    "invitee": {
-                        "email": email_id,
-                    },
-                    "client_id": settings.AUTH0_CLIENT_AUDIENCE,
-                    "send_invitation_email": True,
-                }
-            )
-            if response.status_code != 200:
-                res = response.json()
-                raise HTTPException(status_code=response.status_code, detail=res.get("message"))
+        response = await self._request(
+            "POST",
+            f"/api/v2/organizations/{organization.auth0_org_id}/invitations",
+            headers={'Accept': 'application/json'},
+            json={
+                "inviter": {
+                    "name": user.name,
+                },
+                "invitee": {
+                    "email": email_id,
+                },
+                "client_id": settings.AUTH0_CLIENT_AUDIENCE,
+                "send_invitation_email": True,
+            }
+        )
+        if response.status_code != 200:
+            res = response.json()
+            raise HTTPException(status_code=response.status_code, detail=res.get("message"))
+
+    async def invite_users_to_organization(self, email_ids: List[str], user: User,
+                                           organization: Organization) -> List[OrganizationInviteResult]:
+        """Sends the invitations concurrently, at most AUTH0_BULK_INVITE_CONCURRENCY at a time"""
+        semaphore = asyncio.Semaphore(settings.AUTH0_BULK_INVITE_CONCURRENCY)
+
+        async def invite(email_id: str) -> OrganizationInviteResult:
+            async with semaphore:
+                try:
+                    await self.invite_user_to_organization(email_id, user, organization)
+                    return OrganizationInviteResult(email_id=email_id, invited=True)
+                except HTTPException as e:
+                    return OrganizationInviteResult(email_id=email_id, invited=False, detail=e.detail)
+                except httpx.HTTPError as e:
+                    print(f"Inviting {email_id} failed", e)
+                    return OrganizationInviteResult(email_id=email_id, invited=False, detail=str(e))
+
+        # Duplicates would only send the same invitation twice
+        return await asyncio.gather(*(invite(email_id) for email_id in dict.fromkeys(email_ids)))
+
+
+auth0_manager = Auth0Manager()
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+
+
+@dataclass
+class CachedSnapshot:
+    auth0_org_id: str
+    body: bytes
+    etag: str
+    created_at: float
+
+
+class PublicStatusCache:
+    """
+    Serialized public status snapshots keyed by org slug and response format.
+    Entries are dropped whenever an event is broadcast for the organization and
+    expire after a short TTL so time based fields (ongoing downtime) keep moving.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple[str, str], CachedSnapshot] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation. Read before building a snapshot, which is only stored if its
+        # organization hasn't been invalidated since, events of other organizations don't matter
+        self.generation = 0
+        # auth0_org_id -> generation of its last invalidation
+        self._invalidated_at: Dict[str, int] = {}
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        return f'"{hashlib.sha256(body).hexdigest()}"'
+
+    def get(self, org_slug: str, fmt: str) -> Optional[CachedSnapshot]:
+        with self._lock:
+            snapshot = self._entries.get((org_slug, fmt))
+            if snapshot and snapshot.created_at + self.ttl_seconds < time.monotonic():
+                del self._entries[(org_slug, fmt)]
+                return None
+            return snapshot
+
+    def set(self, org_slug: str, fmt: str, auth0_org_id: str, body: bytes, generation: int) -> CachedSnapshot:
+        snapshot = CachedSnapshot(auth0_org_id=auth0_org_id, body=body, etag=self.make_etag(body),
+                                  created_at=time.monotonic())
+        with self._lock:
+            if self._invalidated_at.get(auth0_org_id, 0) <= generation:
+                self._entries[(org_slug, fmt)] = snapshot
+        return snapshot
+
+    def invalidate(self, auth0_org_id: str):
+        with self._lock:
+            self.generation += 1
+            self._invalidated_at[auth0_org_id] = self.generation
+            for key in [key for key, s in self._entries.items() if s.auth0_org_id == auth0_org_id]:
+                del self._entries[key]
+
+
+class TTLCache:
+    """Thread-safe LRU cache bounded by size whose entries expire after a TTL"""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]):
+        with self._lock:
+            for key in [k for k, (v, _) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+public_status_cache = PublicStatusCache(ttl_seconds=settings.PUBLIC_STATUS_CACHE_TTL_SECONDS)
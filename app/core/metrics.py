@@ -0,0 +1,166 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings, Environment
+
+# Flags statements of the same shape repeated inside one request (likely N+1), only in development
+DETECT_REPEATED_STATEMENTS = settings.DEBUG or settings.ENVIRONMENT == Environment.LOCAL
+
+# Bind placeholders of every DBAPI in use (?, $1, %(name)s), runs of them are expanded IN lists
+_PLACEHOLDERS = re.compile(r"(?:\?|\$\d+|%\(\w+\)s)(?:\s*,\s*(?:\?|\$\d+|%\(\w+\)s))*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement with every placeholder and IN list collapsed, equal for calls differing only in parameters"""
+    return _WHITESPACE.sub(" ", _PLACEHOLDERS.sub("?", statement)).strip()
+
+
+@dataclass
+class QueryStats:
+    """Database work of one request, filled by the engine events while the request runs"""
+    count: int = 0
+    seconds: float = 0.0
+    # (seconds, statement) of the slowest statements, slowest first
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if len(self.slowest) < settings.SQL_SLOWEST_STATEMENTS or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[settings.SQL_SLOWEST_STATEMENTS:]
+        if DETECT_REPEATED_STATEMENTS:
+            self.shapes[statement_shape(statement)] += 1
+
+    def repeated_statements(self) -> List[Tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count >= settings.SQL_REPEATED_STATEMENT_THRESHOLD]
+
+
+# Stats of the request being handled, None outside of requests (startup, cron commands)
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def instrument_engine(engine: Engine):
+    """Times every statement of the engine into the current request's QueryStats. Pass `.sync_engine` of async ones"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started_at"].pop()
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(statement, seconds)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        started_at = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+        if started_at:
+            started_at.pop()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Prometheus histogram with labels, rendered in the text exposition format"""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float],
+                 label_names: Sequence[str] = ("method", "route")):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.label_names = tuple(label_names)
+        # label values -> (count per bucket, sum, count)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, ([*counts], total, count)) for labels, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class CollectedMetric:
+    """Prometheus gauge or counter read from the app at scrape time, `collect` returns label values -> value"""
+
+    def __init__(self, name: str, documentation: str, kind: str, collect: Callable[[], Dict[Tuple[str, ...], float]],
+                 label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.collect = collect
+        self.label_names = tuple(label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self.collect().items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+COLLECTED_METRICS: List[CollectedMetric] = []
+
+
+def collect_metric(name: str, documentation: str, kind: str, collect: Callable[[], Dict[Tuple[str, ...], float]],
+                   label_names: Sequence[str] = ()) -> CollectedMetric:
+    """Registers a gauge or counter rendered by render_metrics"""
+    metric = CollectedMetric(name, documentation, kind, collect, label_names)
+    COLLECTED_METRICS.append(metric)
+    return metric
+
+
+# Per worker process, Prometheus sums them across the scraped workers
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to handle the request",
+    [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10])
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed while handling the request",
+    [0, 1, 2, 5, 10, 20, 50, 100, 200, 500])
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL statements while handling the request",
+    [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5])
+
+HISTOGRAMS = [request_duration, request_db_queries, request_db_duration]
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in [*HISTOGRAMS, *COLLECTED_METRICS] for line in metric.render()) + "\n"
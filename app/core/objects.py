@@ -7,9 +7,11 @@ class Event(enum.Enum):
     DELETED = "deleted"
     STATUS_UPDATED = "status_updated"
     BULK_UPDATED = "bulk_updated"
+    RESYNC = "resync"
 
 class Object(enum.Enum):
     SERVICE = "service"
     INCIDENT = "incident"
     INCIDENT_UPDATE = "incident_update"
-    STATUS = "status"
\ No newline at end of file
+    STATUS = "status"
+    STREAM = "stream"
\ No newline at end of file
@@ -1,3 +1,3 @@
-from .models import Organization, User, StatusHistory, Service, Incident, IncidentUpdate
+from .models import Organization, User, StatusHistory, Service, Incident, IncidentUpdate, ServiceDailyRollup
 
 from .database import Base
\ No newline at end of file
@@ -1,13 +1,37 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from app.config import settings
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 
-engine = create_engine(settings.DATABASE_URL, pool_size=50, max_overflow=0)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """Maps the sync DATABASE_URL onto the matching asyncio driver"""
+    scheme, _, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+# Requests run on the async engine, the sync one only serves organization signup, migrations, partition
+# upkeep and commands. Every worker holds both pools, this one stays small so they fit under max_connections
+engine = create_engine(settings.DATABASE_URL, pool_size=5, max_overflow=0)
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL),
+    pool_size=50,
+    max_overflow=0,
+)
+# Objects stay usable after commit, lazy loads aren't possible outside of an awaited call
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 @contextmanager
 def get_db():
     db: Session = SessionLocal()
@@ -22,3 +46,16 @@ def get_db():
 
 def get_db_session():
     return SessionLocal()
+
+@asynccontextmanager
+async def get_async_db():
+    db: AsyncSession = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except Exception as e:
+        print("Rolling back operation", e)
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
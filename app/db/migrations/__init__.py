@@ -0,0 +1,80 @@
+"""
+Versioned schema migrations.
+
+Every `mNNNN_<name>.py` module in this package is a migration with a `DESCRIPTION` and an
+`upgrade(conn)` function. They run in version order, each one in its own transaction, and
+applied versions are recorded in the `schema_migrations` table. Migrations must stay valid
+for databases that were created by `Base.metadata.create_all` before this pipeline existed.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from dataclasses import dataclass
+from types import ModuleType
+from typing import List, Optional
+
+from sqlalchemy import Engine, text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_MODULE = re.compile(r"^m(\d{4})_\w+$")
+# Serializes workers starting at the same time, arbitrary but fixed
+ADVISORY_LOCK_ID = 704_221_903
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def description(self) -> str:
+        return getattr(self.module, "DESCRIPTION", self.name)
+
+
+def discover() -> List[Migration]:
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = MIGRATION_MODULE.match(module_info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{module_info.name}")
+            migrations.append(Migration(int(match.group(1)), module_info.name, module))
+    return sorted(migrations, key=lambda m: m.version)
+
+
+def _ensure_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def applied_versions(conn: Connection) -> set:
+    _ensure_table(conn)
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def run_migrations(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """Applies the pending migrations up to `target` (all of them by default), returns the ones applied"""
+    applied = []
+    for migration in discover():
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            # Checked under the lock, another worker may have just applied it
+            if migration.version in applied_versions(conn):
+                continue
+
+            logger.info("Applying migration %04d %s", migration.version, migration.description)
+            migration.module.upgrade(conn)
+            conn.execute(text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                         {"version": migration.version, "description": migration.description})
+            applied.append(migration)
+    return applied
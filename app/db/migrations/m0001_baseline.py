@@ -0,0 +1,29 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+DESCRIPTION = "Baseline schema"
+
+# Tables as they were before versioned migrations, created only where missing
+BASELINE_TABLES = [
+    "organizations",
+    "users",
+    "services",
+    "incidents",
+    "service_incident_association",
+    "incident_updates",
+    "status_history",
+    "service_daily_rollups",
+]
+
+
+def upgrade(conn: Connection):
+    from app.db.database import Base
+
+    # Fresh databases also get the indexes declared on the models here, later migrations tolerate that
+    tables = [Base.metadata.tables[name] for name in BASELINE_TABLES]
+    Base.metadata.create_all(conn, tables=tables, checkfirst=True)
+
+    if conn.dialect.name == "postgresql":
+        # Columns added after these tables were first created with create_all
+        conn.execute(text("ALTER TABLE organizations ADD COLUMN IF NOT EXISTS event_seq BIGINT NOT NULL DEFAULT 0"))
+        conn.execute(text("ALTER TABLE services ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP WITH TIME ZONE"))
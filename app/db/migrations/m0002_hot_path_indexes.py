@@ -0,0 +1,33 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+DESCRIPTION = "Composite and partial indexes for hot query paths"
+
+# Partial indexes skip soft deleted rows, every query reading these tables filters them out
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_status_history_org_created "
+    "ON status_history (organization_id, created_at) WHERE {not_deleted}",
+    "CREATE INDEX IF NOT EXISTS ix_status_history_service_created "
+    "ON status_history (service_id, created_at) WHERE {not_deleted}",
+    "CREATE INDEX IF NOT EXISTS ix_service_incident_association_service "
+    "ON service_incident_association (service_id, incident_id)",
+    "CREATE INDEX IF NOT EXISTS ix_service_incident_association_incident "
+    "ON service_incident_association (incident_id, service_id)",
+    "CREATE INDEX IF NOT EXISTS ix_incidents_org_created "
+    "ON incidents (organization_id, created_at) WHERE {not_deleted}",
+    "CREATE INDEX IF NOT EXISTS ix_incident_updates_incident_created "
+    "ON incident_updates (incident_id, created_at) WHERE {not_deleted}",
+    "CREATE INDEX IF NOT EXISTS ix_organizations_name "
+    "ON organizations (name) WHERE {not_deleted}",
+]
+
+
+def upgrade(conn: Connection):
+    # SQLite only matches the partial indexes against `is_deleted = 0`, which is how it renders the filter
+    not_deleted = "is_deleted = 0" if conn.dialect.name == "sqlite" else "is_deleted = false"
+    for statement in INDEXES:
+        conn.execute(text(statement.format(not_deleted=not_deleted)))
+    if conn.dialect.name == "postgresql":
+        # Give the planner statistics for the new indexes right away
+        conn.execute(text("ANALYZE status_history, service_incident_association, incidents, incident_updates, "
+                          "organizations"))
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.partitions import add_months, create_partition, is_partitioned, month_start
+
+DESCRIPTION = "Partition status_history by month on created_at"
+
+# Partitions created past the current month, app.commands.partitions keeps this horizon going
+MONTHS_AHEAD = 3
+
+
+def upgrade(conn: Connection):
+    if conn.dialect.name != "postgresql" or is_partitioned(conn):
+        return
+
+    conn.execute(text("ALTER TABLE status_history RENAME TO status_history_unpartitioned"))
+    conn.execute(text("ALTER TABLE status_history_unpartitioned RENAME CONSTRAINT status_history_pkey "
+                      "TO status_history_unpartitioned_pkey"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_status_history_org_created"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_status_history_service_created"))
+
+    # The partition key has to be part of the primary key, status_history_id alone stays unique
+    # through its sequence
+    conn.execute(text("""
+        CREATE TABLE status_history (
+            status_history_id BIGINT NOT NULL DEFAULT nextval('status_history_status_history_id_seq'),
+            service_id BIGINT NOT NULL REFERENCES services (service_id),
+            organization_id BIGINT NOT NULL REFERENCES organizations (organization_id),
+            status servicestatus NOT NULL,
+            is_deleted BOOLEAN NOT NULL DEFAULT false,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            created_by_id BIGINT NOT NULL REFERENCES users (user_id),
+            PRIMARY KEY (status_history_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text("ALTER SEQUENCE status_history_status_history_id_seq OWNED BY status_history.status_history_id"))
+    conn.execute(text("CREATE INDEX ix_status_history_org_created "
+                      "ON status_history (organization_id, created_at) WHERE is_deleted = false"))
+    conn.execute(text("CREATE INDEX ix_status_history_service_created "
+                      "ON status_history (service_id, created_at) WHERE is_deleted = false"))
+
+    oldest = conn.execute(text("SELECT min(created_at) FROM status_history_unpartitioned")).scalar()
+    current = month_start(datetime.now(timezone.utc).date())
+    month = month_start(oldest.astimezone(timezone.utc).date()) if oldest else current
+    while month <= add_months(current, MONTHS_AHEAD):
+        create_partition(conn, month)
+        month = add_months(month, 1)
+
+    conn.execute(text("""
+        INSERT INTO status_history (status_history_id, service_id, organization_id, status, is_deleted, created_at,
+                                    created_by_id)
+        SELECT status_history_id, service_id, organization_id, status, is_deleted, COALESCE(created_at, now()),
+               created_by_id
+        FROM status_history_unpartitioned
+    """))
+    conn.execute(text("DROP TABLE status_history_unpartitioned"))
+    conn.execute(text("ANALYZE status_history"))
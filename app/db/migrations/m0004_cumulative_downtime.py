@@ -0,0 +1,58 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+DESCRIPTION = "Cumulative downtime counters on status_history and services"
+
+COLUMNS = ["cumulative_downtime_seconds", "cumulative_weighted_downtime_seconds"]
+
+# Mirrors app.services.uptime.DOWNTIME_WEIGHTS, enums are stored by name
+WEIGHTED = "CASE prev_status WHEN 'DEGRADED' THEN 0.5 WHEN 'PARTIAL_OUTAGE' THEN 1 WHEN 'MAJOR_OUTAGE' THEN 1 ELSE 0 END"
+
+
+def upgrade(conn: Connection):
+    for table in ("status_history", "services"):
+        existing = {column["name"] for column in inspect(conn).get_columns(table)}
+        for column in COLUMNS:
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} DOUBLE PRECISION NOT NULL DEFAULT 0"))
+
+    if conn.dialect.name != "postgresql":
+        return
+
+    # Every row accumulates the intervals before it, each counted by the status it was in
+    conn.execute(text(f"""
+        WITH intervals AS (
+            SELECT status_history_id, created_at, service_id,
+                   COALESCE(EXTRACT(EPOCH FROM created_at - lag(created_at) OVER w), 0) AS seconds,
+                   lag(status) OVER w AS prev_status
+            FROM status_history
+            WHERE is_deleted = false
+            WINDOW w AS (PARTITION BY service_id ORDER BY created_at, status_history_id)
+        ), running AS (
+            SELECT status_history_id, created_at,
+                   SUM(CASE WHEN prev_status <> 'OPERATIONAL' THEN seconds ELSE 0 END) OVER w AS downtime,
+                   SUM(seconds * {WEIGHTED}) OVER w AS weighted_downtime
+            FROM intervals
+            WINDOW w AS (PARTITION BY service_id ORDER BY created_at, status_history_id)
+        )
+        UPDATE status_history
+        SET cumulative_downtime_seconds = running.downtime,
+            cumulative_weighted_downtime_seconds = running.weighted_downtime
+        FROM running
+        WHERE status_history.status_history_id = running.status_history_id
+          AND status_history.created_at = running.created_at
+    """))
+    conn.execute(text("""
+        UPDATE services
+        SET cumulative_downtime_seconds = latest.cumulative_downtime_seconds,
+            cumulative_weighted_downtime_seconds = latest.cumulative_weighted_downtime_seconds,
+            status_changed_at = latest.created_at
+        FROM (
+            SELECT DISTINCT ON (service_id) service_id, created_at, cumulative_downtime_seconds,
+                   cumulative_weighted_downtime_seconds
+            FROM status_history
+            WHERE is_deleted = false
+            ORDER BY service_id, created_at DESC, status_history_id DESC
+        ) AS latest
+        WHERE services.service_id = latest.service_id
+    """))
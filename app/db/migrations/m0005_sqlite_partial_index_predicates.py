@@ -0,0 +1,24 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.migrations.m0002_hot_path_indexes import INDEXES
+
+DESCRIPTION = "Rebuild SQLite partial indexes with the predicate the planner can match"
+
+PARTIAL_INDEXES = [
+    "ix_status_history_org_created",
+    "ix_status_history_service_created",
+    "ix_incidents_org_created",
+    "ix_incident_updates_incident_created",
+    "ix_organizations_name",
+]
+
+
+def upgrade(conn: Connection):
+    # Postgres renders `is_deleted = false`, its indexes already match
+    if conn.dialect.name != "sqlite":
+        return
+    for name in PARTIAL_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for statement in INDEXES:
+        conn.execute(text(statement.format(not_deleted="is_deleted = 0")))
@@ -0,0 +1,52 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.migrations.m0004_cumulative_downtime import WEIGHTED
+
+DESCRIPTION = "Downtime counters on every dialect and status_changed_at of services without history"
+
+
+def upgrade(conn: Connection):
+    # 0004 only backfilled Postgres, SQLite databases kept zero counters and no status_changed_at
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(f"""
+            WITH intervals AS (
+                SELECT status_history_id, service_id, created_at,
+                       COALESCE((julianday(created_at) - julianday(lag(created_at) OVER w)) * 86400, 0) AS seconds,
+                       lag(status) OVER w AS prev_status
+                FROM status_history
+                WHERE is_deleted = 0
+                WINDOW w AS (PARTITION BY service_id ORDER BY created_at, status_history_id)
+            ), running AS (
+                SELECT status_history_id,
+                       SUM(CASE WHEN prev_status <> 'OPERATIONAL' THEN seconds ELSE 0 END) OVER w AS downtime,
+                       SUM(seconds * {WEIGHTED}) OVER w AS weighted_downtime
+                FROM intervals
+                WINDOW w AS (PARTITION BY service_id ORDER BY created_at, status_history_id)
+            )
+            UPDATE status_history
+            SET cumulative_downtime_seconds = running.downtime,
+                cumulative_weighted_downtime_seconds = running.weighted_downtime
+            FROM running
+            WHERE status_history.status_history_id = running.status_history_id
+        """))
+        conn.execute(text("""
+            UPDATE services
+            SET cumulative_downtime_seconds = latest.cumulative_downtime_seconds,
+                cumulative_weighted_downtime_seconds = latest.cumulative_weighted_downtime_seconds,
+                status_changed_at = latest.created_at
+            FROM (
+                SELECT service_id, created_at, cumulative_downtime_seconds, cumulative_weighted_downtime_seconds,
+                       row_number() OVER (PARTITION BY service_id ORDER BY created_at DESC, status_history_id DESC) AS rn
+                FROM status_history
+                WHERE is_deleted = 0
+            ) AS latest
+            WHERE services.service_id = latest.service_id AND latest.rn = 1
+        """))
+
+    # Without it no time accrues in the current status, a service that is down would report full uptime.
+    # Services without history have held their status since they were created
+    conn.execute(text(
+        "UPDATE services SET status_changed_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+        "WHERE status_changed_at IS NULL"
+    ))
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, ForeignKey, String, DateTime, Table, Enum, Text, BigInteger, Boolean
+from sqlalchemy import Column, ForeignKey, String, DateTime, Table, Enum, Text, BigInteger, Boolean, Date, Float, \
+    Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
+from datetime import datetime, timezone
 
 from app.db.database import Base
 
@@ -11,8 +13,16 @@ service_incident_association = Table(
     Base.metadata,
     Column("service_id", BigInteger, ForeignKey("services.service_id")),
     Column("incident_id", BigInteger, ForeignKey("incidents.incident_id")),
+    # Both directions are walked: a service's incidents and an incident's services
+    Index("ix_service_incident_association_service", "service_id", "incident_id"),
+    Index("ix_service_incident_association_incident", "incident_id", "service_id"),
 )
 
+# Partial index predicates, soft deleted rows are never read through these indexes. Each has to
+# match how the dialect renders `is_deleted == False`, SQLite only uses the index for `= 0`
+NOT_DELETED = text("is_deleted = false")
+SQLITE_NOT_DELETED = text("is_deleted = 0")
+
 # Enums
 class ServiceStatus(str, enum.Enum):
     OPERATIONAL = "operational"
@@ -40,14 +50,27 @@ IMPACT_PRIORITY = {
     IncidentImpact.CRITICAL: 3,
 }
 
+# Used to pick the worst status a service had on a given day
+STATUS_SEVERITY = {
+    ServiceStatus.OPERATIONAL: 0,
+    ServiceStatus.MAINTENANCE: 1,
+    ServiceStatus.DEGRADED: 2,
+    ServiceStatus.PARTIAL_OUTAGE: 3,
+    ServiceStatus.MAJOR_OUTAGE: 4,
+}
+
 # Models
 class Organization(Base):
     __tablename__ = "organizations"
+    __table_args__ = (
+        Index("ix_organizations_name", "name", postgresql_where=NOT_DELETED, sqlite_where=SQLITE_NOT_DELETED),
+    )
 
     organization_id = Column(BigInteger, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     display_name = Column(String, nullable=False)
     auth0_org_id = Column(String, unique=True, nullable=False)
+    event_seq = Column(BigInteger, default=0, server_default="0", nullable=False)  # Last WebSocket event sequence
     is_deleted = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -78,6 +101,11 @@ class Service(Base):
     description = Column(String)
     organization_id = Column(BigInteger, ForeignKey("organizations.organization_id"), nullable=False)
     current_status = Column(Enum(ServiceStatus), default=ServiceStatus.OPERATIONAL, nullable=False)
+    # When current_status was last written, set on insert so time in the first status accrues too
+    status_changed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=True)
+    # Running downtime totals (see StatusHistory) as of status_changed_at
+    cumulative_downtime_seconds = Column(Float, default=0.0, server_default="0", nullable=False)
+    cumulative_weighted_downtime_seconds = Column(Float, default=0.0, server_default="0", nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -89,6 +117,10 @@ class Service(Base):
 
 class Incident(Base):
     __tablename__ = "incidents"
+    __table_args__ = (
+        Index("ix_incidents_org_created", "organization_id", "created_at", postgresql_where=NOT_DELETED,
+              sqlite_where=SQLITE_NOT_DELETED),
+    )
 
     incident_id = Column(BigInteger, primary_key=True, autoincrement=True)
     title = Column(String, nullable=False)
@@ -108,6 +140,10 @@ class Incident(Base):
 
 class IncidentUpdate(Base):
     __tablename__ = "incident_updates"
+    __table_args__ = (
+        Index("ix_incident_updates_incident_created", "incident_id", "created_at", postgresql_where=NOT_DELETED,
+              sqlite_where=SQLITE_NOT_DELETED),
+    )
 
     incident_update_id = Column(BigInteger, primary_key=True, autoincrement=True)
     incident_id = Column(BigInteger, ForeignKey("incidents.incident_id"), nullable=False)
@@ -124,7 +160,14 @@ class IncidentUpdate(Base):
 
 
 class StatusHistory(Base):
+    # Range partitioned by month on created_at in Postgres (migration 0003, app.db.partitions)
     __tablename__ = "status_history"
+    __table_args__ = (
+        Index("ix_status_history_org_created", "organization_id", "created_at", postgresql_where=NOT_DELETED,
+              sqlite_where=SQLITE_NOT_DELETED),
+        Index("ix_status_history_service_created", "service_id", "created_at", postgresql_where=NOT_DELETED,
+              sqlite_where=SQLITE_NOT_DELETED),
+    )
 
     status_history_id = Column(BigInteger, primary_key=True, autoincrement=True)
     service_id = Column(BigInteger, ForeignKey("services.service_id"), nullable=False)
@@ -133,7 +176,31 @@ class StatusHistory(Base):
     is_deleted = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     created_by_id = Column(BigInteger, ForeignKey("users.user_id"), nullable=False)
+    # Downtime of the service from its first status up to created_at, so the downtime of any
+    # range is the difference of two rows (app.services.uptime)
+    cumulative_downtime_seconds = Column(Float, default=0.0, server_default="0", nullable=False)
+    cumulative_weighted_downtime_seconds = Column(Float, default=0.0, server_default="0", nullable=False)
 
     # Relationships
     service = relationship("Service", back_populates="status_history")
     created_by = relationship("User", back_populates="status_history")
+
+
+
+class ServiceDailyRollup(Base):
+    """
+    Per-service, per-day downtime summary maintained on every status change.
+    Only closed intervals are accounted for here, the interval since
+    Service.status_changed_at is added at read time.
+    """
+    __tablename__ = "service_daily_rollups"
+    __table_args__ = (
+        Index("ix_service_daily_rollups_org_day", "organization_id", "day"),
+    )
+
+    service_id = Column(BigInteger, ForeignKey("services.service_id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    organization_id = Column(BigInteger, ForeignKey("organizations.organization_id"), nullable=False)
+    downtime_seconds = Column(Float, default=0.0, nullable=False)
+    worst_status = Column(Enum(ServiceStatus), default=ServiceStatus.OPERATIONAL, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,136 @@
+"""
+Monthly range partitions of status_history (Postgres only, see migration 0003).
+
+Every month lives in its own `status_history_yYYYYmMM` partition. Upcoming partitions are
+created ahead of time, old ones are exported to gzipped CSV files, then detached and dropped.
+"""
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Engine, text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "status_history"
+PARTITION_NAME = re.compile(r"^status_history_y(\d{4})m(\d{2})$")
+# Read paths look back 90 days, archiving can't reach into them
+MIN_RETENTION_MONTHS = 4
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retention_start(keep_months: int, now: Optional[datetime] = None) -> date:
+    """First month kept in the database when the last `keep_months` months are retained besides the current one"""
+    return add_months(month_start((now or datetime.now(timezone.utc)).date()), -keep_months)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+                           {"table": PARENT_TABLE}).scalar()
+    return relkind == "p"
+
+
+def create_partition(conn: Connection, month: date):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def list_partitions(conn: Connection) -> List[Tuple[date, str]]:
+    """(month, partition name) of every attached monthly partition, oldest first"""
+    names = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalars()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def ensure_partitions(engine: Engine, months_ahead: int = 3, keep_months: int = 0) -> List[str]:
+    """
+    Creates the partitions of the current month, the next `months_ahead` months and the last
+    `keep_months` months, returns the new ones. Every sample inside the retention has a
+    partition to land in, even when the table was partitioned with less history than that.
+    """
+    created = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return created
+        existing = {name for _, name in list_partitions(conn)}
+        current = month_start(datetime.now(timezone.utc).date())
+        for offset in range(-keep_months, months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) not in existing:
+                create_partition(conn, month)
+                created.append(partition_name(month))
+    return created
+
+
+def archive_partitions(engine: Engine, keep_months: int, directory: str,
+                       now: Optional[datetime] = None) -> List[str]:
+    """
+    Writes every partition entirely older than the last `keep_months` months to
+    `<directory>/<partition>.csv.gz`, then detaches and drops it. Returns the archived file paths.
+    """
+    if keep_months < MIN_RETENTION_MONTHS:
+        raise ValueError(f"At least {MIN_RETENTION_MONTHS} months of status history have to be kept")
+    cutoff = retention_start(keep_months, now)
+    os.makedirs(directory, exist_ok=True)
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        cold = [name for month, name in list_partitions(conn) if add_months(month, 1) <= cutoff]
+
+    archived = []
+    for name in cold:
+        path = os.path.join(directory, f"{name}.csv.gz")
+        partial_path = f"{path}.partial"
+        raw = engine.raw_connection()
+        try:
+            # Exported while still attached and detached in the same transaction, a failed export leaves
+            # the partition in place. The lock keeps writes out between the export and the drop
+            with raw.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {name} IN SHARE MODE")
+                with gzip.open(partial_path, "wb") as archive:
+                    cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+                os.replace(partial_path, path)
+                cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                cursor.execute(f"DROP TABLE {name}")
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            raw.close()
+
+        logger.info("Archived %s to %s", name, path)
+        archived.append(path)
+    return archived
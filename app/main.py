@@ -1,16 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
 from .config import Environment
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select
 from fastapi.middleware.cors import CORSMiddleware
 from app.controller import organizations, services, incident, public
 from app.db import Organization
-from app.db.database import Base, engine, get_db
+from app.db.database import async_engine, engine, get_async_db
+from app.db.migrations import run_migrations
+from app.db.partitions import ensure_partitions
 from app.config import settings
-from app.middleware.auth_middleware import AuthMiddleware
+from app.core.auth import auth0_manager
+from app.core.metrics import instrument_engine, render_metrics
+from app.core.responses import ORJSONResponse
+from app.middleware.auth_middleware import AuthMiddleware, jwks
+from app.middleware.metrics_middleware import MetricsMiddleware
 from app.websocket.manager import manager
+from app.websocket.pubsub import pubsub
+from app.websocket.websockets import deliver
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.CREATE_TABLES and settings.ENVIRONMENT == Environment.LOCAL:
+        # Before the partitions, which only exist once the migrations have run
+        await asyncio.to_thread(run_migrations, engine)
+    # Inserts fail without a partition for the current month, don't rely on cron alone
+    await asyncio.to_thread(ensure_partitions, engine, keep_months=settings.STATUS_HISTORY_RETENTION_MONTHS)
+    await pubsub.start(deliver)
+    # Warm the signing keys so the first requests don't wait on Auth0
+    jwks.refresh_in_background()
+    yield
+    await pubsub.stop()
+    await jwks.aclose()
+    await auth0_manager.aclose()
+
 
-app = FastAPI()
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Responses of every route are rendered by orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 # Middlewares
 app.add_middleware(AuthMiddleware)
+# Outside of auth so the identity lookups are counted too
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
@@ -28,25 +65,30 @@ app.include_router(public.router, prefix="/api")
 @app.get("/api/healthcheck")
 async def health():
     print("Healthcheck")
-    if settings.CREATE_TABLES and settings.ENVIRONMENT == Environment.LOCAL:
-        print("Creating tables")
-        Base.metadata.drop_all(bind=engine)
-        Base.metadata.create_all(bind=engine)
     return {"message": "Healthcheck success!"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint, request and SQL histograms per route and WebSocket queues of this worker"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.websocket("/ws/{org_info}")
-async def websocket_endpoint(websocket: WebSocket, org_info: str):
+async def websocket_endpoint(websocket: WebSocket, org_info: str, since: Optional[int] = None):
     org_id = org_info.strip()
     # If socket is subscribed from public page, then org slug will be sent
     if "org_" not in org_info:
-        with get_db() as db:
-            org = db.query(Organization).filter(Organization.name == org_info).first()
-            if not org:
-                raise HTTPException(status_code=404, detail="Organization not found")
-            org_id = org.auth0_org_id
+        async with get_async_db() as db:
+            org = (await db.execute(select(Organization).filter(Organization.name == org_info))).scalars().first()
+        if not org:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Organization not found")
+            return
+        org_id = org.auth0_org_id
 
-    await manager.connect(websocket, org_id)
+    # Clients reconnecting with the last seq they saw get only the messages they missed
+    latest_seq = await pubsub.latest_sequence(org_id) if since is not None else None
+    await manager.connect(websocket, org_id, since=since, latest_seq=latest_seq)
     try:
         while True:
             await websocket.receive_text()  # Keeps connection open
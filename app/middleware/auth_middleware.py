@@ -1,39 +1,110 @@
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from fastapi import Request, HTTPException, status
 from jose import jwt
 from jose.exceptions import JWTError
-from sqlalchemy.orm import Session
-from app.db.database import get_db_session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.db.database import get_async_db
+import asyncio
+import hashlib
 import httpx
 import time
-from typing import Dict, Any
+from typing import Dict, Optional, Tuple
 
 from app.config import settings
 from app.db.models import User, Organization
 
-jwks_cache: Dict[str, Any] = {}
 JWKS_CACHE_TTL_SECONDS = 3600
-
-
-async def get_jwks():
-    global jwks_cache
-    if not jwks_cache or (jwks_cache and (jwks_cache.get("timestamp", 0) + JWKS_CACHE_TTL_SECONDS) < int(time.time())):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json")
-            response.raise_for_status()
-            jwks_cache = response.json()
-    return jwks_cache
+# An unknown kid triggers a refetch (key rotation), at most this often
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = 30
+
+# Longest a deleted user or organization keeps authenticating on workers that didn't delete it
+MAX_IDENTITY_CACHE_TTL_SECONDS = 10
+
+# (auth0 user id, auth0 org id) -> detached (User, Organization) resolved from token claims
+identity_cache = TTLCache(maxsize=settings.AUTH_IDENTITY_CACHE_SIZE,
+                          ttl_seconds=min(settings.AUTH_IDENTITY_CACHE_TTL_SECONDS, MAX_IDENTITY_CACHE_TTL_SECONDS))
+# sha256 of the bearer token -> verified claims, never kept past the token's exp
+token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL_SECONDS)
+
+
+class JWKSKeySet:
+    """
+    Signing keys of the Auth0 tenant indexed by kid. Stale keys keep being served while a
+    single background task refetches them, concurrent callers never trigger parallel fetches.
+    """
+
+    def __init__(self, url: str, ttl_seconds: int = JWKS_CACHE_TTL_SECONDS):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.keys: Dict[str, dict] = {}
+        self.fetched_at = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get_key(self, kid: str) -> Optional[dict]:
+        if not self.keys:
+            await self.refresh()
+        elif self.fetched_at + self.ttl_seconds < time.monotonic():
+            self.refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and self.fetched_at + JWKS_MIN_REFRESH_INTERVAL_SECONDS < time.monotonic():
+            # The tenant may have rotated its signing keys
+            await self.refresh()
+            key = self.keys.get(kid)
+        return key
+
+    async def refresh(self):
+        # Shielded so a cancelled request doesn't cancel the fetch other requests are waiting on
+        await asyncio.shield(self.refresh_in_background())
+
+    def refresh_in_background(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+            self._refresh_task.add_done_callback(self._log_failure)
+        return self._refresh_task
+
+    async def _fetch(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        response = await self._client.get(self.url)
+        response.raise_for_status()
+        self.keys = {key["kid"]: key for key in response.json()["keys"]}
+        self.fetched_at = time.monotonic()
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            print("JWKS refresh failed", task.exception())
+
+    async def aclose(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+jwks = JWKSKeySet(f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json")
 
 
 async def verify_token(token: str) -> dict:
+    token_digest = hashlib.sha256(token.encode()).hexdigest()
+    claims = token_cache.get(token_digest)
+    if claims is not None and claims["exp"] > time.time():
+        return claims
+
     try:
         unverified_header = jwt.get_unverified_header(token)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token header")
 
-    jwks = await get_jwks()
-
-    key = next((k for k in jwks["keys"] if k["kid"] == unverified_header["kid"]), None)
+    try:
+        key = await jwks.get_key(unverified_header.get("kid"))
+    except httpx.HTTPError as e:
+        print("JWKS fetch error", e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Unable to fetch signing keys")
 
     if not key:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid auth credentials")
@@ -45,7 +116,6 @@ async def verify_token(token: str) -> dict:
             algorithms=settings.AUTH0_ALGORITHMS,
             issuer=f"https://{settings.AUTH0_DOMAIN}/"
         )
-        return payload
     except JWTError as e:
         print("JWT error", e)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
@@ -53,29 +123,46 @@ async def verify_token(token: str) -> dict:
         print("error", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Token verification error: {e}")
 
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        token_cache.set(token_digest, payload, ttl_seconds=min(expires_in, settings.AUTH_TOKEN_CACHE_TTL_SECONDS))
+    return payload
+
+
+# Paths served without authentication
+PUBLIC_PATH_PREFIXES = ("/api/public",)
+PUBLIC_PATHS = {"/api/healthcheck", "/api/organizations", "/metrics"}
+
+
+class AuthMiddleware:
+    """
+    Plain ASGI middleware resolving the caller's user and organization into request.state.
+    Auth failures are answered directly since exception handlers don't run this far out.
+    """
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path.startswith(
-                "/api/public") or request.url.path == '/api/healthcheck' or request.url.path == '/api/organizations':
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self.is_public(scope["path"]):
+            await self.app(scope, receive, send)
+            return
 
-        # Dependency injection doesn't work in middleware directly
-        db: Session = get_db_session()
+        request = Request(scope)
         try:
-            user = db.query(User).first()
-            organization = db.query(Organization).first()
+            await self.authenticate(request)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
 
-            request.state.user = user
-            request.state.organization = organization
-        finally:
-            db.close()
+        await self.app(scope, receive, send)
 
-        # return await call_next(request)
+    @staticmethod
+    def is_public(path: str) -> bool:
+        return path.startswith(PUBLIC_PATH_PREFIXES) or path in PUBLIC_PATHS
 
+    async def authenticate(self, request: Request):
         auth_header = request.headers.get("Authorization")
         auth0_org_id = request.headers.get("x-tenant-id")
         auth0_user_id = request.headers.get("x-user-id")
@@ -101,20 +188,45 @@ class AuthMiddleware(BaseHTTPMiddleware):
         if request.url.path.startswith("/api/auth") and request.method == 'POST':
             # Passing claims only to this API in order to create an organization
             request.state.claims = claims
-            return await call_next(request)
+            return
+
+        user, organization = await resolve_user_and_org(claims)
+        request.state.user = user
+        request.state.organization = organization
+
+
+async def resolve_user_and_org(claims: dict) -> Tuple[User, Organization]:
+    """Cached lookup of the user and organization behind a set of claims"""
+    key = (claims.get("sub"), claims.get("org_id"))
+    identity = identity_cache.get(key)
+    if identity:
+        return identity
+
+    # Dependency injection doesn't work in middleware directly
+    async with get_async_db() as db:
+        user, organization = await sync_user_and_org_from_claims(claims, db)
+        # Cached instances outlive the session, they only carry the already loaded columns
+        db.expunge(user)
+        db.expunge(organization)
+
+    identity_cache.set(key, (user, organization))
+    return user, organization
+
+
+# Only see soft deletes made through the ORM in this process, everything else waits out the TTL
+@event.listens_for(User.is_deleted, "set")
+def _invalidate_deleted_user(user: User, value: bool, oldvalue, initiator):
+    if value:
+        identity_cache.pop_where(lambda key, identity: key[0] == user.auth0_id)
 
-        db: Session = get_db_session()
-        try:
-            user, organization = sync_user_and_org_from_claims(claims, db)
-            request.state.user = user
-            request.state.organization = organization
-        finally:
-            db.close()
 
-        return await call_next(request)
+@event.listens_for(Organization.is_deleted, "set")
+def _invalidate_deleted_organization(organization: Organization, value: bool, oldvalue, initiator):
+    if value:
+        identity_cache.pop_where(lambda key, identity: key[1] == organization.auth0_org_id)
 
 
-def sync_user_and_org_from_claims(claims: dict, db: Session):
+async def sync_user_and_org_from_claims(claims: dict, db: AsyncSession):
     auth0_user_id = claims.get("sub")
     auth0_org_id = claims.get("org_id")
 
@@ -125,12 +237,13 @@ def sync_user_and_org_from_claims(claims: dict, db: Session):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Organization ID (org_id) missing from token. Access denied in multi-tenant context.")
 
-    user = db.query(User).filter(User.auth0_id == auth0_user_id, User.is_deleted == False).first()
+    user = (await db.execute(select(User).filter(User.auth0_id == auth0_user_id,
+                                                 User.is_deleted == False))).scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    organization = db.query(Organization).filter(Organization.auth0_org_id == auth0_org_id,
-                                                 Organization.is_deleted == False).first()
+    organization = (await db.execute(select(Organization).filter(Organization.auth0_org_id == auth0_org_id,
+                                                                 Organization.is_deleted == False))).scalars().first()
     if not organization:
         # This scenario implies a mismatch.
         # You might create the organization here if it's a new Auth0 org,
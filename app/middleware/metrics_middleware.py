@@ -0,0 +1,67 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core.metrics import (
+    DETECT_REPEATED_STATEMENTS,
+    QueryStats,
+    current_query_stats,
+    request_db_duration,
+    request_db_queries,
+    request_duration,
+)
+
+# Label of requests that never reached a route (404s, rejected by auth), keeps the label set bounded
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware timing every HTTP request and the SQL it runs, recorded per route
+    template. Requests spending too long in the database are logged with their slowest statements.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started_at
+            current_query_stats.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            self.record(scope["method"], getattr(route, "path", UNMATCHED_ROUTE), status_code, seconds, stats)
+
+    @staticmethod
+    def record(method: str, route: str, status_code: int, seconds: float, stats: QueryStats):
+        request_duration.observe(seconds, method, route)
+        request_db_queries.observe(stats.count, method, route)
+        request_db_duration.observe(stats.seconds, method, route)
+
+        if DETECT_REPEATED_STATEMENTS:
+            for shape, count in stats.repeated_statements():
+                print(f"Possible N+1 in {method} {route}: statement ran {count} times: {shape[:300]}")
+
+        if stats.seconds >= settings.SQL_SLOW_REQUEST_SECONDS:
+            print(f"Slow database work in {method} {route} ({status_code}): {stats.count} statements, "
+                  f"{stats.seconds * 1000:.1f} ms")
+            for statement_seconds, statement in stats.slowest:
+                print(f"  {statement_seconds * 1000:.1f} ms {' '.join(statement.split())[:300]}")
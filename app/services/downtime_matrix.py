@@ -0,0 +1,128 @@
+"""
+Vectorized per-day downtime of many services at once.
+
+Status transitions of a whole organization are held in flat NumPy arrays (service index,
+epoch seconds, severity code) and turned into a (services x days) downtime matrix plus the
+worst status of every day with array operations only, without a Python loop over services
+and days (benchmarks.downtime_matrix checks it against one).
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.db.models import ServiceDailyRollup, ServiceStatus, STATUS_SEVERITY
+from app.utils.utils import ensure_utc
+
+SECONDS_PER_DAY = 86400
+# Severity code -> status, codes are STATUS_SEVERITY ranks so max() picks the worst status
+STATUS_BY_CODE = [status for status, _ in sorted(STATUS_SEVERITY.items(), key=lambda item: item[1])]
+
+
+@dataclass
+class Timeline:
+    """Status a service had when the window opened, followed by its changes sorted by time"""
+    initial_status: ServiceStatus
+    changes: List[Tuple[datetime, ServiceStatus]] = field(default_factory=list)
+
+
+@dataclass
+class TransitionArrays:
+    service_ids: np.ndarray  # (services,) service id of every row of the matrix
+    initial: np.ndarray  # (services,) severity code each service had when the window opened
+    service_index: np.ndarray  # (transitions,) matrix row of the transition
+    epochs: np.ndarray  # (transitions,) epoch seconds
+    codes: np.ndarray  # (transitions,) severity code of the new status
+
+    @classmethod
+    def from_timelines(cls, timelines: Dict[int, Timeline]) -> "TransitionArrays":
+        service_ids = np.fromiter(timelines.keys(), dtype=np.int64, count=len(timelines))
+        initial = np.fromiter((STATUS_SEVERITY[t.initial_status] for t in timelines.values()), dtype=np.int8,
+                              count=len(timelines))
+        count = sum(len(t.changes) for t in timelines.values())
+        service_index = np.fromiter(
+            (i for i, t in enumerate(timelines.values()) for _ in t.changes), dtype=np.int64, count=count)
+        epochs = np.fromiter(
+            (ensure_utc(at).timestamp() for t in timelines.values() for at, _ in t.changes), dtype=np.float64,
+            count=count)
+        codes = np.fromiter(
+            (STATUS_SEVERITY[status] for t in timelines.values() for _, status in t.changes), dtype=np.int8,
+            count=count)
+        return cls(service_ids, initial, service_index, epochs, codes)
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def downtime_matrix(arrays: TransitionArrays, start_day: date, days: int,
+                    end: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (downtime seconds, worst severity code) of every service and day from `start_day` on, both
+    of shape (services, days). Nothing after `end` (defaults to the end of the last day) counts.
+    """
+    services = len(arrays.service_ids)
+    start_epoch = day_start(start_day).timestamp()
+    end_epoch = start_epoch + days * SECONDS_PER_DAY
+    if end is not None:
+        end_epoch = min(end_epoch, ensure_utc(end).timestamp())
+
+    # Every service opens with its initial status, stable sort keeps it ahead of changes at the same instant
+    service_index = np.concatenate([np.arange(services, dtype=np.int64), arrays.service_index])
+    starts = np.concatenate([np.full(services, start_epoch), np.clip(arrays.epochs, start_epoch, end_epoch)])
+    codes = np.concatenate([arrays.initial, arrays.codes])
+    order = np.lexsort((starts, service_index))
+    service_index, starts, codes = service_index[order], starts[order], codes[order]
+
+    # An interval lasts until the next change of the same service, or the end of the window
+    ends = np.full_like(starts, end_epoch)
+    same_service = service_index[1:] == service_index[:-1]
+    ends[:-1][same_service] = starts[1:][same_service]
+
+    down = (codes > 0) & (ends > starts)
+    service_index, codes = service_index[down], codes[down]
+    starts, ends = starts[down] - start_epoch, ends[down] - start_epoch
+
+    # One (interval, day) pair for every day an interval overlaps
+    first_day = (starts // SECONDS_PER_DAY).astype(np.int64)
+    last_day = (np.ceil(ends / SECONDS_PER_DAY) - 1).astype(np.int64)
+    counts = last_day - first_day + 1
+    pair = np.repeat(np.arange(len(starts)), counts)
+    day = first_day[pair] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    overlap = (np.minimum(ends[pair], (day + 1) * SECONDS_PER_DAY)
+               - np.maximum(starts[pair], day * SECONDS_PER_DAY))
+    cell = service_index[pair] * days + day
+
+    downtime = np.bincount(cell, weights=overlap, minlength=services * days).reshape(services, days)
+    worst = np.zeros(services * days, dtype=np.int8)
+    np.maximum.at(worst, cell, codes[pair])
+    return downtime, worst.reshape(services, days)
+
+
+def rollup_matrix(service_ids: Sequence[int], rollups: Sequence[ServiceDailyRollup], start_day: date,
+                  days: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Daily rollups laid out like downtime_matrix, days outside the window are ignored"""
+    row = {service_id: i for i, service_id in enumerate(service_ids)}
+    downtime = np.zeros((len(service_ids), days))
+    worst = np.zeros((len(service_ids), days), dtype=np.int8)
+
+    cells = [(row[r.service_id], (r.day - start_day).days, r.downtime_seconds, STATUS_SEVERITY[r.worst_status])
+             for r in rollups if r.service_id in row and 0 <= (r.day - start_day).days < days]
+    if cells:
+        rows, columns, seconds, codes = (np.array(values) for values in zip(*cells))
+        downtime[rows, columns] = seconds
+        worst[rows, columns] = codes
+    return downtime, worst
+
+
+def open_interval_arrays(services: Sequence, start: datetime) -> TransitionArrays:
+    """Transitions into the status every service is still in, the part daily rollups don't cover yet"""
+    return TransitionArrays.from_timelines({
+        service.service_id: Timeline(ServiceStatus.OPERATIONAL, [(max(ensure_utc(service.status_changed_at), start),
+                                                                  service.current_status)])
+        if service.current_status != ServiceStatus.OPERATIONAL and service.status_changed_at
+        else Timeline(ServiceStatus.OPERATIONAL)
+        for service in services
+    })
@@ -1,24 +1,24 @@
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, select, update, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.DTO.incident import IncidentRead, IncidentUpdateRead, IncidentResponse, IncidentUpdateRequest, IncidentCreate, \
     IncidentUpdateCreate
 from app.DTO.services import ServiceResponse
-from app.DTO.status_history import StatusHistoryCreate
+from app.core.cache import public_status_cache
 from app.core.objects import Object, Event
-from app.db import StatusHistory, Organization
-from app.db.database import get_db
+from app.db import Organization
+from app.db.database import get_async_db
 from app.db.models import Incident, IncidentUpdate, Service, IncidentImpact, ServiceStatus, User, IncidentStatus, \
-    IMPACT_PRIORITY
-from typing import Optional, List
+    IMPACT_PRIORITY, service_incident_association
+from typing import Dict, Optional, List
 
 from app.services.services import ServiceCRUD
 from app.websocket.websockets import broadcast
 
-service_crud = ServiceCRUD()
-
 
 class IncidentService(ServiceCRUD):
     def __init__(self):
@@ -33,57 +33,73 @@ class IncidentService(ServiceCRUD):
             return ServiceStatus.DEGRADED
         return ServiceStatus.OPERATIONAL
 
+    async def _get_incident(self, db: AsyncSession, incident_id: int, organization: Organization) -> Optional[Incident]:
+        return (await db.execute(select(Incident).filter(
+            Incident.organization_id == organization.organization_id).filter(
+            Incident.incident_id == incident_id,
+            Incident.is_deleted == False).options(selectinload(Incident.affected_services)))).scalars().first()
+
     # Incident CRUD
-    def create_incident(self, data: IncidentCreate, user: User, organization: Organization,
-                        background_tasks: BackgroundTasks) -> IncidentRead:
-        with get_db() as db:
+    async def create_incident(self, data: IncidentCreate, user: User, organization: Organization,
+                              background_tasks: BackgroundTasks) -> IncidentRead:
+        async with get_async_db() as db:
+            affected_services = []
+            if data.affected_service_ids:
+                affected_services = (await db.execute(select(Service).filter(
+                    Service.organization_id == organization.organization_id,
+                    Service.service_id.in_(data.affected_service_ids),
+                    Service.is_deleted == False,
+                ))).scalars().all()
+
             incident = Incident(
                 title=data.title,
                 description=data.description,
                 organization_id=organization.organization_id,
                 status=data.status,
                 impact=data.impact,
+                affected_services=list(affected_services),
             )
 
             db.add(incident)
-            db.flush()
+            await db.flush()
+
+            new_status = self._status_for_impact(data.impact)
+            await self._record_status_changes(db, [(service, new_status) for service in affected_services], user,
+                                              organization)
+
+            for service in affected_services:
+                # Broadcast real-time update
+                background_tasks.add_task(
+                    broadcast,
+                    organization=organization,
+                    object=Object.SERVICE,
+                    event=Event.STATUS_UPDATED,
+                    data={
+                        "service_id": str(service.service_id),
+                        "name": service.name,
+                        "new_status": new_status.value,
+                        "updated_by": user.name,
+                    }
+                )
+
+            await db.commit()
+            await db.refresh(incident)
+            public_status_cache.invalidate(organization.auth0_org_id)
+
+            # Sent even when no service status changed, clients and other workers learn about the incident
+            background_tasks.add_task(
+                broadcast,
+                organization=organization,
+                object=Object.INCIDENT,
+                event=Event.CREATED,
+                data={
+                    "incident_id": str(incident.incident_id),
+                    "name": incident.title,
+                    "service_ids": ",".join(str(service.service_id) for service in affected_services),
+                    "updated_by": user.name,
+                }
+            )
 
-            if data.affected_service_ids:
-                affected_services = db.query(Service).filter(
-                    Service.organization_id == organization.organization_id,
-                    Service.service_id.in_(data.affected_service_ids),
-                    Service.is_deleted == False,
-                ).all()
-
-                for service in affected_services:
-                    incident.affected_services.append(service)
-
-                    new_status = self._status_for_impact(data.impact)
-                    db.add(StatusHistory(
-                        service_id=service.service_id,
-                        organization_id=organization.organization_id,
-                        status=new_status,
-                        created_by_id=user.user_id,
-                    ))
-
-                    service.current_status = new_status
-
-                    # Broadcast real-time update
-                    background_tasks.add_task(
-                        broadcast,
-                        organization=organization,
-                        object=Object.SERVICE,
-                        event=Event.STATUS_UPDATED,
-                        data={
-                            "service_id": str(service.service_id),
-                            "name": service.name,
-                            "new_status": new_status.value,
-                            "updated_by": user.name,
-                        }
-                    )
-
-            db.commit()
-            db.refresh(incident)
             return IncidentRead(
                 incident_id=incident.incident_id,
                 title=incident.title,
@@ -95,12 +111,9 @@ class IncidentService(ServiceCRUD):
                 resolved_at=incident.resolved_at,
             )
 
-    def get_incident(self, incident_id: int, user: User, organization: Organization) -> IncidentResponse:
-        with get_db() as db:
-            incident = db.query(Incident).filter(
-                Incident.organization_id == organization.organization_id).filter(
-                Incident.incident_id == incident_id,
-                Incident.is_deleted == False).first()
+    async def get_incident(self, incident_id: int, user: User, organization: Organization) -> IncidentResponse:
+        async with get_async_db() as db:
+            incident = await self._get_incident(db, incident_id, organization)
 
             if not incident:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incident not found")
@@ -120,79 +133,61 @@ class IncidentService(ServiceCRUD):
                 ]
             )
 
-    def get_all_incidents(self, resolved: str, user: User, organization: Organization) -> List[IncidentRead]:
-        with (get_db() as db):
-            status_filter = 1 == 1
+    async def get_all_incidents(self, resolved: str, user: User, organization: Organization) -> List[IncidentRead]:
+        async with get_async_db() as db:
+            status_filter = true()
 
             if resolved == 'true':
                 status_filter = Incident.status == IncidentStatus.RESOLVED
             elif resolved == 'false':
                 status_filter = Incident.status.not_in([IncidentStatus.RESOLVED])
 
-            incidents = db.query(Incident).order_by(Incident.created_at.desc()).filter(
+            incidents = (await db.execute(select(Incident).order_by(Incident.created_at.desc()).filter(
                 Incident.organization_id == organization.organization_id, status_filter,
-                Incident.is_deleted == False).all()
+                Incident.is_deleted == False))).scalars().all()
 
             return [IncidentRead.model_validate(i) for i in incidents]
 
-    def update_incident(self, incident_id: int, updates: IncidentUpdateRequest, user: User,
-                        organization: Organization,
-                        background_tasks: BackgroundTasks) -> Optional[IncidentRead]:
-        with get_db() as db:
-            incident = db.query(Incident).filter(
-                Incident.organization_id == organization.organization_id).filter(
-                Incident.incident_id == incident_id,
-                Incident.is_deleted == False).first()
+    async def update_incident(self, incident_id: int, updates: IncidentUpdateRequest, user: User,
+                              organization: Organization,
+                              background_tasks: BackgroundTasks) -> Optional[IncidentRead]:
+        async with get_async_db() as db:
+            incident = await self._get_incident(db, incident_id, organization)
 
             if not incident:
                 return None
 
             for field, value in updates.model_dump(exclude_unset=True).items():
                 if field == "service_ids" and value is not None:
-                    incident.affected_services = db.query(Service).filter(
+                    incident.affected_services = (await db.execute(select(Service).filter(
                         Service.organization_id == organization.organization_id, Service.service_id.in_(value),
-                        Incident.is_deleted == False).all()
+                        Service.is_deleted == False))).scalars().all()
                 elif field == "impact" and value is not None:
                     setattr(incident, field, value)
                     new_status = self._status_for_impact(value)
 
                     # If the incident is not resolved, then update status for affected services
                     if not incident.status == IncidentStatus.RESOLVED:
-                        for service in incident.affected_services:
-                            # Check for other incidents still affecting this service
-                            other_incidents = db.query(Incident).join(Incident.affected_services).filter(
-                                Incident.organization_id == organization.organization_id,
-                                Incident.incident_id != incident.incident_id,
-                                Incident.status != IncidentStatus.RESOLVED,
-                                Service.service_id == service.service_id,
-                                Incident.is_deleted == False
-                            ).all()
-
-                            # Check if any of the other incidents have equal or higher impact
-                            has_conflict = any(
-                                IMPACT_PRIORITY[other.impact] >= IMPACT_PRIORITY[value]
-                                for other in other_incidents
-                            )
-
-                            if not has_conflict:
-                                service.current_status = new_status
-
-                                status_data = StatusHistoryCreate(
-                                    service_id=service.service_id,
-                                    status=new_status
-                                )
-                                service_crud.create_status_history(status_data, user, organization)
+                        # Services another incident impacts equally or worse keep their status
+                        competing = await self._competing_impact_priorities(db, incident, organization)
+                        await self._record_status_changes(db, [
+                            (service, new_status)
+                            for service in incident.affected_services
+                            if competing.get(service.service_id, 0) < IMPACT_PRIORITY[value]
+                        ], user, organization)
 
                 elif field == "status" and value is not None and value == IncidentStatus.RESOLVED:
                     setattr(incident, field, value)
                     setattr(incident, 'resolved_at', datetime.now(tz=timezone.utc))
 
-                    self._reconcile_affected_services(db, incident, user, organization)
+                    await self._reconcile_affected_services(db, incident, user, organization)
                 else:
                     setattr(incident, field, value)
 
-            db.commit()
-            db.refresh(incident)
+            service_ids = [s.service_id for s in incident.affected_services]
+            await db.commit()
+            await db.refresh(incident)
+            public_status_cache.invalidate(organization.auth0_org_id)
 
             # Broadcast real-time update
             background_tasks.add_task(
@@ -201,7 +196,7 @@ class IncidentService(ServiceCRUD):
                 object=Object.SERVICE,
                 event=Event.BULK_UPDATED,
                 data={
-                    "service_ids": ",".join([str(s.service_id) for s in incident.affected_services]),
+                    "service_ids": ",".join([str(service_id) for service_id in service_ids]),
                     "updated_by": user.name,
                 }
             )
@@ -217,33 +212,28 @@ class IncidentService(ServiceCRUD):
                 resolved_at=incident.resolved_at,
             )
 
-    def delete_incident(self, incident_id: int, user: User, organization: Organization,
-                        background_tasks: BackgroundTasks):
-        with get_db() as db:
-            incident = db.query(Incident).filter(
-                Incident.organization_id == organization.organization_id).filter(
-                Incident.incident_id == incident_id,
-                Incident.is_deleted == False,
-            ).first()
+    async def delete_incident(self, incident_id: int, user: User, organization: Organization,
+                              background_tasks: BackgroundTasks):
+        async with get_async_db() as db:
+            incident = await self._get_incident(db, incident_id, organization)
             if not incident:
                 return False
 
-            self._reconcile_affected_services(db, incident, user, organization)
+            await self._reconcile_affected_services(db, incident, user, organization)
 
             # Soft delete instead of hard delete
             incident.is_deleted = True
             incident.updated_at = datetime.now()
-            db.commit()
 
-            db.query(IncidentUpdate).filter(
+            await db.execute(update(IncidentUpdate).filter(
                 IncidentUpdate.incident_id == incident.incident_id,
                 IncidentUpdate.organization_id == organization.organization_id,
                 IncidentUpdate.is_deleted == False,
-            ).update(
-                {IncidentUpdate.is_deleted: True},
-                synchronize_session=False
-            )
-            db.commit()
+            ).values(
+                {IncidentUpdate.is_deleted: True}
+            ).execution_options(synchronize_session=False))
+            await db.commit()
+            public_status_cache.invalidate(organization.auth0_org_id)
 
             # Broadcast real-time update
             background_tasks.add_task(
@@ -259,35 +249,50 @@ class IncidentService(ServiceCRUD):
 
             return True
 
-    def _reconcile_affected_services(self, db: Session, incident: Incident, user: User, organization: Organization):
-        # Mark all affected services as operational
-        for service in incident.affected_services:
-            # Check for other active incidents affecting this service
-            other_active_incidents = db.query(Incident).join(Incident.affected_services).filter(
-                Incident.organization_id == organization.organization_id,
-                Incident.status != IncidentStatus.RESOLVED,
-                Incident.incident_id != incident.incident_id,
-                Service.service_id == service.service_id,
-                Incident.is_deleted == False
-            ).all()
-
-            # If no other active incidents, mark the service as OPERATIONAL
-            if not other_active_incidents:
-                service.current_status = ServiceStatus.OPERATIONAL
-
-                status_data = StatusHistoryCreate(
-                    service_id=service.service_id,
-                    status=ServiceStatus.OPERATIONAL
-                )
-                service_crud.create_status_history(status_data, user, organization)
+    async def _competing_impact_priorities(self, db: AsyncSession, incident: Incident,
+                                           organization: Organization) -> Dict[int, int]:
+        """
+        Highest IMPACT_PRIORITY among the other unresolved incidents affecting each of the incident's
+        services, in one grouped query. Services no other incident affects are left out.
+        """
+        service_ids = [service.service_id for service in incident.affected_services]
+        if not service_ids:
+            return {}
+
+        # Compared through the column so the enum is bound by name, the way it is stored
+        priority = case(*[(Incident.impact == impact, rank) for impact, rank in IMPACT_PRIORITY.items()], else_=0)
+        rows = await db.execute(select(
+            service_incident_association.c.service_id,
+            func.max(priority),
+        ).join(
+            Incident, Incident.incident_id == service_incident_association.c.incident_id
+        ).filter(
+            Incident.organization_id == organization.organization_id,
+            Incident.status != IncidentStatus.RESOLVED,
+            Incident.incident_id != incident.incident_id,
+            Incident.is_deleted == False,
+            service_incident_association.c.service_id.in_(service_ids),
+        ).group_by(service_incident_association.c.service_id))
+        return {service_id: max_priority for service_id, max_priority in rows}
+
+    async def _reconcile_affected_services(self, db: AsyncSession, incident: Incident, user: User,
+                                           organization: Organization):
+        """Marks the affected services that no other active incident impacts as operational, in the caller's transaction"""
+        still_impacted = await self._competing_impact_priorities(db, incident, organization)
+
+        await self._record_status_changes(db, [
+            (service, ServiceStatus.OPERATIONAL)
+            for service in incident.affected_services
+            if service.service_id not in still_impacted
+        ], user, organization)
 
     # IncidentUpdate CRUD
-    def create_incident_update(self, data: IncidentUpdateCreate, user: User,
-                               organization: Organization, background_tasks: BackgroundTasks) -> IncidentUpdateRead:
-        with get_db() as db:
-            incident = db.query(Incident).filter(Incident.organization_id == organization.organization_id,
-                                                 Incident.incident_id == data.incident_id,
-                                                 Incident.is_deleted == False).first()
+    async def create_incident_update(self, data: IncidentUpdateCreate, user: User,
+                                     organization: Organization, background_tasks: BackgroundTasks) -> IncidentUpdateRead:
+        async with get_async_db() as db:
+            incident = (await db.execute(select(Incident).filter(Incident.organization_id == organization.organization_id,
+                                                                  Incident.incident_id == data.incident_id,
+                                                                  Incident.is_deleted == False))).scalars().first()
             if not incident:
                 raise HTTPException(status_code=404, detail="Incident not found")
 
@@ -302,8 +307,8 @@ class IncidentService(ServiceCRUD):
                 created_by_id=user.user_id,
             )
             db.add(update)
-            db.commit()
-            db.refresh(update)
+            await db.commit()
+            await db.refresh(update)
 
             background_tasks.add_task(
                 broadcast,
@@ -320,13 +325,15 @@ class IncidentService(ServiceCRUD):
 
             return IncidentUpdateRead.model_validate(update)
 
-    def get_incident_updates(self, incident_id: int, user: User, organization: Organization) -> List[
+    async def get_incident_updates(self, incident_id: int, user: User, organization: Organization) -> List[
         IncidentUpdateRead]:
-        with get_db() as db:
-            incident_updates = db.query(IncidentUpdate).order_by(IncidentUpdate.created_at.desc()).filter(
+        async with get_async_db() as db:
+            incident_updates = (await db.execute(select(IncidentUpdate).join(
+                Incident, Incident.incident_id == IncidentUpdate.incident_id
+            ).order_by(IncidentUpdate.created_at.desc()).filter(
                 IncidentUpdate.organization_id == organization.organization_id,
                 IncidentUpdate.incident_id == incident_id,
                 Incident.is_deleted == False,
                 IncidentUpdate.is_deleted == False,
-            ).all()
+            ))).scalars().all()
             return [IncidentUpdateRead.model_validate(iu) for iu in incident_updates]
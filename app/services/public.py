@@ -1,63 +1,108 @@
 from collections import defaultdict
-from typing import Tuple, List, Dict
+from typing import Any, List, Dict, Union
 
+import numpy as np
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.DTO.incident import IncidentRead
-from app.DTO.organization import OrganizationResponse
-from app.db import Service, Incident, StatusHistory, IncidentUpdate
-from app.db.database import get_db
-from app.db.models import Organization, ServiceStatus, service_incident_association, IncidentStatus
-from app.DTO.public import PublicStatus, PublicService, PublicServiceHistoryResponse
+from app.core.cache import CachedSnapshot, public_status_cache
+from app.core.responses import dumps
+from app.db import Service, Incident, IncidentUpdate
+from app.db.database import get_async_db
+from app.db.models import Organization, ServiceStatus, service_incident_association
+from app.DTO.public import PublicStatus, PublicStatusFormat
+from app.services.downtime_matrix import STATUS_BY_CODE
+from app.services.uptime import UptimeCRUD
 
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import and_
+from datetime import datetime, timedelta, timezone, date
+from sqlalchemy import and_, func, select
+
+HISTORY_DAYS = 90
+
+uptime_crud = UptimeCRUD()
 
 
 class PublicStatusCRUD:
-    def get_status(self, org_slug: str) -> PublicStatus:
-        with get_db() as db:
-            return self._build_status(db, org_slug)
+    async def get_status(self, org_slug: str) -> PublicStatus:
+        """Validated public status model, the HTTP endpoint serves get_status_payload instead"""
+        return PublicStatus.model_validate(await self.get_status_payload(org_slug))
 
-    def _build_status(self, db: Session, org_slug: str) -> PublicStatus:
-        org = self._get_organization(db, org_slug)
-        services = self._get_services(db, org.organization_id)
-        incidents_by_service = self._get_incidents_by_service(db, services, org.organization_id)
-        history_map = self._get_status_history_map(db, org.organization_id)
+    async def get_status_payload(self, org_slug: str,
+                                 fmt: PublicStatusFormat = PublicStatusFormat.DEFAULT) -> Dict[str, Any]:
+        """
+        Public status as plain data shaped like PublicStatus, or CompactPublicStatus for the compact
+        format, built from trusted rows without validation.
+        """
+        async with get_async_db() as db:
+            return await self._build_status(db, org_slug, fmt)
+
+    async def get_snapshot(self, org_slug: str,
+                           fmt: PublicStatusFormat = PublicStatusFormat.DEFAULT) -> CachedSnapshot:
+        """Serialized public status, served from cache until the organization broadcasts an event"""
+        snapshot = public_status_cache.get(org_slug, fmt.value)
+        if snapshot:
+            return snapshot
+
+        generation = public_status_cache.generation
+        payload = await self.get_status_payload(org_slug, fmt)
+        return public_status_cache.set(org_slug, fmt.value, payload["organization"]["auth0_org_id"], dumps(payload),
+                                       generation)
+
+    async def _build_status(self, db: AsyncSession, org_slug: str, fmt: PublicStatusFormat) -> Dict[str, Any]:
+        org = await self._get_organization(db, org_slug)
+        services = await self._get_services(db, org.organization_id)
+        incidents_by_service = await self._get_incidents_by_service(db, services, org.organization_id)
+        latest_updates = await self._get_latest_updates(db, services, incidents_by_service)
+        now = datetime.now(timezone.utc)
+        start_day = now.date() - timedelta(days=HISTORY_DAYS)
+        downtime, worst = await uptime_crud.get_daily_downtime(db, org.organization_id, services, start_day,
+                                                               HISTORY_DAYS + 1, now)
+
+        downtime, worst = np.round(downtime, 2).tolist(), worst.tolist()
+        if fmt == PublicStatusFormat.COMPACT_V1:
+            # Severity codes are already the indexes into STATUS_BY_CODE
+            histories = [{"start_date": start_day, "downtime_seconds": downtime[i], "status": worst[i]}
+                         for i in range(len(services))]
+        else:
+            days = [start_day + timedelta(days=offset) for offset in range(HISTORY_DAYS + 1)]
+            histories = [self._build_daily_history(days, downtime[i], worst[i]) for i in range(len(services))]
 
         public_services = [
-            self._build_public_service(db, service, history_map, incidents_by_service)
-            for service in services
+            self._build_public_service(service, histories[i], incidents_by_service, latest_updates)
+            for i, service in enumerate(services)
         ]
 
-        incident_response = [IncidentRead.model_validate(i) for i in set(sum(incidents_by_service.values(), []))]
+        incidents = {i.incident_id: i for incidents in incidents_by_service.values() for i in incidents}
 
-        return PublicStatus(
-            public_services=public_services,
-            incidents=incident_response,
-            organization=OrganizationResponse(name=org.display_name, auth0_org_id=org.auth0_org_id),
-        )
+        payload = {
+            "organization": {"auth0_org_id": org.auth0_org_id, "name": org.display_name},
+            "public_services": public_services,
+            "incidents": [self._build_incident(incident) for incident in incidents.values()],
+        }
+        if fmt == PublicStatusFormat.COMPACT_V1:
+            payload = {"format": fmt, "status_codes": STATUS_BY_CODE, **payload}
+        return payload
 
-    def _get_organization(self, db: Session, slug: str) -> Organization:
-        org = db.query(Organization).filter(Organization.name == slug, Organization.is_deleted == False).first()
+    async def _get_organization(self, db: AsyncSession, slug: str) -> Organization:
+        org = (await db.execute(select(Organization).filter(
+            Organization.name == slug, Organization.is_deleted == False))).scalars().first()
         if not org:
             raise HTTPException(status_code=404, detail="Organization not found")
         return org
 
-    def _get_services(self, db: Session, org_id: int) -> List[Service]:
-        services = db.query(Service).filter(Service.organization_id == org_id, Service.is_deleted == False).order_by(Service.service_id.desc()).all()
+    async def _get_services(self, db: AsyncSession, org_id: int) -> List[Service]:
+        services = (await db.execute(select(Service).filter(Service.organization_id == org_id, Service.is_deleted == False).order_by(Service.service_id.desc()))).scalars().all()
         return services
 
-    def _get_incidents_by_service(self, db: Session, services: List[Service], org_id: int) -> Dict[int, List[Incident]]:
+    async def _get_incidents_by_service(self, db: AsyncSession, services: List[Service], org_id: int) -> Dict[int, List[Incident]]:
         service_ids = [s.service_id for s in services]
-        incident_service_map = db.query(
+        incident_service_map = (await db.execute(select(
             service_incident_association.c.service_id,
             Incident
         ).join(Incident, and_(Incident.incident_id == service_incident_association.c.incident_id, Incident.is_deleted == False)).filter(
             Incident.organization_id == org_id,
             service_incident_association.c.service_id.in_(service_ids)
-        ).order_by(Incident.created_at.desc()).all()
+        ).order_by(Incident.created_at.desc()))).all()
 
         service_to_incidents: Dict[int, List[Incident]] = defaultdict(list)
         for service_id, incident in incident_service_map:
@@ -65,50 +110,63 @@ class PublicStatusCRUD:
 
         return service_to_incidents
 
-    def _get_status_history_map(self, db: Session, org_id: int) -> Dict[Tuple[int, datetime], List[StatusHistory]]:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=90)
-
-        entries = db.query(StatusHistory).filter(
-            and_(
-                StatusHistory.organization_id == org_id,
-                StatusHistory.created_at >= start_date,
-                StatusHistory.created_at <= end_date,
-                StatusHistory.is_deleted == False,
-            )
-        ).order_by(StatusHistory.created_at).all()
-
-        history_map: Dict[Tuple[int, datetime], List[StatusHistory]] = defaultdict(list)
-        for entry in entries:
-            key = (entry.service_id, entry.created_at.date())
-            history_map[key].append(entry)
-
-        return history_map
+    async def _get_latest_updates(self, db: AsyncSession, services: List[Service],
+                            service_to_incidents: Dict[int, List[Incident]]) -> Dict[int, IncidentUpdate]:
+        """Latest update of the most recent incident of every non-operational service, in a single query"""
+        incident_ids = {
+            service_to_incidents[service.service_id][0].incident_id
+            for service in services
+            if service.current_status != ServiceStatus.OPERATIONAL and service_to_incidents.get(service.service_id)
+        }
+        if not incident_ids:
+            return {}
+
+        ranked = select(
+            IncidentUpdate.incident_update_id,
+            func.row_number().over(
+                partition_by=IncidentUpdate.incident_id,
+                order_by=(IncidentUpdate.created_at.desc(), IncidentUpdate.incident_update_id.desc()),
+            ).label("rn"),
+        ).filter(
+            IncidentUpdate.incident_id.in_(incident_ids),
+            IncidentUpdate.is_deleted == False,
+        ).subquery()
+
+        updates = (await db.execute(select(IncidentUpdate).join(
+            ranked, and_(ranked.c.incident_update_id == IncidentUpdate.incident_update_id, ranked.c.rn == 1)
+        ))).scalars().all()
+        return {update.incident_id: update for update in updates}
+
+    @staticmethod
+    def _build_incident(incident: Incident) -> Dict[str, Any]:
+        """Same fields as IncidentRead"""
+        return {
+            "title": incident.title,
+            "description": incident.description,
+            "status": incident.status,
+            "impact": incident.impact,
+            "incident_id": incident.incident_id,
+            "created_at": incident.created_at,
+            "resolved_at": incident.resolved_at,
+            "updated_at": incident.updated_at,
+        }
+
+    @staticmethod
+    def _build_daily_history(days: List[date], downtime: List[float], worst: List[int]) -> List[Dict[str, Any]]:
+        """One PublicServiceHistoryResponse shaped dict per day"""
+        return [
+            {"date": day, "downtime_seconds": seconds, "status": STATUS_BY_CODE[code]}
+            for day, seconds, code in zip(days, downtime, worst)
+        ]
 
     def _build_public_service(
             self,
-            db: Session,
             service: Service,
-            history_map: Dict[Tuple[int, datetime], List[StatusHistory]],
+            uptime_history: Union[List[Dict[str, Any]], Dict[str, Any]],
             service_to_incidents: Dict[int, List[Incident]],
-    ) -> PublicService:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=90)
-
-        uptime_history: List[PublicServiceHistoryResponse] = []
-        current_date = start_date
-
-        while current_date <= end_date:
-            key = (service.service_id, current_date.date())
-            entries = history_map.get(key, [])
-            downtime_seconds, status = self.calculate_service_downtime(service.service_id, entries, current_date)
-            uptime_history.append(PublicServiceHistoryResponse(
-                date=current_date.date(),
-                downtime_seconds=downtime_seconds,
-                status=status
-            ))
-            current_date += timedelta(days=1)
-
+            latest_updates: Dict[int, IncidentUpdate],
+    ) -> Dict[str, Any]:
+        """Same fields as PublicService (CompactPublicService with a compact uptime_history)"""
         latest_message, latest_status = None, None
         if service.current_status != ServiceStatus.OPERATIONAL:
             incidents = service_to_incidents.get(service.service_id, [])
@@ -116,59 +174,20 @@ class PublicStatusCRUD:
                 latest = incidents[0]  # Already sorted by created_at desc
                 latest_status = latest.status
 
-                # Try to get the latest incident update message if it exists
-                latest_update = db.query(IncidentUpdate).filter(
-                    IncidentUpdate.incident_id == latest.incident_id,
-                    IncidentUpdate.is_deleted == False,
-                ).order_by(IncidentUpdate.created_at.desc()).first()
+                # Use the latest incident update message if it exists
+                latest_update = latest_updates.get(latest.incident_id)
 
                 if latest_update:
                     latest_message = latest_update.message
                 else:
                     latest_message = latest.description
 
-        return PublicService(
-            id=service.service_id,
-            name=service.name,
-            description=service.description,
-            current_status=service.current_status,
-            uptime_history=uptime_history,
-            latest_incident_message=latest_message,
-            latest_incident_status=latest_status
-        )
-
-    def calculate_service_downtime(
-            self,
-            service_id: int,
-            day_entries: List[StatusHistory],
-            current_date: datetime
-    ) -> Tuple[float, ServiceStatus]:
-        """
-        Calculates total downtime in seconds for a given service on a specific day.
-        """
-        if not day_entries:
-            return 0.0, ServiceStatus.OPERATIONAL
-
-        day_start = datetime.combine(current_date.date(), datetime.min.time()).replace(tzinfo=timezone.utc)
-        day_end = datetime.now(timezone.utc)
-
-        total_downtime = timedelta()
-        prev_time = day_start
-        current_status = ServiceStatus.OPERATIONAL
-        downtime_active = False
-
-        for entry in day_entries:
-            if downtime_active:
-                total_downtime += entry.created_at - prev_time
-
-            downtime_active = entry.status != ServiceStatus.OPERATIONAL
-            if downtime_active:
-                current_status = entry.status
-
-            prev_time = entry.created_at
-
-        # Handle trailing downtime until end of day
-        if downtime_active:
-            total_downtime += day_end - prev_time
-
-        return round(total_downtime.total_seconds(), 2), current_status
+        return {
+            "id": service.service_id,
+            "name": service.name,
+            "description": service.description,
+            "current_status": service.current_status,
+            "latest_incident_message": latest_message,
+            "latest_incident_status": latest_status,
+            "uptime_history": uptime_history,
+        }
@@ -0,0 +1,182 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone, date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Service, ServiceDailyRollup, ServiceStatus, StatusHistory, STATUS_SEVERITY
+from app.utils.utils import ensure_utc
+
+
+@dataclass
+class StatusTransition:
+    """A service moving from `old_status` (held since `since`) to `new_status` at `at`."""
+    service_id: int
+    organization_id: int
+    old_status: ServiceStatus
+    since: Optional[datetime]
+    new_status: ServiceStatus
+    at: datetime
+
+
+def split_by_day(start: datetime, end: datetime) -> Iterator[Tuple[date, float]]:
+    """Yields (day, seconds) for every UTC day the interval [start, end) overlaps."""
+    start, end = ensure_utc(start), ensure_utc(end)
+    while start < end:
+        next_day = datetime.combine(start.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        chunk_end = min(next_day, end)
+        yield start.date(), (chunk_end - start).total_seconds()
+        start = chunk_end
+
+
+def worst_status(*statuses: Optional[ServiceStatus]) -> ServiceStatus:
+    return max((s for s in statuses if s is not None), key=STATUS_SEVERITY.get, default=ServiceStatus.OPERATIONAL)
+
+
+def _severity(column):
+    # Compared through the column so the enum is bound by name, the way it is stored
+    return case(*[(column == status, rank) for status, rank in STATUS_SEVERITY.items()], else_=0)
+
+
+def _insert_for(db: AsyncSession):
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+class StatusRollupCRUD:
+    async def record_transitions(self, db: AsyncSession, transitions: List[StatusTransition]):
+        """
+        Folds status transitions into the daily rollups inside the caller's transaction.
+        The interval that just closed adds its downtime to every day it spans and the
+        new status counts towards the worst status of the day it starts on.
+        """
+        buckets: Dict[Tuple[int, date], list] = {}
+
+        def bucket(service_id: int, organization_id: int, day: date) -> list:
+            key = (service_id, day)
+            if key not in buckets:
+                buckets[key] = [organization_id, 0.0, ServiceStatus.OPERATIONAL]
+            return buckets[key]
+
+        for transition in transitions:
+            if transition.old_status != ServiceStatus.OPERATIONAL and transition.since is not None:
+                for day, seconds in split_by_day(transition.since, transition.at):
+                    entry = bucket(transition.service_id, transition.organization_id, day)
+                    entry[1] += seconds
+                    entry[2] = worst_status(entry[2], transition.old_status)
+
+            if transition.new_status != ServiceStatus.OPERATIONAL:
+                entry = bucket(transition.service_id, transition.organization_id, ensure_utc(transition.at).date())
+                entry[2] = worst_status(entry[2], transition.new_status)
+
+        if not buckets:
+            return
+
+        stmt = _insert_for(db)(ServiceDailyRollup).values([
+            {
+                "service_id": service_id,
+                "day": day,
+                "organization_id": organization_id,
+                "downtime_seconds": round(downtime_seconds, 2),
+                "worst_status": status,
+            }
+            for (service_id, day), (organization_id, downtime_seconds, status) in buckets.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ServiceDailyRollup.service_id, ServiceDailyRollup.day],
+            set_={
+                "downtime_seconds": ServiceDailyRollup.downtime_seconds + stmt.excluded.downtime_seconds,
+                "worst_status": case(
+                    (_severity(stmt.excluded.worst_status) > _severity(ServiceDailyRollup.worst_status),
+                     stmt.excluded.worst_status),
+                    else_=ServiceDailyRollup.worst_status,
+                ),
+                "updated_at": func.now(),
+            },
+        )
+        await db.execute(stmt)
+
+    async def get_rollup_map(self, db: AsyncSession, organization_id: int, start_day: date, end_day: date) -> Dict[
+        Tuple[int, date], ServiceDailyRollup]:
+        rollups = (await db.execute(select(ServiceDailyRollup).filter(
+            ServiceDailyRollup.organization_id == organization_id,
+            ServiceDailyRollup.day >= start_day,
+            ServiceDailyRollup.day <= end_day,
+        ))).scalars().all()
+        return {(r.service_id, r.day): r for r in rollups}
+
+    async def backfill(self, db: AsyncSession, organization_id: Optional[int] = None, days: int = 90) -> int:
+        """
+        Rebuilds the rollups of the last `days` days from raw status history.
+        Returns the number of services that were processed.
+        """
+        today = datetime.now(timezone.utc).date()
+        start = datetime.combine(today - timedelta(days=days), datetime.min.time(), tzinfo=timezone.utc)
+
+        service_query = select(Service).filter(Service.is_deleted == False)
+        if organization_id is not None:
+            service_query = service_query.filter(Service.organization_id == organization_id)
+        services = (await db.execute(service_query)).scalars().all()
+        if not services:
+            return 0
+        service_ids = [s.service_id for s in services]
+
+        # Status each service had when the window opened
+        latest_before = select(
+            StatusHistory.service_id,
+            StatusHistory.status,
+            StatusHistory.created_at,
+            func.row_number().over(
+                partition_by=StatusHistory.service_id,
+                order_by=(StatusHistory.created_at.desc(), StatusHistory.status_history_id.desc()),
+            ).label("rn"),
+        ).filter(
+            StatusHistory.service_id.in_(service_ids),
+            StatusHistory.created_at < start,
+            StatusHistory.is_deleted == False,
+        ).subquery()
+        prior = {
+            row.service_id: row
+            for row in await db.execute(select(latest_before).filter(latest_before.c.rn == 1))
+        }
+
+        history_by_service: Dict[int, List[StatusHistory]] = defaultdict(list)
+        history_rows = (await db.execute(select(StatusHistory).filter(
+            StatusHistory.service_id.in_(service_ids),
+            StatusHistory.created_at >= start,
+            StatusHistory.is_deleted == False,
+        ).order_by(StatusHistory.service_id, StatusHistory.created_at, StatusHistory.status_history_id))).scalars()
+        for row in history_rows:
+            history_by_service[row.service_id].append(row)
+
+        await db.execute(delete(ServiceDailyRollup).filter(
+            ServiceDailyRollup.service_id.in_(service_ids),
+            ServiceDailyRollup.day >= start.date(),
+        ))
+
+        transitions: List[StatusTransition] = []
+        for service in services:
+            before = prior.get(service.service_id)
+            status = before.status if before else ServiceStatus.OPERATIONAL
+            since = start if before else None
+            changed_at = before.created_at if before else None
+
+            for row in history_by_service.get(service.service_id, []):
+                transitions.append(StatusTransition(
+                    service_id=service.service_id,
+                    organization_id=service.organization_id,
+                    old_status=status,
+                    since=since,
+                    new_status=row.status,
+                    at=row.created_at,
+                ))
+                status, since, changed_at = row.status, row.created_at, row.created_at
+
+            service.status_changed_at = changed_at or service.created_at
+
+        await self.record_transitions(db, transitions)
+        return len(services)
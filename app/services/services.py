@@ -1,96 +1,146 @@
-from collections import defaultdict
 from fastapi import BackgroundTasks, HTTPException, status
-from sqlalchemy.orm import joinedload
-from typing import List, Optional
-from datetime import datetime, timedelta, timezone
-
-from app.DTO.status_history import StatusHistoryCreate, StatusHistoryRead
+from sqlalchemy import case, insert, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional, Tuple
+from datetime import datetime, time, timedelta, timezone
+
+from app.DTO.status_history import StatusHistoryCreate, StatusHistoryRead, StatusSample, StatusIngestResponse
+from app.config import settings
+from app.core.cache import public_status_cache
 from app.core.objects import Object, Event
 from app.db import Organization
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import Service, User, StatusHistory, ServiceStatus
+from app.db.partitions import retention_start
 from app.DTO.services import ServiceCreate, ServiceUpdate, ServiceStatusUpdate, ServiceResponse, \
-    ServiceWithHistoryResponse, StatusHistoryResponse
+    ServiceWithHistoryResponse, StatusHistoryResponse, ServiceUptimeResponse
+from app.services.rollup import StatusRollupCRUD, StatusTransition
+from app.services.uptime import UptimeCRUD, advance_counters
+from app.utils.utils import ensure_utc
 
 from app.websocket.websockets import broadcast
 
+# Rows fetched from the server side cursor at a time when streaming status history
+STATUS_HISTORY_STREAM_BATCH_SIZE = 1000
+
+rollup_crud = StatusRollupCRUD()
+uptime_crud = UptimeCRUD()
+
 
 class ServiceCRUD:
-    def get_services(
+    async def _record_status_change(self, db: AsyncSession, service: Service, new_status: ServiceStatus, user: User,
+                              organization: Organization, changed_at: Optional[datetime] = None) -> StatusHistory:
+        """Writes a status history entry, folds it into the daily rollups and moves the service to new_status"""
+        return (await self._record_status_changes(db, [(service, new_status)], user, organization, changed_at))[0]
+
+    async def _record_status_changes(self, db: AsyncSession, changes: List[Tuple[Service, ServiceStatus]], user: User,
+                                     organization: Organization,
+                                     changed_at: Optional[datetime] = None) -> List[StatusHistory]:
+        """Bulk version of _record_status_change, everything is written inside the caller's transaction"""
+        changed_at = changed_at or datetime.now(timezone.utc)
+
+        # Downtime totals at changed_at, accumulated over the status each service is leaving
+        counters = [
+            advance_counters(service.cumulative_downtime_seconds, service.cumulative_weighted_downtime_seconds,
+                             service.current_status, service.status_changed_at, changed_at)
+            for service, _ in changes
+        ]
+
+        status_histories = [
+            StatusHistory(
+                service_id=service.service_id,
+                organization_id=organization.organization_id,
+                status=new_status,
+                created_by_id=user.user_id,
+                created_at=changed_at,
+                cumulative_downtime_seconds=downtime,
+                cumulative_weighted_downtime_seconds=weighted_downtime,
+            )
+            for (service, new_status), (downtime, weighted_downtime) in zip(changes, counters)
+        ]
+        db.add_all(status_histories)
+
+        await rollup_crud.record_transitions(db, [
+            StatusTransition(
+                service_id=service.service_id,
+                organization_id=organization.organization_id,
+                old_status=service.current_status,
+                since=service.status_changed_at,
+                new_status=new_status,
+                at=changed_at,
+            )
+            for service, new_status in changes
+        ])
+
+        for (service, new_status), (downtime, weighted_downtime) in zip(changes, counters):
+            service.current_status = new_status
+            service.status_changed_at = changed_at
+            service.cumulative_downtime_seconds = downtime
+            service.cumulative_weighted_downtime_seconds = weighted_downtime
+        return status_histories
+
+    async def get_services(
             self,
             user: User,
             organization: Organization
     ) -> List[ServiceWithHistoryResponse]:
         """Get services for user's organization"""
-        with get_db() as db:
-            ninety_days_ago = datetime.now(timezone.utc) - timedelta(days=90)
+        async with get_async_db() as db:
             now = datetime.now(timezone.utc)
 
-            services = db.query(Service).order_by(Service.service_id.desc()).filter(
+            services = (await db.execute(select(Service).order_by(Service.service_id.desc()).filter(
                 Service.organization_id == organization.organization_id,
-                Service.is_deleted == False).all()
-
-            service_ids = [s.service_id for s in services]
-            history_rows = db.query(StatusHistory).filter(
-                StatusHistory.service_id.in_(service_ids),
-                StatusHistory.created_at >= ninety_days_ago,
-                StatusHistory.is_deleted == False,
-            ).order_by(StatusHistory.service_id, StatusHistory.created_at).all()
+                Service.is_deleted == False))).scalars().all()
 
-            history_by_service = defaultdict(list)
-            for row in history_rows:
-                history_by_service[row.service_id].append(row)
+            # Uptime over the last 90 days, any non-operational status counts as downtime
+            uptimes = await uptime_crud.get_indexed_uptime(db, organization.organization_id, services,
+                                                           now - timedelta(days=90), now)
 
+            # Built from database rows, nothing to validate
             service_responses = []
             for service in services:
-
-                # Get status history within the last 90 days
-                history = history_by_service.get(service.service_id, [])
-
-                # Ensure timeline starts at 90 days ago
-                if not history or history[0].created_at > ninety_days_ago:
-                    history.insert(0, StatusHistory(
-                        status=service.current_status,
-                        created_at=ninety_days_ago
-                    ))
-
-                # Ensure timeline ends at now
-                history.append(StatusHistory(status=service.current_status, created_at=now))
-
-                # Calculate downtime
-                total_downtime = timedelta(0)
-                for i in range(len(history) - 1):
-                    curr, next_ = history[i], history[i + 1]
-                    if curr.status != ServiceStatus.OPERATIONAL:
-                        total_downtime += (next_.created_at - curr.created_at)
-
-                uptime_duration = timedelta(days=90) - total_downtime
-                uptime_percentage = float(
-                    f"{(uptime_duration.total_seconds() / timedelta(days=90).total_seconds()) * 100:.2f}")
-
-                service_responses.append(ServiceWithHistoryResponse(
+                service_responses.append(ServiceWithHistoryResponse.model_construct(
                     service_id=service.service_id,
                     name=service.name,
                     description=service.description,
                     current_status=service.current_status,
                     created_at=service.created_at,
                     updated_at=service.updated_at,
-                    uptime_percentage=uptime_percentage,
+                    uptime_percentage=uptimes[service.service_id].uptime_percentage(),
                 ))
 
             return service_responses
 
-    def get_service(self, service_id: int, user: User, organization: Organization, background_tasks: BackgroundTasks) -> \
-            Optional[ServiceWithHistoryResponse]:
-        """Get service by ID if user has access"""
-        with get_db() as db:
-            service = db.query(Service).filter(
+    async def get_recent_status_history(self, db: AsyncSession, service_id: int, organization: Organization,
+                                        limit: int = 10) -> List[StatusHistoryResponse]:
+        """Latest `limit` status changes of a service, newest first, walked off the (service_id, created_at) index"""
+        if limit <= 0:
+            return []
+        rows = await db.execute(select(
+            StatusHistory.status_history_id,
+            StatusHistory.status,
+            StatusHistory.created_at,
+            User.name.label("created_by_name"),
+        ).join(
+            User, User.user_id == StatusHistory.created_by_id
+        ).filter(
+            StatusHistory.service_id == service_id,
+            StatusHistory.organization_id == organization.organization_id,
+            StatusHistory.is_deleted == False,
+        ).order_by(
+            StatusHistory.created_at.desc(), StatusHistory.status_history_id.desc()
+        ).limit(limit))
+        return [StatusHistoryResponse.model_validate(row) for row in rows]
+
+    async def get_service(self, service_id: int, user: User, organization: Organization,
+                          history_limit: int = 10) -> Optional[ServiceWithHistoryResponse]:
+        """Get service by ID if user has access, with its latest `history_limit` status changes"""
+        async with get_async_db() as db:
+            service = (await db.execute(select(Service).filter(
                 Service.service_id == service_id,
                 Service.organization_id == organization.organization_id,
                 Service.is_deleted == False,
-            ).options(
-                joinedload(Service.status_history).joinedload(StatusHistory.created_by)
-            ).first()
+            ))).scalars().first()
 
             if not service:
                 raise HTTPException(
@@ -98,19 +148,13 @@ class ServiceCRUD:
                     detail="Service not found"
                 )
 
-            # Get status history
-            status_history = []
-            for history in service.status_history[-10:]:  # Last 10 entries
-                status_history.append(StatusHistoryResponse(
-                    status_history_id=history.status_history_id,
-                    status=history.status,
-                    created_at=history.created_at,
-                    created_by_name=history.created_by.name,
-                ))
-
-            status_history = sorted(status_history, key=lambda h: h.created_at, reverse=True)
+            status_history = await self.get_recent_status_history(db, service.service_id, organization,
+                                                                  limit=history_limit)
 
-            uptime_percentage = self.get_service_uptime(service_id=service_id, user=user, organization=organization)
+            now = datetime.now(timezone.utc)
+            uptimes = await uptime_crud.get_indexed_uptime(db, organization.organization_id, [service],
+                                                           now - timedelta(days=30), now)
+            uptime_percentage = uptimes[service.service_id].uptime_percentage(weighted=True)
 
             return ServiceWithHistoryResponse(
                 service_id=service.service_id,
@@ -123,35 +167,28 @@ class ServiceCRUD:
                 uptime_percentage=uptime_percentage
             )
 
-    def create_service(self, service_in: ServiceCreate, user: User, organization: Organization,
+    async def create_service(self, service_in: ServiceCreate, user: User, organization: Organization,
                        background_tasks: BackgroundTasks) -> Optional[
         ServiceResponse]:
         """Create a new service"""
         # Create service
-        with get_db() as db:
+        async with get_async_db() as db:
             service = Service(
                 name=service_in.name,
                 description=service_in.description,
-                current_status=service_in.current_status,
+                current_status=ServiceStatus.OPERATIONAL,
                 organization_id=organization.organization_id,
                 created_at=datetime.now(),
             )
 
             db.add(service)
-            db.flush()
+            await db.flush()
 
             # Create initial status history entry
-            status_history = StatusHistory(
-                service_id=service.service_id,
-                organization_id=organization.organization_id,
-                status=service_in.current_status,
-                created_by_id=user.user_id,
-                created_at=datetime.now(),
-            )
-            db.add(status_history)
+            await self._record_status_change(db, service, service_in.current_status, user, organization)
 
-            db.commit()
-            db.refresh(service)
+            await db.commit()
+            await db.refresh(service)
 
             service_response = ServiceResponse(
                 service_id=service.service_id,
@@ -177,7 +214,7 @@ class ServiceCRUD:
 
             return service_response
 
-    def update_service(
+    async def update_service(
             self,
             service_id: int,
             service_in: ServiceUpdate,
@@ -186,23 +223,28 @@ class ServiceCRUD:
             background_tasks: BackgroundTasks
     ) -> Optional[ServiceResponse]:
         """Update service details"""
-        with get_db() as db:
-            service = db.query(Service).filter(
+        async with get_async_db() as db:
+            service = (await db.execute(select(Service).filter(
                 Service.service_id == service_id,
                 Service.organization_id == organization.organization_id,
                 Service.is_deleted == False,
-            ).first()
+            ))).scalars().first()
 
             if not service:
                 return None
 
             # Update fields
             update_data = service_in.model_dump(exclude_unset=True)
+            new_status = update_data.pop("current_status", None)
             for field, value in update_data.items():
                 setattr(service, field, value)
 
-            db.commit()
-            db.refresh(service)
+            # Status changes go through the history, rollups and downtime counters like any other
+            if new_status is not None and new_status != service.current_status:
+                await self._record_status_change(db, service, new_status, user, organization)
+
+            await db.commit()
+            await db.refresh(service)
 
             # Broadcast real-time update
             background_tasks.add_task(
@@ -226,7 +268,7 @@ class ServiceCRUD:
                 updated_at=service.updated_at
             )
 
-    def update_service_status(
+    async def update_service_status(
             self,
             service_id: int,
             status_update: ServiceStatusUpdate,
@@ -235,31 +277,23 @@ class ServiceCRUD:
             background_tasks: BackgroundTasks
     ) -> Optional[ServiceResponse]:
         """Update service status and create history entry"""
-        with get_db() as db:
-            service = db.query(Service).filter(
+        async with get_async_db() as db:
+            service = (await db.execute(select(Service).filter(
                 Service.service_id == service_id,
                 Service.organization_id == organization.organization_id,
                 Service.is_deleted == False,
-            ).first()
+            ))).scalars().first()
             if not service:
                 return None
 
             # Only update if status actually changed
+            old_status = service.current_status
             if service.current_status != status_update.status:
-                old_status = service.current_status
-                service.current_status = status_update.status
-
                 # Create status history entry
-                status_history = StatusHistory(
-                    service_id=service.service_id,
-                    organization_id=organization.organization_id,
-                    status=status_update.status,
-                    created_by_id=user.user_id
-                )
-                db.add(status_history)
+                await self._record_status_change(db, service, status_update.status, user, organization)
 
-                db.commit()
-                db.refresh(service)
+                await db.commit()
+                await db.refresh(service)
 
             # Broadcast real-time update
             background_tasks.add_task(
@@ -286,21 +320,139 @@ class ServiceCRUD:
                 updated_at=service.updated_at
             )
 
-    def delete_service(self, service_id: int, user: User, organization: Organization,
+    async def ingest_status_samples(self, samples: List[StatusSample], user: User, organization: Organization,
+                                    background_tasks: BackgroundTasks) -> StatusIngestResponse:
+        """
+        Applies a batch of monitor samples in one transaction. Samples that don't change the
+        service's status, or that were observed before its last change, are dropped. The rest
+        are written with a multi-row insert and every service is updated by a single statement.
+        Samples observed before the retained status history have no partition to land in, the
+        batch is rejected with an error for each of them.
+        """
+        now = datetime.now(timezone.utc)
+        retained_from = datetime.combine(retention_start(settings.STATUS_HISTORY_RETENTION_MONTHS, now), time.min,
+                                         tzinfo=timezone.utc)
+        too_old = [
+            {
+                "loc": ["body", "samples", index, "observed_at"],
+                "msg": f"Observed before {retained_from.date().isoformat()}, the start of the retained status history",
+                "type": "value_error",
+            }
+            for index, sample in enumerate(samples)
+            if sample.observed_at is not None and ensure_utc(sample.observed_at) < retained_from
+        ]
+        if too_old:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=too_old)
+
+        service_ids = {sample.service_id for sample in samples}
+
+        async with get_async_db() as db:
+            # Locked so concurrent batches for the same services apply one after the other
+            services = {row.service_id: row for row in await db.execute(select(
+                Service.service_id, Service.current_status, Service.status_changed_at,
+                Service.cumulative_downtime_seconds, Service.cumulative_weighted_downtime_seconds,
+            ).filter(
+                Service.service_id.in_(service_ids),
+                Service.organization_id == organization.organization_id,
+                Service.is_deleted == False,
+            ).with_for_update())}
+
+            history_rows, transitions = [], []
+            # service_id -> (status, since, cumulative downtime, cumulative weighted downtime)
+            current = {
+                service_id: (row.current_status, row.status_changed_at, row.cumulative_downtime_seconds,
+                             row.cumulative_weighted_downtime_seconds)
+                for service_id, row in services.items()
+            }
+            unchanged = stale = 0
+            ordered = sorted(
+                ((sample.service_id, min(ensure_utc(sample.observed_at or now), now), sample.status)
+                 for sample in samples if sample.service_id in services),
+                key=lambda sample: (sample[0], sample[1]),
+            )
+            for service_id, observed_at, new_status in ordered:
+                old_status, since, downtime, weighted_downtime = current[service_id]
+                if since is not None and observed_at < ensure_utc(since):
+                    stale += 1
+                    continue
+                if new_status == old_status:
+                    unchanged += 1
+                    continue
+
+                downtime, weighted_downtime = advance_counters(downtime, weighted_downtime, old_status, since,
+                                                               observed_at)
+                history_rows.append({
+                    "service_id": service_id,
+                    "organization_id": organization.organization_id,
+                    "status": new_status,
+                    "created_by_id": user.user_id,
+                    "created_at": observed_at,
+                    "cumulative_downtime_seconds": downtime,
+                    "cumulative_weighted_downtime_seconds": weighted_downtime,
+                })
+                transitions.append(StatusTransition(
+                    service_id=service_id,
+                    organization_id=organization.organization_id,
+                    old_status=old_status,
+                    since=since,
+                    new_status=new_status,
+                    at=observed_at,
+                ))
+                current[service_id] = (new_status, observed_at, downtime, weighted_downtime)
+
+            updated = {t.service_id: current[t.service_id] for t in transitions}
+            if updated:
+                await db.execute(insert(StatusHistory), history_rows)
+                await rollup_crud.record_transitions(db, transitions)
+                columns = [Service.current_status, Service.status_changed_at, Service.cumulative_downtime_seconds,
+                           Service.cumulative_weighted_downtime_seconds]
+                await db.execute(update(Service).filter(Service.service_id.in_(updated)).values({
+                    column: case(
+                        {service_id: literal(values[i], column.type) for service_id, values in updated.items()},
+                        value=Service.service_id,
+                    )
+                    for i, column in enumerate(columns)
+                }).execution_options(synchronize_session=False))
+                await db.commit()
+
+        if updated:
+            public_status_cache.invalidate(organization.auth0_org_id)
+            # One event for the whole batch, clients refetch the services listed
+            background_tasks.add_task(
+                broadcast,
+                organization=organization,
+                object=Object.SERVICE,
+                event=Event.BULK_UPDATED,
+                data={
+                    "service_ids": ",".join(str(service_id) for service_id in updated),
+                    "updated_by": user.name,
+                }
+            )
+
+        return StatusIngestResponse(
+            received=len(samples),
+            written=len(history_rows),
+            unchanged=unchanged,
+            stale=stale,
+            unknown_service_ids=sorted(service_ids - services.keys()),
+            updated_service_ids=list(updated),
+        )
+
+    async def delete_service(self, service_id: int, user: User, organization: Organization,
                        background_tasks: BackgroundTasks) -> bool:
         """Delete service if user has access"""
-        with get_db() as db:
-            service = db.query(Service).filter(
+        async with get_async_db() as db:
+            service = (await db.execute(select(Service).filter(
                 Service.service_id == service_id,
                 Service.organization_id == organization.organization_id,
                 Service.is_deleted == False,
-            ).first()
+            ))).scalars().first()
             if not service:
                 return False
 
             service.is_deleted = True
             service.updated_at = datetime.now()
-            db.commit()
+            await db.commit()
 
             # Broadcast real-time update
             background_tasks.add_task(
@@ -316,93 +468,155 @@ class ServiceCRUD:
 
         return True
 
-    def get_service_uptime(
+    async def get_service_uptime(
             self,
             service_id: int,
             user: User,
             organization: Organization,
             days: int = 30
     ) -> float:
-        """Calculate service uptime percentage over specified days"""
-        start_date = datetime.now() - timedelta(days=days)
-
-        with get_db() as db:
-            # Get all status changes in the period
-            status_changes = db.query(StatusHistory).filter(
-                StatusHistory.service_id == service_id,
-                StatusHistory.organization_id == organization.organization_id,
-                StatusHistory.created_at >= start_date,
-                StatusHistory.is_deleted == False,
-            ).order_by(StatusHistory.created_at).all()
-
-            if not status_changes:
-                # No status changes, assume operational
-                return 100.0
-
-            total_minutes = days * 24 * 60
-            downtime_minutes = 0
-
-            current_time = datetime.now()
-            previous_time = start_date
-            previous_status = ServiceStatus.OPERATIONAL
-
-            for change in status_changes:
-                # Calculate time in previous status
-                duration = (change.created_at - previous_time).total_seconds() / 60
-
-                if previous_status in [ServiceStatus.PARTIAL_OUTAGE, ServiceStatus.MAJOR_OUTAGE]:
-                    downtime_minutes += duration
-                elif previous_status == ServiceStatus.DEGRADED:
-                    # Count degraded as 50% downtime
-                    downtime_minutes += duration * 0.5
-
-                previous_time = change.created_at
-                previous_status = change.status
-
-        # Account for time since last status change
-        duration = (current_time - previous_time).total_seconds() / 60
-        if previous_status in [ServiceStatus.PARTIAL_OUTAGE, ServiceStatus.MAJOR_OUTAGE]:
-            downtime_minutes += duration
-        elif previous_status == ServiceStatus.DEGRADED:
-            downtime_minutes += duration * 0.5
-
-        uptime_percentage = max(0, (total_minutes - downtime_minutes) / total_minutes * 100)
-
-        return round(uptime_percentage, 2)
-
-    def get_status_history_for_service(self, service_id: int, user: User, organization: Organization) -> List[
-        StatusHistoryRead]:
-        with get_db() as db:
-            items = db.query(StatusHistory).filter(
-                StatusHistory.service_id == service_id,
-                StatusHistory.organization_id == organization.organization_id,
-                StatusHistory.is_deleted == False,
-            ).order_by(
-                StatusHistory.created_at.desc()
-            ).all()
-
-            return [StatusHistoryRead.model_validate(item) for item in items]
-
-    def create_status_history(self, status_data: StatusHistoryCreate, user: User,
-                              organization: Organization) -> StatusHistory:
-        with get_db() as db:
-            status_entry = StatusHistory(
-                service_id=status_data.service_id,
-                organization_id=organization.organization_id,
-                status=status_data.status,
-                created_by_id=user.user_id,
+        """Calculate service uptime percentage over specified days, degraded time counts as 50% downtime"""
+        now = datetime.now(timezone.utc)
+
+        async with get_async_db() as db:
+            service = (await db.execute(select(Service).filter(
+                Service.service_id == service_id,
+                Service.organization_id == organization.organization_id,
+                Service.is_deleted == False,
+            ))).scalars().first()
+            if not service:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Service not found"
+                )
+
+            uptimes = await uptime_crud.get_indexed_uptime(db, organization.organization_id, [service],
+                                                           now - timedelta(days=days), now)
+
+        return uptimes[service_id].uptime_percentage(weighted=True)
+
+    async def get_services_uptime(self, start: datetime, end: Optional[datetime], service_ids: Optional[List[int]],
+                                  user: User, organization: Organization) -> List[ServiceUptimeResponse]:
+        """Uptime of the organization's services (or the given ones) over any range, from the downtime counters"""
+        async with get_async_db() as db:
+            query = select(Service).order_by(Service.service_id.desc()).filter(
+                Service.organization_id == organization.organization_id,
+                Service.is_deleted == False,
             )
-            db.add(status_entry)
+            if service_ids:
+                query = query.filter(Service.service_id.in_(service_ids))
+            services = (await db.execute(query)).scalars().all()
 
-            # Optionally update the current status on the service
-            service = db.query(Service).filter(
+            uptimes = await uptime_crud.get_indexed_uptime(db, organization.organization_id, services, start, end)
+
+        return [
+            ServiceUptimeResponse(
+                service_id=service.service_id,
+                name=service.name,
+                start=uptimes[service.service_id].start,
+                end=uptimes[service.service_id].end,
+                uptime_percentage=uptimes[service.service_id].uptime_percentage(),
+                weighted_uptime_percentage=uptimes[service.service_id].uptime_percentage(weighted=True),
+                downtime_seconds=round(uptimes[service.service_id].downtime_seconds, 2),
+                weighted_downtime_seconds=round(uptimes[service.service_id].weighted_downtime_seconds, 2),
+            )
+            for service in services
+        ]
+
+    def _status_history_query(self, service_id: int, organization: Organization, start: Optional[datetime],
+                              end: Optional[datetime]):
+        """Newest first, (created_at, status_history_id) is the keyset, time filters let Postgres prune partitions"""
+        query = select(
+            StatusHistory.status_history_id,
+            StatusHistory.service_id,
+            StatusHistory.status,
+            StatusHistory.created_at,
+            StatusHistory.created_by_id,
+        ).filter(
+            StatusHistory.service_id == service_id,
+            StatusHistory.organization_id == organization.organization_id,
+            StatusHistory.is_deleted == False,
+        ).order_by(
+            StatusHistory.created_at.desc(), StatusHistory.status_history_id.desc()
+        )
+        if start:
+            query = query.filter(StatusHistory.created_at >= start)
+        if end:
+            query = query.filter(StatusHistory.created_at < end)
+        return query
+
+    async def get_status_history_for_service(self, service_id: int, user: User, organization: Organization,
+                                             limit: int = 100, cursor: Optional[Tuple[datetime, int]] = None,
+                                             start: Optional[datetime] = None, end: Optional[datetime] = None
+                                             ) -> Tuple[List[StatusHistoryRead], Optional[Tuple[datetime, int]]]:
+        """
+        One page of status history, newest first, starting after `cursor` (the keyset of the last
+        row of the previous page). Returns the rows and the cursor of the next page, if any.
+        """
+        query = self._status_history_query(service_id, organization, start, end)
+        if cursor:
+            query = query.filter(tuple_(StatusHistory.created_at, StatusHistory.status_history_id) < cursor)
+
+        async with get_async_db() as db:
+            # One extra row tells whether there's a next page
+            rows = (await db.execute(query.limit(limit + 1))).all()
+
+        items = [StatusHistoryRead.model_validate(row) for row in rows[:limit]]
+        next_cursor = (items[-1].created_at, items[-1].status_history_id) if len(rows) > limit else None
+        return items, next_cursor
+
+    async def stream_status_history(self, service_id: int, user: User, organization: Organization,
+                                    start: Optional[datetime] = None,
+                                    end: Optional[datetime] = None) -> AsyncIterator[str]:
+        """
+        Every status history row as NDJSON lines, read through a server side cursor so the export
+        never sits in memory as a whole. Raises 404 up front, before the response starts.
+        """
+        async with get_async_db() as db:
+            exists = (await db.execute(select(Service.service_id).filter(
+                Service.service_id == service_id,
+                Service.organization_id == organization.organization_id,
+                Service.is_deleted == False,
+            ))).scalar()
+        if not exists:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+
+        query = self._status_history_query(service_id, organization, start, end).execution_options(
+            yield_per=STATUS_HISTORY_STREAM_BATCH_SIZE)
+
+        async def lines() -> AsyncIterator[str]:
+            async with get_async_db() as db:
+                result = await db.stream(query)
+                async for row in result:
+                    yield StatusHistoryRead.model_validate(row).model_dump_json() + "\n"
+
+        return lines()
+
+    async def create_status_history(self, status_data: StatusHistoryCreate, user: User, organization: Organization,
+                                    background_tasks: BackgroundTasks) -> StatusHistory:
+        async with get_async_db() as db:
+            service = (await db.execute(select(Service).filter(
                 Service.service_id == status_data.service_id,
                 Service.organization_id == organization.organization_id,
                 Service.is_deleted == False,
-            ).first()
-            if service:
-                service.current_status = status_data.status
+            ))).scalars().first()
+            if not service:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+
+            status_entry = await self._record_status_change(db, service, status_data.status, user, organization)
+            await db.commit()
+            await db.refresh(status_entry)
+            public_status_cache.invalidate(organization.auth0_org_id)
 
-            db.commit()
-            db.refresh(status_entry)
+            # Delivered to every worker, which drop their public snapshots too
+            background_tasks.add_task(
+                broadcast,
+                organization=organization,
+                object=Object.SERVICE,
+                event=Event.BULK_UPDATED,
+                data={
+                    "service_ids": str(service.service_id),
+                    "updated_by": user.name,
+                }
+            )
             return status_entry
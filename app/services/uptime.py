@@ -0,0 +1,173 @@
+"""
+Uptime engine behind every endpoint reporting uptime or downtime.
+
+Nothing here replays raw status history. ServiceCRUD._record_status_changes keeps two indexes
+up to date on every status change, and this engine reads both:
+- cumulative downtime counters on every status_history row and service, where the totals of
+  any range are the difference of the counters at both ends (get_indexed_uptime);
+- daily rollups, where per-day buckets are the rollups plus the status each service is still
+  in (get_daily_downtime).
+Both read the open interval from the same service row.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Service, ServiceStatus, StatusHistory
+from app.services.downtime_matrix import day_start, downtime_matrix, open_interval_arrays, rollup_matrix
+from app.services.rollup import StatusRollupCRUD
+from app.utils.utils import ensure_utc
+
+# Share of the time spent in a status that counts as weighted downtime
+DOWNTIME_WEIGHTS = {
+    ServiceStatus.OPERATIONAL: 0.0,
+    ServiceStatus.MAINTENANCE: 0.0,
+    ServiceStatus.DEGRADED: 0.5,
+    ServiceStatus.PARTIAL_OUTAGE: 1.0,
+    ServiceStatus.MAJOR_OUTAGE: 1.0,
+}
+
+
+@dataclass
+class ServiceUptime:
+    """
+    Downtime of one service over [start, end). Any non-operational status counts fully towards
+    `downtime_seconds`, `weighted_downtime_seconds` applies DOWNTIME_WEIGHTS.
+    """
+    start: datetime
+    end: datetime
+    downtime_seconds: float = 0.0
+    weighted_downtime_seconds: float = 0.0
+
+    @property
+    def period_seconds(self) -> float:
+        return (self.end - self.start).total_seconds()
+
+    def uptime_percentage(self, weighted: bool = False) -> float:
+        if self.period_seconds <= 0:
+            return 100.0
+        downtime = self.weighted_downtime_seconds if weighted else self.downtime_seconds
+        return round(max(0.0, (self.period_seconds - downtime) / self.period_seconds * 100), 2)
+
+
+def advance_counters(downtime_seconds: float, weighted_downtime_seconds: float, status: ServiceStatus,
+                     since: Optional[datetime], at: datetime) -> Tuple[float, float]:
+    """Cumulative downtime counters moved from `since` to `at`, the service being in `status` all along"""
+    if since is None:
+        return downtime_seconds or 0.0, weighted_downtime_seconds or 0.0
+    seconds = max((ensure_utc(at) - ensure_utc(since)).total_seconds(), 0.0)
+    return ((downtime_seconds or 0.0) + (seconds if status != ServiceStatus.OPERATIONAL else 0.0),
+            (weighted_downtime_seconds or 0.0) + seconds * DOWNTIME_WEIGHTS[status])
+
+
+rollup_crud = StatusRollupCRUD()
+
+
+class UptimeCRUD:
+    async def cumulative_downtime_at(self, db: AsyncSession, organization_id: int, service_ids: Sequence[int],
+                                     at: datetime) -> Dict[int, Tuple[float, float]]:
+        """
+        (downtime, weighted downtime) every service accumulated up to `at`. One indexed lookup of the
+        last status change before `at` per service, plus the time spent in that status since.
+
+        Services with nothing recorded at `at`, either created later or with those months archived
+        (app.db.partitions), are anchored on their oldest retained change instead, whose counters
+        hold everything before it. The unknown time in between counts as up.
+        """
+        if not service_ids:
+            return {}
+        last_change = await self._change_counters(db, organization_id, service_ids, select(
+            StatusHistory.status_history_id
+        ).where(
+            StatusHistory.created_at <= at,
+        ).order_by(StatusHistory.created_at.desc(), StatusHistory.status_history_id.desc()))
+
+        counters = {}
+        for service_id, (status, created_at, downtime, weighted_downtime) in last_change.items():
+            if status is not None:
+                counters[service_id] = advance_counters(downtime, weighted_downtime, status, created_at, at)
+
+        missing = [service_id for service_id in service_ids if service_id not in counters]
+        if missing:
+            first_change = await self._change_counters(db, organization_id, missing, select(
+                StatusHistory.status_history_id
+            ).where(
+                StatusHistory.created_at > at,
+            ).order_by(StatusHistory.created_at, StatusHistory.status_history_id))
+            for service_id in missing:
+                _, _, downtime, weighted_downtime = first_change.get(service_id, (None, None, None, None))
+                counters[service_id] = (downtime or 0.0, weighted_downtime or 0.0)
+        return counters
+
+    async def _change_counters(self, db: AsyncSession, organization_id: int, service_ids: Sequence[int],
+                               change_id: Select) -> Dict[int, tuple]:
+        """(status, created_at, downtime, weighted downtime) of the first row `change_id` orders per service"""
+        change_id = change_id.where(
+            StatusHistory.service_id == Service.service_id,
+            StatusHistory.is_deleted == False,
+        ).limit(1).correlate(Service).scalar_subquery()
+
+        rows = await db.execute(select(
+            Service.service_id,
+            StatusHistory.status,
+            StatusHistory.created_at,
+            StatusHistory.cumulative_downtime_seconds,
+            StatusHistory.cumulative_weighted_downtime_seconds,
+        ).select_from(Service).outerjoin(
+            StatusHistory, StatusHistory.status_history_id == change_id
+        ).filter(
+            Service.organization_id == organization_id,
+            Service.service_id.in_(service_ids),
+        ))
+        return {service_id: tuple(values) for service_id, *values in rows}
+
+    async def get_indexed_uptime(self, db: AsyncSession, organization_id: int, services: Sequence[Service],
+                                 start: datetime, end: Optional[datetime] = None) -> Dict[int, ServiceUptime]:
+        """
+        Uptime of many services over any [start, end) from the cumulative downtime counters,
+        the difference of the counters at both ends. An open `end` means now and is read
+        straight from the services.
+        """
+        now = datetime.now(timezone.utc)
+        start, end = ensure_utc(start), min(ensure_utc(end or now), now)
+        service_ids = [s.service_id for s in services]
+
+        at_start = await self.cumulative_downtime_at(db, organization_id, service_ids, start)
+        if end >= now:
+            at_end = {
+                s.service_id: advance_counters(s.cumulative_downtime_seconds, s.cumulative_weighted_downtime_seconds,
+                                               s.current_status, s.status_changed_at, end)
+                for s in services
+            }
+        else:
+            at_end = await self.cumulative_downtime_at(db, organization_id, service_ids, end)
+
+        uptimes = {}
+        for service_id in service_ids:
+            start_downtime, start_weighted = at_start.get(service_id, (0.0, 0.0))
+            end_downtime, end_weighted = at_end.get(service_id, (0.0, 0.0))
+            uptimes[service_id] = ServiceUptime(
+                start=start,
+                end=max(start, end),
+                downtime_seconds=max(end_downtime - start_downtime, 0.0),
+                weighted_downtime_seconds=max(end_weighted - start_weighted, 0.0),
+            )
+        return uptimes
+
+    async def get_daily_downtime(self, db: AsyncSession, organization_id: int, services: Sequence[Service],
+                                 start_day: date, days: int, now: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Downtime seconds and worst severity code of every service (rows) and day (columns) from
+        `start_day` on: the closed intervals from the daily rollups plus the status every service
+        is still in, counted up to `now`.
+        """
+        rollups = await rollup_crud.get_rollup_map(db, organization_id, start_day, now.date())
+        closed_downtime, closed_worst = rollup_matrix([s.service_id for s in services], list(rollups.values()),
+                                                      start_day, days)
+        open_downtime, open_worst = downtime_matrix(open_interval_arrays(services, day_start(start_day)), start_day,
+                                                    days, end=now)
+        return closed_downtime + open_downtime, np.maximum(closed_worst, open_worst)
@@ -1,4 +1,8 @@
+import base64
+import binascii
 import re
+from datetime import datetime, timezone
+from typing import Tuple
 
 def slugify(text):
     text = text.lower()
@@ -24,4 +28,24 @@ def get_username_from_email(email_id: str) -> str:
         return username
     else:
         # If no '@' symbol is found, it's not a valid email format for this extraction
-        return ''
\ No newline at end of file
+        return ''
+
+def ensure_utc(value: datetime) -> datetime:
+    """Treats naive datetimes as UTC so they can be compared with timestamptz values."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing at the (created_at, id) of the last row of a page"""
+    raw = f"{ensure_utc(created_at).isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor, raises ValueError for anything it didn't produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return ensure_utc(datetime.fromisoformat(created_at)), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
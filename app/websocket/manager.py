@@ -1,56 +1,170 @@
-from typing import List, Dict, Any
-from fastapi import WebSocket
-import json
+import asyncio
+import datetime
+from collections import deque
+from typing import List, Dict, Any, Optional, Deque, Tuple
+from fastapi import WebSocket, status
+import orjson
+
+from app.config import settings
+from app.core.metrics import collect_metric
+from app.core.objects import Object, Event
+
+
+class OverflowPolicy:
+    DROP_OLDEST = "drop_oldest"  # Degrade: slow clients skip their oldest pending messages
+    DISCONNECT = "disconnect"  # Close slow clients so they reconnect and resync
+
+
+class ClientConnection:
+    """A WebSocket with its own bounded outbound queue, drained by a dedicated writer task"""
+
+    def __init__(self, websocket: WebSocket, auth0_org_id: str, max_queue_size: int):
+        self.websocket = websocket
+        self.auth0_org_id = auth0_org_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped_messages = 0
+        self.writer: Optional[asyncio.Task] = None
+
+    async def write(self, manager: "ConnectionManager"):
+        try:
+            while True:
+                message = await self.queue.get()
+                await self.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Handle cases where the connection might be closed unexpectedly
+            print(f"Error sending to WebSocket for org {self.auth0_org_id}: {e}")
+            manager.disconnect(self.websocket, self.auth0_org_id)
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, max_queue_size: int = 100, overflow_policy: str = OverflowPolicy.DROP_OLDEST,
+                 replay_buffer_size: int = 500):
         # Dictionary to store active connections, grouped by auth0_org_id
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.active_connections: Dict[str, List[ClientConnection]] = {}
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        # Last (seq, json message) pairs of every organization, replayed to clients reconnecting with `since`
+        self.replay_buffers: Dict[str, Deque[Tuple[int, str]]] = {}
+        self.replay_buffer_size = replay_buffer_size
+        # Counters per auth0_org_id, kept after connections go away
+        self.dropped_messages: Dict[str, int] = {}
+        self.slow_disconnects: Dict[str, int] = {}
+        # Closes of slow clients in flight, referenced until done so they aren't garbage collected
+        self._close_tasks: set = set()
 
-    async def connect(self, websocket: WebSocket, auth0_org_id: str):
+    async def connect(self, websocket: WebSocket, auth0_org_id: str, since: Optional[int] = None,
+                      latest_seq: Optional[int] = None):
         await websocket.accept()
+        connection = ClientConnection(websocket, auth0_org_id, self.max_queue_size)
+        # Nothing is awaited between the replay and registering the connection, so no message can slip in between
+        if since is not None:
+            self._replay(connection, since, latest_seq or 0)
+        connection.writer = asyncio.create_task(connection.write(self))
         if auth0_org_id not in self.active_connections:
             self.active_connections[auth0_org_id] = []
-        self.active_connections[auth0_org_id].append(websocket)
+        self.active_connections[auth0_org_id].append(connection)
         print(
             f"WebSocket connected for organization {auth0_org_id}. Total connections: {len(self.active_connections[auth0_org_id])}")
 
     def disconnect(self, websocket: WebSocket, auth0_org_id: str):
-        if auth0_org_id in self.active_connections:
-            try:
-                self.active_connections[auth0_org_id].remove(websocket)
-                if not self.active_connections[auth0_org_id]:
-                    del self.active_connections[auth0_org_id]  # Clean up empty list
-            except ValueError:
-                # WebSocket might have already been removed or not found
-                pass
+        connections = self.active_connections.get(auth0_org_id, [])
+        connection = next((c for c in connections if c.websocket is websocket), None)
+        if connection:
+            connections.remove(connection)
+            if connection.writer and connection.writer is not asyncio.current_task():
+                connection.writer.cancel()
+            if not connections:
+                del self.active_connections[auth0_org_id]  # Clean up empty list
         print(f"WebSocket disconnected for organization {auth0_org_id}.")
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
     async def broadcast_to_organization(self, auth0_org_id: str, message: Dict[str, Any]):
+        """Queues the message on every connection of the organization without waiting for the sends"""
+        # Convert dictionary message to JSON string once for every subscriber
+        json_message = orjson.dumps(message).decode()
+        if message.get("seq") is not None:
+            if auth0_org_id not in self.replay_buffers:
+                self.replay_buffers[auth0_org_id] = deque(maxlen=self.replay_buffer_size)
+            self.replay_buffers[auth0_org_id].append((message["seq"], json_message))
+
         if auth0_org_id in self.active_connections:
-            # Convert dictionary message to JSON string
-            json_message = json.dumps(message)
-            disconnected_sockets = []
-            for connection in self.active_connections[auth0_org_id]:
-                try:
-                    await connection.send_text(json_message)
-                except RuntimeError as e:
-                    # Handle cases where the connection might be closed unexpectedly
-                    print(f"Error sending to WebSocket for org {auth0_org_id}: {e}")
-                    disconnected_sockets.append(connection)
-                except Exception as e:
-                    print(f"Unexpected error sending to WebSocket for org {auth0_org_id}: {e}")
-                    disconnected_sockets.append(connection)
-            # Remove disconnected sockets
-            for ws in disconnected_sockets:
-                self.active_connections[auth0_org_id].remove(ws)
-            if not self.active_connections[auth0_org_id]:
-                del self.active_connections[auth0_org_id]
+            for connection in list(self.active_connections[auth0_org_id]):
+                self._enqueue(connection, json_message)
         else:
             print(f"No active WebSockets for organization {auth0_org_id}.")
 
+    def _enqueue(self, connection: ClientConnection, json_message: str):
+        if connection.queue.full():
+            connection.dropped_messages += 1
+            self.dropped_messages[connection.auth0_org_id] = self.dropped_messages.get(connection.auth0_org_id, 0) + 1
+
+            if self.overflow_policy == OverflowPolicy.DISCONNECT:
+                print(f"Disconnecting slow WebSocket client for org {connection.auth0_org_id}")
+                self.slow_disconnects[connection.auth0_org_id] = self.slow_disconnects.get(connection.auth0_org_id, 0) + 1
+                self.disconnect(connection.websocket, connection.auth0_org_id)
+                task = asyncio.create_task(self._close(connection.websocket))
+                self._close_tasks.add(task)
+                task.add_done_callback(self._close_tasks.discard)
+                return
+
+            connection.queue.get_nowait()
+        connection.queue.put_nowait(json_message)
+
+    def _replay(self, connection: ClientConnection, since: int, latest_seq: int):
+        """Queues the messages published after `since`, or a resync notice if they aren't all buffered anymore"""
+        buffer = self.replay_buffers.get(connection.auth0_org_id, deque())
+        latest_seq = max(latest_seq, buffer[-1][0] if buffer else 0)
+        if since == latest_seq:
+            return
+
+        missed = [json_message for seq, json_message in buffer if seq > since]
+        gap_buffered = buffer and buffer[0][0] <= since + 1
+        if since > latest_seq or not gap_buffered or len(missed) > self.max_queue_size:
+            connection.queue.put_nowait(orjson.dumps({
+                "object": Object.STREAM.value,
+                "event": Event.RESYNC.value,
+                "org_id": connection.auth0_org_id,
+                "seq": latest_seq,
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "payload": {},
+            }).decode())
+            return
+
+        for json_message in missed:
+            connection.queue.put_nowait(json_message)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception as e:
+            # Usually already gone
+            print(f"Closing slow WebSocket client failed: {e}")
+
+    def queue_depths(self) -> Dict[str, List[int]]:
+        """Pending messages of every connection, per auth0_org_id"""
+        return {auth0_org_id: [c.queue.qsize() for c in connections]
+                for auth0_org_id, connections in self.active_connections.items()}
+
+
+manager = ConnectionManager(max_queue_size=settings.WS_SEND_QUEUE_SIZE, overflow_policy=settings.WS_OVERFLOW_POLICY,
+                            replay_buffer_size=settings.WS_REPLAY_BUFFER_SIZE)
 
-manager = ConnectionManager()
+# Scraped from /metrics, per worker like the request histograms
+collect_metric("websocket_connections", "Open WebSocket connections", "gauge",
+               lambda: {(org_id,): len(depths) for org_id, depths in manager.queue_depths().items()}, ["org_id"])
+collect_metric("websocket_send_queue_messages", "Messages waiting in the send queues of the organization's connections",
+               "gauge", lambda: {(org_id,): sum(depths) for org_id, depths in manager.queue_depths().items()},
+               ["org_id"])
+collect_metric("websocket_send_queue_max_depth", "Pending messages of the organization's most backed up connection",
+               "gauge", lambda: {(org_id,): max(depths) for org_id, depths in manager.queue_depths().items()},
+               ["org_id"])
+collect_metric("websocket_send_queue_capacity", "Messages a connection's send queue holds before overflowing", "gauge",
+               lambda: {(): manager.max_queue_size})
+collect_metric("websocket_dropped_messages_total", "Messages dropped from full send queues", "counter",
+               lambda: {(org_id,): count for org_id, count in manager.dropped_messages.items()}, ["org_id"])
+collect_metric("websocket_slow_disconnects_total", "Connections closed because their send queue was full", "counter",
+               lambda: {(org_id,): count for org_id, count in manager.slow_disconnects.items()}, ["org_id"])
@@ -0,0 +1,156 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import asyncpg
+import orjson
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+from app.db.database import async_engine
+from app.db.models import Organization
+
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD_BYTES = 7900
+
+
+def encode_notification(auth0_org_id: str, message: Dict[str, Any]) -> bytes:
+    """NOTIFY payload of a message, without the message's payload when the whole would be too large"""
+    # Encoded like the messages ConnectionManager sends, the size checked is the one NOTIFY gets
+    payload = orjson.dumps({"org_id": auth0_org_id, "message": message})
+    if len(payload) > MAX_NOTIFY_PAYLOAD_BYTES:
+        # Too large for NOTIFY, clients get the event without its payload and refetch
+        print(f"Broadcast payload for organization {auth0_org_id} too large, sending it truncated")
+        payload = orjson.dumps({"org_id": auth0_org_id, "message": {**message, "payload": {}, "truncated": True}})
+    return payload
+
+
+class PubSubBackend:
+    """
+    Fans broadcast messages out to every worker. `publish` is called once per event,
+    stamps it with the next per-organization sequence number (`seq`) and every
+    worker's `handler` receives it, including the one that published it.
+    """
+
+    async def start(self, handler: MessageHandler):
+        raise NotImplementedError
+
+    async def stop(self):
+        raise NotImplementedError
+
+    async def publish(self, auth0_org_id: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def latest_sequence(self, auth0_org_id: str) -> int:
+        """Sequence number of the last message published for the organization"""
+        raise NotImplementedError
+
+
+class InMemoryPubSub(PubSubBackend):
+    """Single process backend, used for local development and tests"""
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+        self._sequences: Dict[str, int] = {}
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    async def publish(self, auth0_org_id: str, message: Dict[str, Any]):
+        self._sequences[auth0_org_id] = self._sequences.get(auth0_org_id, 0) + 1
+        message = {**message, "seq": self._sequences[auth0_org_id]}
+        if self._handler:
+            await self._handler(auth0_org_id, message)
+
+    async def latest_sequence(self, auth0_org_id: str) -> int:
+        return self._sequences.get(auth0_org_id, 0)
+
+
+class PostgresPubSub(PubSubBackend):
+    """Cross-worker backend built on Postgres LISTEN/NOTIFY"""
+    CHANNEL = "statuspage_events"
+
+    def __init__(self, database_url: str):
+        # asyncpg takes a plain libpq style DSN
+        self._dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._handler: Optional[MessageHandler] = None
+        self._connection: Optional[asyncpg.Connection] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+        await self._listen()
+
+    async def stop(self):
+        self._handler = None
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._connection and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+    async def publish(self, auth0_org_id: str, message: Dict[str, Any]):
+        async with async_engine.begin() as conn:
+            # The row lock taken by the increment is held until commit, which is also when NOTIFY
+            # is delivered, so listeners receive every organization's messages in sequence order
+            # updated_at is set to itself, otherwise its onupdate would stamp every broadcast as an organization edit
+            seq = (await conn.execute(
+                update(Organization).where(Organization.auth0_org_id == auth0_org_id).values(
+                    event_seq=Organization.event_seq + 1, updated_at=Organization.updated_at,
+                ).returning(Organization.event_seq)
+            )).scalar()
+            payload = encode_notification(auth0_org_id, {**message, "seq": seq})
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {"channel": self.CHANNEL, "payload": payload.decode()})
+
+    async def latest_sequence(self, auth0_org_id: str) -> int:
+        async with async_engine.connect() as conn:
+            seq = (await conn.execute(
+                select(Organization.event_seq).where(Organization.auth0_org_id == auth0_org_id)
+            )).scalar()
+        return seq or 0
+
+    async def _listen(self):
+        self._connection = await asyncpg.connect(self._dsn)
+        self._connection.add_termination_listener(self._on_terminated)
+        await self._connection.add_listener(self.CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        if not self._handler:
+            return
+        data = orjson.loads(payload)
+        task = asyncio.create_task(self._handler(data["org_id"], data["message"]))
+        # Keep a reference until the task is done so it isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_terminated(self, connection):
+        if self._handler and (not self._reconnect_task or self._reconnect_task.done()):
+            print("Lost the LISTEN connection, reconnecting")
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        while self._handler:
+            try:
+                await self._listen()
+                return
+            except (OSError, asyncpg.PostgresError) as e:
+                print(f"LISTEN reconnect failed, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+def create_pubsub() -> PubSubBackend:
+    if settings.PUBSUB_BACKEND == "postgres":
+        return PostgresPubSub(settings.DATABASE_URL)
+    return InMemoryPubSub()
+
+
+pubsub = create_pubsub()
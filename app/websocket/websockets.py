@@ -1,8 +1,10 @@
 import datetime
 
+from app.core.cache import public_status_cache
 from app.core.objects import Object, Event
 from app.db import Organization
 from app.websocket.manager import manager
+from app.websocket.pubsub import pubsub
 
 
 async def broadcast(organization: Organization, object: Object, event: Event, data: dict, **kwargs):
@@ -21,4 +23,10 @@ async def broadcast(organization: Organization, object: Object, event: Event, da
 
     print(f"Constructed Socket Data: {socket_data}")
 
-    await manager.broadcast_to_organization(str(organization.auth0_org_id), socket_data)
+    await pubsub.publish(str(organization.auth0_org_id), socket_data)
+
+
+async def deliver(auth0_org_id: str, socket_data: dict):
+    """Runs on every worker for each published message"""
+    public_status_cache.invalidate(auth0_org_id)
+    await manager.broadcast_to_organization(auth0_org_id, socket_data)
@@ -0,0 +1,90 @@
+"""
+Per-request overhead of AuthMiddleware, as a plain ASGI middleware and wrapped the way
+it used to be in BaseHTTPMiddleware. Token verification and the user lookup are stubbed
+so only the middleware plumbing is measured.
+
+Usage:
+    python -m benchmarks.auth_middleware [--requests 5000]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware import auth_middleware
+from app.middleware.auth_middleware import AuthMiddleware
+
+HEADERS = {"Authorization": "Bearer benchmark-token"}
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """The previous BaseHTTPMiddleware based implementation, same auth logic"""
+
+    async def dispatch(self, request: Request, call_next):
+        if AuthMiddleware.is_public(request.url.path):
+            return await call_next(request)
+        await AuthMiddleware.authenticate(self, request)
+        return await call_next(request)
+
+
+async def verify_token(token: str) -> dict:
+    return {"sub": "auth0|benchmark", "org_id": "org_benchmark"}
+
+
+async def resolve_user_and_org(claims: dict):
+    return object(), object()
+
+
+def create_app(middleware=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/services")
+    async def services(request: Request):
+        return {"ok": True}
+
+    if middleware:
+        app.add_middleware(middleware)
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for _ in range(min(requests // 10, 200)):
+            await client.get("/api/services", headers=HEADERS)
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/api/services", headers=HEADERS)
+            assert response.status_code == 200, response.text
+        return (time.perf_counter() - start) / requests * 1_000_000
+
+
+async def run(requests: int):
+    auth_middleware.verify_token = verify_token
+    auth_middleware.resolve_user_and_org = resolve_user_and_org
+
+    baseline = await measure(create_app(), requests)
+    results = {
+        "BaseHTTPMiddleware": await measure(create_app(LegacyAuthMiddleware), requests),
+        "ASGI middleware": await measure(create_app(AuthMiddleware), requests),
+    }
+
+    print(f"{'no middleware':<20} {baseline:8.1f} us/request")
+    for name, elapsed in results.items():
+        print(f"{name:<20} {elapsed:8.1f} us/request  (+{elapsed - baseline:.1f} us overhead)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AuthMiddleware per-request overhead")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests sent to each app")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
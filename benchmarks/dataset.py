@@ -0,0 +1,249 @@
+"""
+Synthetic multi-tenant dataset for the hot path benchmarks: organizations with users,
+services, years of status history, incidents with many updates and their affected services.
+Everything is written to the configured DATABASE_URL (Postgres, or a SQLite file as a
+stand-in), organizations are named `bench-<n>` so they never collide with real ones.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.dataset [--orgs 3] [--services 20] [--years 2]
+        [--changes-per-day 4] [--incidents 200] [--updates 10] [--open-incidents 5] [--seed 0]
+"""
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import BigInteger, Engine, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+
+from app.config import Environment, settings
+from app.db.database import async_engine, engine, get_async_db
+from app.db.migrations import run_migrations
+from app.db.models import (
+    Incident,
+    IncidentImpact,
+    IncidentStatus,
+    IncidentUpdate,
+    Organization,
+    Service,
+    ServiceStatus,
+    StatusHistory,
+    User,
+    service_incident_association,
+)
+from app.db.partitions import add_months, create_partition, is_partitioned, month_start
+from app.services.rollup import StatusRollupCRUD
+from app.services.uptime import advance_counters
+
+ORGANIZATION_PREFIX = "bench-"
+INSERT_BATCH_SIZE = 10000
+# Days of rollups the public status page reads
+ROLLUP_DAYS = 90
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_big_integer(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns, the stand-in needs generated ids
+    return "INTEGER"
+
+
+@dataclass
+class DatasetConfig:
+    orgs: int = 3
+    users: int = 5  # Per organization
+    services: int = 20  # Per organization
+    years: float = 2.0  # Status history and incidents span this far back
+    changes_per_day: float = 4.0  # Status changes per service
+    incidents: int = 200  # Per organization
+    updates: int = 10  # Per incident
+    open_incidents: int = 5  # Per organization, the rest are resolved
+    seed: int = 0
+
+    @property
+    def organization_names(self) -> List[str]:
+        return [f"{ORGANIZATION_PREFIX}{i}" for i in range(self.orgs)]
+
+
+def _insert_returning(conn: Connection, column, rows: List[dict]) -> List[int]:
+    """Inserts the rows and returns their generated ids in the same order"""
+    result = conn.execute(insert(column.table).returning(column, sort_by_parameter_order=True), rows)
+    return list(result.scalars())
+
+
+def _insert_batched(conn: Connection, table, rows: List[dict]):
+    for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+        conn.execute(insert(table), rows[offset:offset + INSERT_BATCH_SIZE])
+
+
+def _status_history(rng: random.Random, service: dict, start: datetime, now: datetime, changes: int,
+                    user_ids: List[int]) -> List[dict]:
+    """Outages of random severity, each followed by a return to operational, with consistent downtime counters"""
+    outages = [ServiceStatus.DEGRADED, ServiceStatus.PARTIAL_OUTAGE, ServiceStatus.MAJOR_OUTAGE,
+               ServiceStatus.MAINTENANCE]
+    span = (now - start).total_seconds()
+    moments = sorted(start + timedelta(seconds=rng.uniform(0, span)) for _ in range(changes))
+
+    rows, status, since = [], ServiceStatus.OPERATIONAL, None
+    downtime, weighted_downtime = 0.0, 0.0
+    for at in moments:
+        downtime, weighted_downtime = advance_counters(downtime, weighted_downtime, status, since, at)
+        status = rng.choice(outages) if status == ServiceStatus.OPERATIONAL else ServiceStatus.OPERATIONAL
+        since = at
+        rows.append({
+            "service_id": service["service_id"],
+            "organization_id": service["organization_id"],
+            "status": status,
+            "created_at": at,
+            "created_by_id": rng.choice(user_ids),
+            "cumulative_downtime_seconds": downtime,
+            "cumulative_weighted_downtime_seconds": weighted_downtime,
+        })
+
+    service.update(current_status=status, status_changed_at=since, cumulative_downtime_seconds=downtime,
+                   cumulative_weighted_downtime_seconds=weighted_downtime)
+    return rows
+
+
+def _ensure_history_partitions(conn: Connection, start: datetime, now: datetime):
+    """Partitioned Postgres rejects rows of months without a partition"""
+    if not is_partitioned(conn):
+        return
+    month = month_start(start.date())
+    while month <= now.date():
+        create_partition(conn, month)
+        month = add_months(month, 1)
+
+
+def _generate_organization(conn: Connection, config: DatasetConfig, name: str, rng: random.Random,
+                           now: datetime) -> Dict[str, int]:
+    start = now - timedelta(days=365 * config.years)
+    organization_id = _insert_returning(conn, Organization.organization_id, [{
+        "name": name, "display_name": name.title(), "auth0_org_id": f"org_{name.replace('-', '_')}",
+        "created_at": start,
+    }])[0]
+    user_ids = _insert_returning(conn, User.user_id, [{
+        "email": f"user{i}@{name}.benchmark.test", "name": f"User {i}", "auth0_id": f"auth0|{name}-{i}",
+        "organization_id": organization_id,
+    } for i in range(config.users)])
+
+    services = [{
+        "name": f"service-{i}", "description": f"Benchmark service {i}", "organization_id": organization_id,
+        "current_status": ServiceStatus.OPERATIONAL, "created_at": start,
+    } for i in range(config.services)]
+
+    # Status history is generated first so the services are inserted with their final status and counters
+    history = []
+    changes = max(int(config.changes_per_day * 365 * config.years), 1)
+    for i, service in enumerate(services):
+        # Temporary id, replaced once the service row exists
+        service["service_id"] = i
+        history.extend(_status_history(rng, service, start, now, changes, user_ids))
+    for service in services:
+        del service["service_id"]
+    service_ids = _insert_returning(conn, Service.service_id, services)
+    for row in history:
+        row["service_id"] = service_ids[row["service_id"]]
+    _insert_batched(conn, StatusHistory.__table__, history)
+
+    span = (now - start).total_seconds()
+    incidents = []
+    for i in range(config.incidents):
+        created_at = start + timedelta(seconds=rng.uniform(0, span))
+        resolved = i >= config.open_incidents
+        incidents.append({
+            "title": f"Benchmark incident {i}", "description": "Synthetic incident", "organization_id": organization_id,
+            "status": IncidentStatus.RESOLVED if resolved else IncidentStatus.INVESTIGATING,
+            "impact": rng.choice(list(IncidentImpact)), "created_at": created_at,
+            "resolved_at": min(created_at + timedelta(hours=rng.uniform(0.5, 12)), now) if resolved else None,
+        })
+    incident_ids = _insert_returning(conn, Incident.incident_id, incidents)
+
+    associations, updates = [], []
+    progression = [IncidentStatus.INVESTIGATING, IncidentStatus.IDENTIFIED, IncidentStatus.MONITORING]
+    for incident_id, incident in zip(incident_ids, incidents):
+        for service_id in rng.sample(service_ids, min(rng.randint(1, 3), len(service_ids))):
+            associations.append({"service_id": service_id, "incident_id": incident_id})
+        for u in range(config.updates):
+            updates.append({
+                "incident_id": incident_id, "organization_id": organization_id,
+                "message": f"Update {u} on {incident['title']}",
+                "status": progression[min(u * len(progression) // max(config.updates, 1), len(progression) - 1)],
+                "created_at": incident["created_at"] + timedelta(minutes=10 * u),
+                "created_by_id": rng.choice(user_ids),
+            })
+    _insert_batched(conn, service_incident_association, associations)
+    _insert_batched(conn, IncidentUpdate.__table__, updates)
+
+    return {"services": len(service_ids), "status_history": len(history), "incidents": len(incident_ids),
+            "incident_updates": len(updates)}
+
+
+def existing_organizations(db_engine: Engine, config: DatasetConfig) -> List[str]:
+    with db_engine.connect() as conn:
+        return list(conn.execute(select(Organization.name).filter(
+            Organization.name.in_(config.organization_names))).scalars())
+
+
+async def _backfill_rollups(names: List[str]):
+    async with get_async_db() as db:
+        organization_ids = (await db.execute(select(Organization.organization_id).filter(
+            Organization.name.in_(names)))).scalars().all()
+        for organization_id in organization_ids:
+            await StatusRollupCRUD().backfill(db, organization_id=organization_id, days=ROLLUP_DAYS)
+    # Pooled connections are bound to this event loop
+    await async_engine.dispose()
+
+
+def generate(config: DatasetConfig, db_engine: Engine = engine) -> Dict[str, int]:
+    """
+    Creates the schema when missing and every configured `bench-<n>` organization that doesn't
+    exist yet. Returns the number of rows written per table.
+    """
+    if settings.ENVIRONMENT == Environment.PROD:
+        raise SystemExit("Refusing to write benchmark data with ENVIRONMENT=PROD")
+
+    run_migrations(db_engine)
+    missing = [name for name in config.organization_names if name not in existing_organizations(db_engine, config)]
+    rng = random.Random(config.seed)
+    now = datetime.now(timezone.utc)
+    totals: Dict[str, int] = {}
+
+    for name in missing:
+        started_at = time.perf_counter()
+        with db_engine.begin() as conn:
+            _ensure_history_partitions(conn, now - timedelta(days=365 * config.years), now)
+            counts = _generate_organization(conn, config, name, rng, now)
+        for table, count in counts.items():
+            totals[table] = totals.get(table, 0) + count
+        print(f"Generated {name} in {time.perf_counter() - started_at:.1f}s: {counts}")
+
+    if missing:
+        # The public status page reads daily rollups, not raw history
+        asyncio.run(_backfill_rollups(missing))
+    return totals
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = DatasetConfig()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+
+
+def config_from_args(args: argparse.Namespace) -> DatasetConfig:
+    return DatasetConfig(**{name: getattr(args, name) for name in asdict(DatasetConfig())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark dataset")
+    add_arguments(parser)
+    config = config_from_args(parser.parse_args())
+    totals = generate(config)
+    print(f"Rows written: {totals or 'none, every organization already exists'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Per-day downtime of a whole organization: the per-service Python loop against the
+vectorized NumPy matrix. Both run on the same synthetic timelines and have to agree.
+
+Usage:
+    python -m benchmarks.downtime_matrix [--services 10 100 1000] [--changes 20] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.db.models import ServiceStatus
+from app.services.downtime_matrix import STATUS_BY_CODE, Timeline, TransitionArrays, day_start, downtime_matrix
+from app.services.rollup import split_by_day, worst_status
+from app.utils.utils import ensure_utc
+
+DAYS = 91
+
+
+def generate_timelines(services: int, changes: int, start: datetime, end: datetime, seed: int = 0):
+    rng = random.Random(seed)
+    statuses = list(ServiceStatus)
+    span = (end - start).total_seconds()
+    timelines = {}
+    for service_id in range(1, services + 1):
+        moments = sorted(start + timedelta(seconds=rng.uniform(0, span)) for _ in range(changes))
+        timelines[service_id] = Timeline(rng.choice(statuses), [(at, rng.choice(statuses)) for at in moments])
+    return timelines
+
+
+def loop_days(timelines, start_day, now):
+    """The per-service, per-day loop the public status page used before the matrix"""
+    start = day_start(start_day)
+    result = {}
+    for service_id, timeline in timelines.items():
+        # day -> [downtime seconds, worst status]
+        buckets = {}
+
+        def add_interval(interval_start, interval_end, status):
+            if status == ServiceStatus.OPERATIONAL or interval_end <= interval_start:
+                return
+            for day, seconds in split_by_day(interval_start, interval_end):
+                bucket = buckets.setdefault(day, [0.0, ServiceStatus.OPERATIONAL])
+                bucket[0] += seconds
+                bucket[1] = worst_status(bucket[1], status)
+
+        status, since = timeline.initial_status, start
+        for at, new_status in timeline.changes:
+            at = min(max(ensure_utc(at), start), now)
+            add_interval(since, at, status)
+            status, since = new_status, max(at, since)
+        add_interval(since, now, status)
+
+        days = []
+        for offset in range(DAYS):
+            seconds, worst = buckets.get(start_day + timedelta(days=offset), (0.0, ServiceStatus.OPERATIONAL))
+            days.append((round(seconds, 2), worst))
+        result[service_id] = days
+    return result
+
+
+def matrix_days(timelines, start_day, now):
+    arrays = TransitionArrays.from_timelines(timelines)
+    downtime, worst = downtime_matrix(arrays, start_day, DAYS, end=now)
+    return {
+        service_id: [(seconds, STATUS_BY_CODE[code]) for seconds, code in zip(row.tolist(), codes.tolist())]
+        for service_id, row, codes in zip(arrays.service_ids.tolist(), np.round(downtime, 2), worst)
+    }
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def check(expected, actual):
+    for service_id, days in expected.items():
+        for (seconds, status), (other_seconds, other_status) in zip(days, actual[service_id]):
+            assert abs(seconds - other_seconds) < 0.02 and status == other_status, service_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized per-day downtime")
+    parser.add_argument("--services", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--changes", type=int, default=20, help="Status changes per service in the window")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    start_day = now.date() - timedelta(days=DAYS - 1)
+
+    print(f"{'services':>8} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for services in args.services:
+        timelines = generate_timelines(services, args.changes, day_start(start_day), now)
+        check(loop_days(timelines, start_day, now), matrix_days(timelines, start_day, now))
+
+        loop_ms = best_of(args.repeat, loop_days, timelines, start_day, now)
+        numpy_ms = best_of(args.repeat, matrix_days, timelines, start_day, now)
+        print(f"{services:>8} {loop_ms:>10.2f} {numpy_ms:>10.2f} {loop_ms / numpy_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
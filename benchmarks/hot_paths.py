@@ -0,0 +1,260 @@
+"""
+Repeatable benchmark of the hot paths on the synthetic dataset (benchmarks.dataset):
+public status page, service list, service uptime, resolving an incident and WebSocket
+fan-out. Runs against the configured DATABASE_URL, a local Postgres or a SQLite file as a
+stand-in. Results are written as JSON and can be compared against a saved baseline, the
+run fails when a benchmark's median regressed by more than the tolerance.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.hot_paths --generate [--iterations 20]
+        [--output results.json] [--baseline baseline.json] [--tolerance 0.2] [dataset options]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+
+from app.DTO.incident import IncidentCreate, IncidentUpdateRequest
+from app.config import settings
+from app.core.objects import Event, Object
+from app.core.responses import dumps
+from app.db.database import async_engine, get_async_db
+from app.db.models import IncidentImpact, IncidentStatus, Organization, Service, User
+from app.services.incident import IncidentService
+from app.services.public import PublicStatusCRUD
+from app.services.services import ServiceCRUD
+from app.websocket.manager import ConnectionManager
+from benchmarks.dataset import DatasetConfig, add_arguments, config_from_args, generate
+
+service_crud = ServiceCRUD()
+incident_service = IncidentService()
+public_status_crud = PublicStatusCRUD()
+
+
+@dataclass
+class Context:
+    organization: Organization
+    user: User
+    service_ids: List[int]
+    iteration: int = 0
+
+
+@dataclass
+class BenchmarkResult:
+    iterations: int
+    min_ms: float
+    median_ms: float
+    p95_ms: float
+    mean_ms: float
+    timings_ms: List[float] = field(repr=False)
+
+
+class FakeWebSocket:
+    """Accepts and discards everything, only the manager's fan-out work is measured"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def load_context(organization_name: str) -> Context:
+    async with get_async_db() as db:
+        organization = (await db.execute(select(Organization).filter(
+            Organization.name == organization_name))).scalars().first()
+        if not organization:
+            raise SystemExit(f"Organization {organization_name} not found, run with --generate first")
+        user = (await db.execute(select(User).filter(
+            User.organization_id == organization.organization_id).order_by(User.user_id))).scalars().first()
+        service_ids = (await db.execute(select(Service.service_id).filter(
+            Service.organization_id == organization.organization_id,
+            Service.is_deleted == False).order_by(Service.service_id))).scalars().all()
+    return Context(organization, user, list(service_ids))
+
+
+async def public_status(context: Context):
+    # What the endpoint does on a cache miss, uncached on purpose since the snapshot would answer every iteration
+    dumps(await public_status_crud.get_status_payload(context.organization.name))
+
+
+async def services_list(context: Context):
+    await service_crud.get_services(context.user, context.organization)
+
+
+async def service_uptime(context: Context):
+    service_id = context.service_ids[context.iteration % len(context.service_ids)]
+    await service_crud.get_service_uptime(service_id, context.user, context.organization, days=90)
+
+
+async def open_incident(context: Context) -> int:
+    """Untimed setup of the resolve benchmark, a major incident on a few services"""
+    affected = [context.service_ids[(context.iteration + i) % len(context.service_ids)] for i in range(3)]
+    incident = await incident_service.create_incident(IncidentCreate(
+        title=f"Benchmark resolve {context.iteration}", impact=IncidentImpact.MAJOR,
+        affected_service_ids=affected,
+    ), context.user, context.organization, BackgroundTasks())
+    return incident.incident_id
+
+
+async def resolve_incident(context: Context, incident_id: int):
+    # Broadcasts are queued as background tasks and not run, the WebSocket benchmark covers them
+    await incident_service.update_incident(incident_id, IncidentUpdateRequest(status=IncidentStatus.RESOLVED),
+                                           context.user, context.organization, BackgroundTasks())
+
+
+async def websocket_broadcast(context: Context, manager: ConnectionManager, messages: int):
+    """Fans `messages` status updates out to every connection and waits until all of them are written"""
+    auth0_org_id = context.organization.auth0_org_id
+    for seq in range(messages):
+        await manager.broadcast_to_organization(auth0_org_id, {
+            "object": Object.SERVICE.value,
+            "event": Event.BULK_UPDATED.value,
+            "org_id": auth0_org_id,
+            "seq": context.iteration * messages + seq,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "payload": {"service_ids": [str(service_id) for service_id in context.service_ids]},
+        })
+    connections = manager.active_connections.get(auth0_org_id, [])
+    while any(not connection.queue.empty() for connection in connections):
+        await asyncio.sleep(0)
+
+
+async def measure(name: str, iterations: int, warmup: int, context: Context,
+                  run: Callable[..., Awaitable], setup: Optional[Callable[[Context], Awaitable]] = None
+                  ) -> BenchmarkResult:
+    timings = []
+    for i in range(warmup + iterations):
+        context.iteration = i
+        args = (await setup(context),) if setup else ()
+        started_at = time.perf_counter()
+        await run(context, *args)
+        if i >= warmup:
+            timings.append((time.perf_counter() - started_at) * 1000)
+
+    timings.sort()
+    result = BenchmarkResult(
+        iterations=iterations,
+        min_ms=round(timings[0], 3),
+        median_ms=round(statistics.median(timings), 3),
+        p95_ms=round(timings[min(int(len(timings) * 0.95), len(timings) - 1)], 3),
+        mean_ms=round(statistics.fmean(timings), 3),
+        timings_ms=[round(t, 3) for t in timings],
+    )
+    print(f"{name:<22} median {result.median_ms:>9.2f} ms  p95 {result.p95_ms:>9.2f} ms  min {result.min_ms:>9.2f} ms",
+          file=sys.stderr)
+    return result
+
+
+async def run_benchmarks(args: argparse.Namespace, config: DatasetConfig) -> Dict[str, BenchmarkResult]:
+    context = await load_context(args.org or config.organization_names[0])
+
+    manager = ConnectionManager(max_queue_size=args.messages + 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.connections):
+            await manager.connect(FakeWebSocket(), context.organization.auth0_org_id)
+
+    benchmarks = {
+        "public_status": dict(run=public_status),
+        "get_services": dict(run=services_list),
+        "get_service_uptime": dict(run=service_uptime),
+        "resolve_incident": dict(run=resolve_incident, setup=open_incident),
+        "websocket_broadcast": dict(run=lambda c: websocket_broadcast(c, manager, args.messages)),
+    }
+
+    results = {}
+    try:
+        for name, benchmark in benchmarks.items():
+            if args.only and name not in args.only:
+                continue
+            # The code under test prints as it goes, keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = await measure(name, args.iterations, args.warmup, context, **benchmark)
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for connection in [c for connections in manager.active_connections.values() for c in connections]:
+                manager.disconnect(connection.websocket, connection.auth0_org_id)
+        await async_engine.dispose()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Prints the median of every benchmark next to the baseline's, returns the ones that regressed"""
+    regressions = []
+    print(f"{'benchmark':<22} {'baseline ms':>12} {'current ms':>11} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<22} {'-':>12} {result['median_ms']:>11.2f}")
+            continue
+        before, after = baseline[name]["median_ms"], result["median_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:<22} {before:>12.2f} {after:>11.2f} {change:>+7.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on the synthetic dataset")
+    parser.add_argument("--generate", action="store_true", help="Create the dataset first when it's missing")
+    parser.add_argument("--org", help="Organization to benchmark, defaults to the first generated one")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--connections", type=int, default=500, help="WebSocket clients of the organization")
+    parser.add_argument("--messages", type=int, default=20, help="Messages broadcast per WebSocket iteration")
+    parser.add_argument("--only", nargs="+", help="Benchmarks to run, defaults to all of them")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Median slowdown over the baseline that fails the run, 0.2 is 20%%")
+    add_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args)
+
+    if args.generate:
+        generate(config)
+
+    results = asyncio.run(run_benchmarks(args, config))
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "database": make_url(settings.DATABASE_URL).get_backend_name(),
+        "python": platform.python_version(),
+        "dataset": asdict(config),
+        "parameters": {"iterations": args.iterations, "warmup": args.warmup, "connections": args.connections,
+                       "messages": args.messages},
+        "results": {name: asdict(result) for name, result in results.items()},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("database") != report["database"] or baseline.get("dataset") != report["dataset"]:
+            print("Baseline was taken on a different database or dataset, the comparison is only indicative")
+        regressions = compare(report["results"], baseline["results"], args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Response building and serialization of the public status page and `GET /api/services/`:
+validated Pydantic models, response_model validation and stdlib JSON against trusted
+dicts / model_construct rendered by orjson. Rows are synthetic and held in memory so only
+the response path is measured, both variants have to produce the same JSON. The compact-v1
+public status is measured too, along with its size next to the default shape.
+
+Usage:
+    python -m benchmarks.serialization [--services 20 100 500] [--requests 200]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+from app.DTO.incident import IncidentRead
+from app.DTO.organization import OrganizationResponse
+from app.DTO.public import CompactPublicStatus, PublicService, PublicServiceHistoryResponse, PublicStatus, \
+    PublicStatusFormat
+from app.DTO.services import ServiceWithHistoryResponse
+from app.core.responses import ORJSONResponse
+from app.db.models import Incident, IncidentImpact, IncidentStatus, Service, ServiceStatus
+from app.services.downtime_matrix import STATUS_BY_CODE
+from app.services.public import HISTORY_DAYS, PublicStatusCRUD
+
+DAYS = HISTORY_DAYS + 1
+
+
+class Dataset:
+    def __init__(self, services: int, seed: int = 0):
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        self.start_day = now.date() - timedelta(days=HISTORY_DAYS)
+        self.services = [
+            Service(service_id=i, name=f"service-{i}", description=f"Service {i}", organization_id=1,
+                    current_status=rng.choice(list(ServiceStatus)), created_at=now - timedelta(days=400),
+                    updated_at=now)
+            for i in range(services)
+        ]
+        self.uptimes = [round(rng.uniform(95, 100), 2) for _ in range(services)]
+        np_rng = np.random.default_rng(seed)
+        self.downtime = np.round(np_rng.exponential(300, (services, DAYS)) * (np_rng.random((services, DAYS)) < 0.2), 2)
+        self.worst = np.where(self.downtime > 0, np_rng.integers(1, len(STATUS_BY_CODE), (services, DAYS)), 0)
+        self.incidents = [
+            Incident(incident_id=i, title=f"Incident {i}", description="Synthetic", organization_id=1,
+                     status=IncidentStatus.RESOLVED, impact=rng.choice(list(IncidentImpact)),
+                     created_at=now - timedelta(days=i), resolved_at=now - timedelta(days=i, hours=-2), updated_at=now)
+            for i in range(10)
+        ]
+        self.incidents_by_service = {s.service_id: self.incidents[:2] for s in self.services}
+
+
+def legacy_public_status(data: Dataset) -> PublicStatus:
+    """How the page was built before: a validated model per service and day"""
+    public_services = []
+    for service, downtime, worst in zip(data.services, data.downtime, data.worst):
+        public_services.append(PublicService(
+            id=service.service_id,
+            name=service.name,
+            description=service.description,
+            current_status=service.current_status,
+            uptime_history=[
+                PublicServiceHistoryResponse(date=data.start_day + timedelta(days=offset), downtime_seconds=seconds,
+                                             status=STATUS_BY_CODE[code])
+                for offset, (seconds, code) in enumerate(zip(downtime.tolist(), worst.tolist()))
+            ],
+        ))
+    return PublicStatus(
+        public_services=public_services,
+        incidents=[IncidentRead.model_validate(i) for i in data.incidents],
+        organization=OrganizationResponse(name="Benchmark", auth0_org_id="org_benchmark"),
+    )
+
+
+def fast_public_status(data: Dataset) -> dict:
+    crud = PublicStatusCRUD()
+    days: List[date] = [data.start_day + timedelta(days=offset) for offset in range(DAYS)]
+    downtime, worst = data.downtime.tolist(), data.worst.tolist()
+    return {
+        "organization": {"auth0_org_id": "org_benchmark", "name": "Benchmark"},
+        "public_services": [
+            crud._build_public_service(service, crud._build_daily_history(days, downtime[i], worst[i]), {}, {})
+            for i, service in enumerate(data.services)
+        ],
+        "incidents": [crud._build_incident(incident) for incident in data.incidents],
+    }
+
+
+def compact_public_status(data: Dataset) -> dict:
+    crud = PublicStatusCRUD()
+    downtime, worst = data.downtime.tolist(), data.worst.tolist()
+    return {
+        "format": PublicStatusFormat.COMPACT_V1,
+        "status_codes": STATUS_BY_CODE,
+        "organization": {"auth0_org_id": "org_benchmark", "name": "Benchmark"},
+        "public_services": [
+            crud._build_public_service(
+                service, {"start_date": data.start_day, "downtime_seconds": downtime[i], "status": worst[i]}, {}, {})
+            for i, service in enumerate(data.services)
+        ],
+        "incidents": [crud._build_incident(incident) for incident in data.incidents],
+    }
+
+
+def legacy_services(data: Dataset) -> List[ServiceWithHistoryResponse]:
+    return [
+        ServiceWithHistoryResponse(service_id=s.service_id, name=s.name, description=s.description,
+                                   current_status=s.current_status, created_at=s.created_at, updated_at=s.updated_at,
+                                   uptime_percentage=uptime)
+        for s, uptime in zip(data.services, data.uptimes)
+    ]
+
+
+def fast_services(data: Dataset) -> List[ServiceWithHistoryResponse]:
+    return [
+        ServiceWithHistoryResponse.model_construct(service_id=s.service_id, name=s.name, description=s.description,
+                                                   current_status=s.current_status, created_at=s.created_at,
+                                                   updated_at=s.updated_at, uptime_percentage=uptime)
+        for s, uptime in zip(data.services, data.uptimes)
+    ]
+
+
+def create_app(data: Dataset) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy/public", response_model=PublicStatus)
+    async def legacy_public():
+        return legacy_public_status(data)
+
+    @app.get("/fast/public", response_model=PublicStatus)
+    async def fast_public():
+        return ORJSONResponse(fast_public_status(data))
+
+    @app.get("/compact/public", response_model=CompactPublicStatus)
+    async def compact_public():
+        return ORJSONResponse(compact_public_status(data))
+
+    @app.get("/legacy/services", response_model=List[ServiceWithHistoryResponse])
+    async def legacy_services_route():
+        return legacy_services(data)
+
+    @app.get("/fast/services", response_model=List[ServiceWithHistoryResponse])
+    async def fast_services_route():
+        return ORJSONResponse(fast_services(data))
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> float:
+    for _ in range(min(requests // 10, 20)):
+        await client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(path)
+        assert response.status_code == 200, response.text
+    return (time.perf_counter() - start) / requests * 1000
+
+
+async def run(services: List[int], requests: int):
+    print(f"{'endpoint':<10} {'services':>8} {'legacy ms':>10} {'orjson ms':>10} {'speedup':>8}")
+    for count in services:
+        app = create_app(Dataset(count))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for endpoint in ("public", "services"):
+                legacy, fast = (await client.get(f"/legacy/{endpoint}")), (await client.get(f"/fast/{endpoint}"))
+                assert json.loads(legacy.content) == json.loads(fast.content), endpoint
+
+                legacy_ms = await measure(client, f"/legacy/{endpoint}", requests)
+                fast_ms = await measure(client, f"/fast/{endpoint}", requests)
+                print(f"{endpoint:<10} {count:>8} {legacy_ms:>10.2f} {fast_ms:>10.2f} {legacy_ms / fast_ms:>7.1f}x")
+
+            default, compact = (await client.get("/fast/public")), (await client.get("/compact/public"))
+            CompactPublicStatus.model_validate_json(compact.content)
+            compact_ms = await measure(client, "/compact/public", requests)
+            print(f"{'compact':<10} {count:>8} {'':>10} {compact_ms:>10.2f} {'':>8}  "
+                  f"{len(compact.content)} bytes, default {len(default.content)} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response building and JSON serialization")
+    parser.add_argument("--services", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and variant")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.services, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Service detail page on a long-lived service: the old joinedload of the whole status
+history against the bounded recent-history query. Runs on a throwaway SQLite database
+filled with `--rows` status changes (100k by default).
+
+Usage:
+    python -m benchmarks.service_detail [--rows 100000] [--limit 10] [--repeat 5] [--max-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import BigInteger, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import joinedload
+
+from app.db.database import Base
+from app.db.models import Organization, Service, ServiceStatus, StatusHistory, User
+from app.services.services import ServiceCRUD
+
+ORGANIZATION_ID, SERVICE_ID, USERS = 1, 1, 20
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_big_integer(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+
+async def populate(engine, rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    statuses = list(ServiceStatus)
+    start = datetime.now(timezone.utc) - timedelta(days=3 * 365)
+    step = timedelta(days=3 * 365) / rows
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Organization), [{
+            "organization_id": ORGANIZATION_ID, "name": "benchmark", "display_name": "Benchmark",
+            "auth0_org_id": "org_benchmark",
+        }])
+        await conn.execute(insert(User), [{
+            "user_id": user_id, "email": f"user{user_id}@benchmark.test", "name": f"User {user_id}",
+            "auth0_id": f"auth0|{user_id}", "organization_id": ORGANIZATION_ID,
+        } for user_id in range(1, USERS + 1)])
+        await conn.execute(insert(Service), [{
+            "service_id": SERVICE_ID, "name": "api", "organization_id": ORGANIZATION_ID,
+            "current_status": ServiceStatus.OPERATIONAL,
+        }])
+        # Inserted out of time order, as concurrent writers and backfills leave them
+        moments = [start + step * i for i in range(rows)]
+        rng.shuffle(moments)
+        for offset in range(0, rows, 10000):
+            await conn.execute(insert(StatusHistory), [{
+                "service_id": SERVICE_ID, "organization_id": ORGANIZATION_ID, "status": rng.choice(statuses),
+                "created_at": at, "created_by_id": rng.randint(1, USERS),
+            } for at in moments[offset:offset + 10000]])
+
+
+async def joinedload_history(session_factory, organization: Organization, limit: int):
+    """What get_service did before: load every row with its user, then slice"""
+    async with session_factory() as db:
+        service = (await db.execute(select(Service).filter(
+            Service.service_id == SERVICE_ID,
+            Service.organization_id == organization.organization_id,
+            Service.is_deleted == False,
+        ).options(
+            joinedload(Service.status_history).joinedload(StatusHistory.created_by)
+        ))).unique().scalars().first()
+        latest = sorted(service.status_history, key=lambda h: (h.created_at, h.status_history_id))[-limit:]
+        return [(h.status_history_id, h.created_by.name) for h in reversed(latest)]
+
+
+async def recent_history(session_factory, organization: Organization, limit: int):
+    async with session_factory() as db:
+        history = await ServiceCRUD().get_recent_status_history(db, SERVICE_ID, organization, limit=limit)
+        return [(h.status_history_id, h.created_by_name) for h in history]
+
+
+async def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+async def run(args) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'benchmark.db')}")
+        session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        try:
+            await populate(engine, args.rows)
+            organization = Organization(organization_id=ORGANIZATION_ID)
+
+            # The old path sorted in Python here, it didn't even guarantee the latest rows
+            expected = await joinedload_history(session_factory, organization, args.limit)
+            assert await recent_history(session_factory, organization, args.limit) == expected
+
+            legacy_ms = await best_of(args.repeat, joinedload_history, session_factory, organization, args.limit)
+            recent_ms = await best_of(args.repeat, recent_history, session_factory, organization, args.limit)
+        finally:
+            await engine.dispose()
+
+    print(f"{'rows':>8} {'joinedload ms':>14} {'recent ms':>10} {'speedup':>8}")
+    print(f"{args.rows:>8} {legacy_ms:>14.2f} {recent_ms:>10.2f} {legacy_ms / recent_ms:>7.1f}x")
+    if args.max_ms is not None and recent_ms > args.max_ms:
+        print(f"Recent history took {recent_ms:.2f} ms, over the {args.max_ms} ms budget")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the service detail history load")
+    parser.add_argument("--rows", type=int, default=100000, help="Status history rows of the service")
+    parser.add_argument("--limit", type=int, default=10, help="Latest rows shown on the detail page")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail when the recent history query is slower")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Tests run against a throwaway SQLite database created by the migrations, through the same
+sync and async engines as the app. Async tests use the anyio pytest plugin.
+"""
+import os
+import tempfile
+
+# Settings are read when app.config is first imported
+os.environ["ENVIRONMENT"] = "CI"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='statuspage-tests-'), 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["PUBSUB_BACKEND"] = "memory"
+for name, value in {
+    "AUTH0_CLIENT_SECRET": "test-secret",
+    "AUTH0_DOMAIN": "tenant.auth0.test",
+    "AUTH0_CLIENT_ID": "test-client",
+    "AUTH0_AUDIENCE": "https://tenant.auth0.test/api/v2/",
+    "AUTH0_CLIENT_AUDIENCE": "test-client-audience",
+    "AUTH0_ALGORITHMS": "RS256",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest
+from sqlalchemy import BigInteger, delete
+from sqlalchemy.ext.compiler import compiles
+
+from app.db.database import Base, async_engine, engine, get_async_db
+from app.db.migrations import run_migrations
+from app.db.models import Organization, User
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_big_integer(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    run_migrations(engine)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database(anyio_backend):
+    """Empty tables for the test, pooled async connections are bound to the test's event loop"""
+    yield
+    await async_engine.dispose()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(table))
+
+
+@pytest.fixture
+async def organization(database) -> Organization:
+    async with get_async_db() as db:
+        organization = Organization(name="acme", display_name="Acme", auth0_org_id="org_acme")
+        db.add(organization)
+    return organization
+
+
+@pytest.fixture
+async def user(organization) -> User:
+    async with get_async_db() as db:
+        user = User(email="ops@acme.test", name="Ops", auth0_id="auth0|ops",
+                    organization_id=organization.organization_id)
+        db.add(user)
+    return user
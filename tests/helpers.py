@@ -0,0 +1,44 @@
+from typing import List
+
+import orjson
+from sqlalchemy import select
+
+from app.db.database import get_async_db
+from app.db.models import Organization, Service, ServiceStatus, StatusHistory
+
+
+async def create_services(organization: Organization, *names: str) -> List[Service]:
+    async with get_async_db() as db:
+        services = [Service(name=name, organization_id=organization.organization_id,
+                            current_status=ServiceStatus.OPERATIONAL) for name in names]
+        db.add_all(services)
+    return services
+
+
+async def service_status(service_id: int) -> ServiceStatus:
+    async with get_async_db() as db:
+        return (await db.execute(select(Service.current_status).filter(Service.service_id == service_id))).scalar()
+
+
+async def status_history(service_id: int) -> List[ServiceStatus]:
+    """Statuses written to the service's history, oldest first"""
+    async with get_async_db() as db:
+        return list((await db.execute(select(StatusHistory.status).filter(
+            StatusHistory.service_id == service_id,
+        ).order_by(StatusHistory.created_at, StatusHistory.status_history_id))).scalars())
+
+
+class RecordingWebSocket:
+    """Client keeping every message it is sent"""
+
+    def __init__(self):
+        self.received: List[dict] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.received.append(orjson.loads(message))
+
+    async def close(self, code: int = 1000):
+        pass
@@ -0,0 +1,111 @@
+"""Auth0 Management API client against a mocked transport"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.core.auth import Auth0Manager
+from app.db.models import Organization, User
+
+pytestmark = pytest.mark.anyio
+
+
+def mocked_manager(handler) -> Auth0Manager:
+    manager = Auth0Manager()
+    manager._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=manager.base_url)
+    return manager
+
+
+def token_response(token: str) -> httpx.Response:
+    return httpx.Response(200, json={"access_token": token, "expires_in": 86400})
+
+
+async def test_token_fetched_once_for_concurrent_callers():
+    token_requests = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal token_requests
+        token_requests += 1
+        # Keeps the fetch in flight while the other callers pile up
+        await asyncio.sleep(0.05)
+        return token_response("token-1")
+
+    manager = mocked_manager(handler)
+
+    tokens = await asyncio.gather(*(manager.get_token() for _ in range(20)))
+
+    assert tokens == ["token-1"] * 20
+    assert token_requests == 1
+    await manager.aclose()
+
+
+async def test_rejected_token_is_refreshed_and_retried_once():
+    tokens = iter(["expired", "fresh"])
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/oauth/token":
+            return token_response(next(tokens))
+        calls.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "Bearer expired":
+            return httpx.Response(401, json={"message": "Invalid token"})
+        return httpx.Response(201, json={"id": "org_1"})
+
+    manager = mocked_manager(handler)
+
+    response = await manager._request("POST", "/api/v2/organizations", json={})
+
+    assert response.status_code == 201
+    assert calls == ["Bearer expired", "Bearer fresh"]
+    assert manager.token == "fresh"
+    await manager.aclose()
+
+
+async def test_second_rejection_is_not_retried():
+    token_requests = 0
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal token_requests, calls
+        if request.url.path == "/oauth/token":
+            token_requests += 1
+            return token_response(f"token-{token_requests}")
+        calls += 1
+        return httpx.Response(401, json={"message": "Invalid token"})
+
+    manager = mocked_manager(handler)
+
+    response = await manager._request("GET", "/api/v2/users")
+
+    assert response.status_code == 401
+    assert (calls, token_requests) == (2, 2)
+    await manager.aclose()
+
+
+async def test_bulk_invites_stay_under_the_concurrency_limit():
+    in_flight = peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        if request.url.path == "/oauth/token":
+            return token_response("token")
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if json.loads(request.content)["invitee"]["email"] == "taken@example.com":
+            return httpx.Response(409, json={"message": "Already a member"})
+        return httpx.Response(200, json={})
+
+    manager = mocked_manager(handler)
+    email_ids = [f"user{i}@example.com" for i in range(30)] + ["taken@example.com", "user0@example.com"]
+
+    results = await manager.invite_users_to_organization(email_ids, User(name="Ops"),
+                                                         Organization(auth0_org_id="org_acme"))
+
+    assert peak == settings.AUTH0_BULK_INVITE_CONCURRENCY
+    assert len(results) == 31
+    assert [result.email_id for result in results if not result.invited] == ["taken@example.com"]
+    await manager.aclose()
@@ -0,0 +1,145 @@
+"""Status of services shared by overlapping incidents, and the history written on the way"""
+import pytest
+from fastapi import BackgroundTasks
+
+from app.DTO.incident import IncidentCreate, IncidentUpdateRequest
+from app.core.cache import public_status_cache
+from app.core.objects import Event, Object
+from app.db.models import IncidentImpact, IncidentStatus, ServiceStatus
+from app.services.incident import IncidentService
+from app.websocket.websockets import broadcast
+from helpers import create_services, service_status, status_history
+
+pytestmark = pytest.mark.anyio
+
+incident_service = IncidentService()
+
+
+async def open_incident(user, organization, impact, *services):
+    return await incident_service.create_incident(IncidentCreate(
+        title=f"{impact.value} incident", impact=impact, affected_service_ids=[s.service_id for s in services],
+    ), user, organization, BackgroundTasks())
+
+
+async def update(incident, user, organization, **changes):
+    return await incident_service.update_incident(incident.incident_id, IncidentUpdateRequest(**changes), user,
+                                                  organization, BackgroundTasks())
+
+
+@pytest.mark.parametrize("impact, expected_status", [
+    (IncidentImpact.MINOR, ServiceStatus.DEGRADED),
+    (IncidentImpact.MAJOR, ServiceStatus.PARTIAL_OUTAGE),
+    (IncidentImpact.CRITICAL, ServiceStatus.MAJOR_OUTAGE),
+])
+async def test_second_incident(user, organization, impact, expected_status):
+    shared, other = await create_services(organization, "api", "web")
+    await open_incident(user, organization, IncidentImpact.MAJOR, shared)
+
+    await open_incident(user, organization, impact, shared, other)
+
+    # A new incident sets the status of all of its services, whatever else affects them
+    assert await service_status(shared.service_id) == expected_status
+    assert await status_history(shared.service_id) == [ServiceStatus.PARTIAL_OUTAGE, expected_status]
+    assert await service_status(other.service_id) == expected_status
+    assert await status_history(other.service_id) == [expected_status]
+
+
+async def test_impact_raised_above_competitor(user, organization):
+    shared, = await create_services(organization, "api")
+    await open_incident(user, organization, IncidentImpact.MAJOR, shared)
+    second = await open_incident(user, organization, IncidentImpact.MINOR, shared)
+
+    await update(second, user, organization, impact=IncidentImpact.CRITICAL)
+
+    assert await service_status(shared.service_id) == ServiceStatus.MAJOR_OUTAGE
+    assert await status_history(shared.service_id) == [ServiceStatus.PARTIAL_OUTAGE, ServiceStatus.DEGRADED,
+                                                       ServiceStatus.MAJOR_OUTAGE]
+
+
+async def test_impact_downgraded_above_competitor(user, organization):
+    shared, alone = await create_services(organization, "api", "web")
+    await open_incident(user, organization, IncidentImpact.MINOR, shared)
+    second = await open_incident(user, organization, IncidentImpact.CRITICAL, shared, alone)
+
+    await update(second, user, organization, impact=IncidentImpact.MAJOR)
+
+    assert await service_status(shared.service_id) == ServiceStatus.PARTIAL_OUTAGE
+    assert await status_history(shared.service_id) == [ServiceStatus.DEGRADED, ServiceStatus.MAJOR_OUTAGE,
+                                                       ServiceStatus.PARTIAL_OUTAGE]
+    assert await status_history(alone.service_id) == [ServiceStatus.MAJOR_OUTAGE, ServiceStatus.PARTIAL_OUTAGE]
+
+
+@pytest.mark.parametrize("competitor", [IncidentImpact.MAJOR, IncidentImpact.CRITICAL])
+async def test_impact_change_blocked_by_equal_or_worse_competitor(user, organization, competitor):
+    shared, alone = await create_services(organization, "api", "web")
+    await open_incident(user, organization, competitor, shared)
+    second = await open_incident(user, organization, IncidentImpact.MINOR, shared, alone)
+
+    await update(second, user, organization, impact=IncidentImpact.MAJOR)
+
+    # The shared service keeps its status, the other one follows the new impact
+    assert await service_status(shared.service_id) == ServiceStatus.DEGRADED
+    assert await status_history(shared.service_id) == [incident_service._status_for_impact(competitor),
+                                                       ServiceStatus.DEGRADED]
+    assert await service_status(alone.service_id) == ServiceStatus.PARTIAL_OUTAGE
+    assert await status_history(alone.service_id) == [ServiceStatus.DEGRADED, ServiceStatus.PARTIAL_OUTAGE]
+
+
+async def test_impact_of_resolved_incident_is_ignored(user, organization):
+    shared, = await create_services(organization, "api")
+    first = await open_incident(user, organization, IncidentImpact.MINOR, shared)
+    await update(first, user, organization, status=IncidentStatus.RESOLVED)
+
+    await update(first, user, organization, impact=IncidentImpact.CRITICAL)
+
+    assert await service_status(shared.service_id) == ServiceStatus.OPERATIONAL
+    assert await status_history(shared.service_id) == [ServiceStatus.DEGRADED, ServiceStatus.OPERATIONAL]
+
+
+@pytest.mark.parametrize("remove", ["resolve", "delete"])
+@pytest.mark.parametrize("removed_impact, remaining_impact", [
+    (IncidentImpact.CRITICAL, IncidentImpact.MINOR),
+    (IncidentImpact.MINOR, IncidentImpact.CRITICAL),
+])
+async def test_incident_removed_while_another_is_open(user, organization, remove, removed_impact, remaining_impact):
+    shared, alone = await create_services(organization, "api", "web")
+    await open_incident(user, organization, remaining_impact, shared)
+    removed = await open_incident(user, organization, removed_impact, shared, alone)
+
+    if remove == "resolve":
+        await update(removed, user, organization, status=IncidentStatus.RESOLVED)
+    else:
+        assert await incident_service.delete_incident(removed.incident_id, user, organization, BackgroundTasks())
+
+    # Still impacted by the open incident, left as it is
+    removed_status = incident_service._status_for_impact(removed_impact)
+    assert await service_status(shared.service_id) == removed_status
+    assert await status_history(shared.service_id) == [incident_service._status_for_impact(remaining_impact),
+                                                       removed_status]
+    assert await service_status(alone.service_id) == ServiceStatus.OPERATIONAL
+    assert await status_history(alone.service_id) == [removed_status, ServiceStatus.OPERATIONAL]
+
+
+async def test_last_incident_resolved(user, organization):
+    first_service, second_service = await create_services(organization, "api", "web")
+    incident = await open_incident(user, organization, IncidentImpact.MAJOR, first_service, second_service)
+
+    await update(incident, user, organization, status=IncidentStatus.RESOLVED)
+
+    for service in (first_service, second_service):
+        assert await service_status(service.service_id) == ServiceStatus.OPERATIONAL
+        assert await status_history(service.service_id) == [ServiceStatus.PARTIAL_OUTAGE, ServiceStatus.OPERATIONAL]
+
+
+async def test_incident_without_status_changes_is_broadcast(user, organization):
+    public_status_cache.set("acme", "default", organization.auth0_org_id, b"{}", public_status_cache.generation)
+    background_tasks = BackgroundTasks()
+
+    incident = await incident_service.create_incident(IncidentCreate(
+        title="Degraded search", impact=IncidentImpact.MINOR, affected_service_ids=[],
+    ), user, organization, background_tasks)
+
+    assert public_status_cache.get("acme", "default") is None
+    assert [(task.func, task.kwargs["object"], task.kwargs["event"], task.kwargs["data"]["incident_id"])
+            for task in background_tasks.tasks] == [(broadcast, Object.INCIDENT, Event.CREATED,
+                                                     str(incident.incident_id))]
@@ -0,0 +1,72 @@
+"""Public status snapshots built while events are broadcast"""
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.DTO.status_history import StatusHistoryCreate
+from app.core.cache import PublicStatusCache, public_status_cache
+from app.core.objects import Event
+from app.db.database import get_async_db
+from app.db.models import Organization, ServiceStatus
+from app.services.services import ServiceCRUD
+from app.websocket.websockets import broadcast
+from helpers import create_services, status_history
+
+service_crud = ServiceCRUD()
+
+
+def test_snapshot_is_stored_despite_events_of_other_organizations():
+    cache = PublicStatusCache(ttl_seconds=60)
+    generation = cache.generation
+
+    cache.invalidate("org_other")
+    cache.set("acme", "default", "org_acme", b"{}", generation)
+
+    assert cache.get("acme", "default").body == b"{}"
+
+
+def test_snapshot_built_across_an_event_of_its_organization_is_not_stored():
+    cache = PublicStatusCache(ttl_seconds=60)
+    cache.invalidate("org_acme")
+    generation = cache.generation
+
+    cache.invalidate("org_acme")
+    snapshot = cache.set("acme", "default", "org_acme", b"{}", generation)
+
+    # Still served to the request that built it
+    assert snapshot.body == b"{}"
+    assert cache.get("acme", "default") is None
+
+    cache.set("acme", "default", "org_acme", b"{}", cache.generation)
+    assert cache.get("acme", "default") is not None
+
+
+@pytest.mark.anyio
+async def test_status_history_write_is_broadcast(user, organization):
+    service, = await create_services(organization, "api")
+    public_status_cache.set("acme", "default", organization.auth0_org_id, b"{}", public_status_cache.generation)
+    background_tasks = BackgroundTasks()
+
+    await service_crud.create_status_history(StatusHistoryCreate(service_id=service.service_id,
+                                                                 status=ServiceStatus.DEGRADED),
+                                             user, organization, background_tasks)
+
+    assert public_status_cache.get("acme", "default") is None
+    # Other workers drop their snapshots when the broadcast is delivered
+    assert [(task.func, task.kwargs["event"], task.kwargs["data"]["service_ids"])
+            for task in background_tasks.tasks] == [(broadcast, Event.BULK_UPDATED, str(service.service_id))]
+
+
+@pytest.mark.anyio
+async def test_status_history_of_another_organization(user, organization):
+    async with get_async_db() as db:
+        other = Organization(name="globex", display_name="Globex", auth0_org_id="org_globex")
+        db.add(other)
+    service, = await create_services(other, "api")
+
+    with pytest.raises(HTTPException) as error:
+        await service_crud.create_status_history(StatusHistoryCreate(service_id=service.service_id,
+                                                                     status=ServiceStatus.DEGRADED),
+                                                 user, organization, BackgroundTasks())
+
+    assert error.value.status_code == 404
+    assert await status_history(service.service_id) == []
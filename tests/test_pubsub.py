@@ -0,0 +1,61 @@
+"""Broadcast fan-out through the pubsub backends"""
+import asyncio
+
+import orjson
+import pytest
+
+from app.websocket.manager import ConnectionManager
+from app.websocket.pubsub import MAX_NOTIFY_PAYLOAD_BYTES, InMemoryPubSub, encode_notification
+from helpers import RecordingWebSocket
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_messages_reach_every_subscriber_of_the_organization():
+    manager = ConnectionManager()
+    pubsub = InMemoryPubSub()
+    await pubsub.start(manager.broadcast_to_organization)
+    subscribers = [RecordingWebSocket(), RecordingWebSocket()]
+    outsider = RecordingWebSocket()
+    for websocket in subscribers:
+        await manager.connect(websocket, "org_acme")
+    await manager.connect(outsider, "org_other")
+
+    message = {"object": "service", "event": "updated", "payload": {"service_id": "1"}}
+    await pubsub.publish("org_acme", message)
+    await pubsub.publish("org_acme", message)
+    await asyncio.sleep(0)
+
+    for websocket in subscribers:
+        assert websocket.received == [{**message, "seq": 1}, {**message, "seq": 2}]
+    assert outsider.received == []
+    # The caller's message isn't stamped in place
+    assert "seq" not in message
+
+    await pubsub.stop()
+    await pubsub.publish("org_acme", message)
+    await asyncio.sleep(0)
+    assert len(subscribers[0].received) == 2
+    assert await pubsub.latest_sequence("org_acme") == 3
+
+    for websocket in subscribers:
+        manager.disconnect(websocket, "org_acme")
+    manager.disconnect(outsider, "org_other")
+
+
+def test_notification_payload():
+    message = {"object": "service", "event": "updated", "seq": 4, "payload": {"service_id": "1"}}
+
+    assert orjson.loads(encode_notification("org_acme", message)) == {"org_id": "org_acme", "message": message}
+
+
+def test_oversized_notification_is_sent_without_its_payload():
+    message = {"object": "service", "event": "bulk_updated", "seq": 4,
+               "payload": {"service_ids": ",".join(str(i) for i in range(5000))}}
+
+    payload = encode_notification("org_acme", message)
+
+    assert len(payload) <= MAX_NOTIFY_PAYLOAD_BYTES
+    assert orjson.loads(payload) == {"org_id": "org_acme", "message": {
+        "object": "service", "event": "bulk_updated", "seq": 4, "payload": {}, "truncated": True,
+    }}
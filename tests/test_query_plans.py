@@ -0,0 +1,111 @@
+"""
+The hot queries have to be answered from the indexes of migration 0002. Statements are
+captured as the app runs them and explained with their own parameters, so a partial index
+predicate that stops matching the rendered soft-delete filter fails here.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import event
+
+from app.DTO.incident import IncidentCreate, IncidentUpdateCreate
+from app.db.database import async_engine, engine
+from app.db.models import IncidentImpact
+from app.services.incident import IncidentService
+from app.services.public import PublicStatusCRUD
+from app.services.services import ServiceCRUD
+from helpers import create_services
+
+pytestmark = pytest.mark.anyio
+
+service_crud = ServiceCRUD()
+incident_service = IncidentService()
+public_status_crud = PublicStatusCRUD()
+
+
+@contextmanager
+def captured_statements() -> Iterator[List[Tuple[str, tuple]]]:
+    """(statement, parameters) of everything the app runs on the async engine inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def query_plan(statements: List[Tuple[str, tuple]], fragment: str) -> str:
+    """EXPLAIN QUERY PLAN of the first captured statement containing `fragment`"""
+    statement, parameters = next((s, p) for s, p in statements if fragment in s)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters)).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.fixture
+async def incident_data(user, organization):
+    services = await create_services(organization, "api", "web", "db")
+    incident = await incident_service.create_incident(IncidentCreate(
+        title="Outage", impact=IncidentImpact.MAJOR, affected_service_ids=[s.service_id for s in services],
+    ), user, organization, BackgroundTasks())
+    await incident_service.create_incident_update(IncidentUpdateCreate(
+        incident_id=incident.incident_id, message="Looking into it",
+    ), user, organization, BackgroundTasks())
+    return services, incident
+
+
+async def test_service_list_uptime_lookup(user, organization, incident_data):
+    with captured_statements() as statements:
+        await service_crud.get_services(user, organization)
+
+    assert "ix_status_history_service_created" in query_plan(statements, "FROM status_history")
+
+
+async def test_status_history_page(user, organization, incident_data):
+    services, _ = incident_data
+    _, cursor = await service_crud.get_status_history_for_service(services[0].service_id, user, organization, limit=1)
+    with captured_statements() as statements:
+        await service_crud.get_status_history_for_service(services[0].service_id, user, organization, limit=1,
+                                                          cursor=cursor)
+
+    assert "ix_status_history_service_created" in query_plan(statements, "FROM status_history")
+
+
+async def test_recent_status_history(user, organization, incident_data):
+    services, _ = incident_data
+    with captured_statements() as statements:
+        await service_crud.get_service(services[0].service_id, user, organization)
+
+    assert "ix_status_history_service_created" in query_plan(statements, "FROM status_history JOIN users")
+
+
+async def test_incident_list(user, organization, incident_data):
+    with captured_statements() as statements:
+        await incident_service.get_all_incidents("false", user, organization)
+
+    assert "ix_incidents_org_created" in query_plan(statements, "FROM incidents")
+
+
+async def test_incident_updates(user, organization, incident_data):
+    _, incident = incident_data
+    with captured_statements() as statements:
+        await incident_service.get_incident_updates(incident.incident_id, user, organization)
+
+    assert "ix_incident_updates_incident_created" in query_plan(statements, "FROM incident_updates")
+
+
+async def test_public_status_page(organization, incident_data):
+    with captured_statements() as statements:
+        await public_status_crud.get_status_payload(organization.name)
+
+    assert "ix_organizations_name" in query_plan(statements, "FROM organizations")
+    # The planner may enter the join from either side, both are indexed
+    incidents_plan = query_plan(statements, "FROM service_incident_association")
+    assert "ix_service_incident_association_" in incidents_plan and "SCAN" not in incidents_plan
+    assert "ix_incident_updates_incident_created" in query_plan(statements, "FROM incident_updates")
@@ -0,0 +1,140 @@
+"""Daily downtime rollups, written live on every status change and rebuilt by the backfill"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+
+from app.DTO.services import ServiceUpdate
+from app.db.database import get_async_db
+from app.db.models import Service, ServiceDailyRollup, ServiceStatus
+from app.services.rollup import StatusRollupCRUD, split_by_day, worst_status
+from app.services.services import ServiceCRUD
+from app.utils.utils import ensure_utc
+
+DAY = 86400
+rollup_crud = StatusRollupCRUD()
+service_crud = ServiceCRUD()
+
+
+def test_split_by_day_across_several_days():
+    start = datetime(2025, 3, 1, 18, 0, tzinfo=timezone.utc)
+    end = datetime(2025, 3, 4, 6, 30, tzinfo=timezone.utc)
+
+    assert list(split_by_day(start, end)) == [
+        (date(2025, 3, 1), 6 * 3600),
+        (date(2025, 3, 2), DAY),
+        (date(2025, 3, 3), DAY),
+        (date(2025, 3, 4), 6.5 * 3600),
+    ]
+
+
+def test_split_by_day_treats_naive_datetimes_as_utc():
+    assert list(split_by_day(datetime(2025, 3, 1, 23), datetime(2025, 3, 2, 1))) == [
+        (date(2025, 3, 1), 3600), (date(2025, 3, 2), 3600),
+    ]
+    assert list(split_by_day(datetime(2025, 3, 2), datetime(2025, 3, 2))) == []
+
+
+def test_worst_status():
+    assert worst_status(ServiceStatus.DEGRADED, ServiceStatus.MAJOR_OUTAGE) == ServiceStatus.MAJOR_OUTAGE
+    assert worst_status(ServiceStatus.MAJOR_OUTAGE, ServiceStatus.MAINTENANCE) == ServiceStatus.MAJOR_OUTAGE
+    assert worst_status(None, ServiceStatus.MAINTENANCE) == ServiceStatus.MAINTENANCE
+    assert worst_status() == ServiceStatus.OPERATIONAL
+
+
+async def change_statuses(user, organization, service, changes):
+    for status, at in changes:
+        async with get_async_db() as db:
+            service = await db.get(Service, service.service_id)
+            await service_crud._record_status_changes(db, [(service, status)], user, organization, changed_at=at)
+
+
+async def rollups(service) -> dict:
+    """day -> (downtime seconds, worst status)"""
+    async with get_async_db() as db:
+        rows = (await db.execute(select(ServiceDailyRollup).filter(
+            ServiceDailyRollup.service_id == service.service_id))).scalars()
+        return {row.day: (row.downtime_seconds, row.worst_status) for row in rows}
+
+
+@pytest.fixture
+def day_start():
+    """Midnight ten days ago, inside the backfill window"""
+    today = datetime.now(timezone.utc).date()
+    return datetime.combine(today - timedelta(days=10), datetime.min.time(), tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def service(organization, day_start):
+    async with get_async_db() as db:
+        service = Service(name="api", organization_id=organization.organization_id,
+                          current_status=ServiceStatus.OPERATIONAL, created_at=day_start - timedelta(days=30),
+                          status_changed_at=day_start - timedelta(days=30))
+        db.add(service)
+    return service
+
+
+@pytest.mark.anyio
+async def test_worst_status_escalates_and_never_deescalates(user, organization, service, day_start):
+    await change_statuses(user, organization, service, [
+        (ServiceStatus.DEGRADED, day_start + timedelta(hours=1)),
+        (ServiceStatus.MAJOR_OUTAGE, day_start + timedelta(hours=2)),
+        (ServiceStatus.DEGRADED, day_start + timedelta(hours=4)),
+        (ServiceStatus.OPERATIONAL, day_start + timedelta(hours=5)),
+    ])
+
+    assert await rollups(service) == {day_start.date(): (4 * 3600, ServiceStatus.MAJOR_OUTAGE)}
+
+
+@pytest.mark.anyio
+async def test_outage_spanning_midnight(user, organization, service, day_start):
+    await change_statuses(user, organization, service, [
+        (ServiceStatus.MAINTENANCE, day_start + timedelta(hours=22)),
+        (ServiceStatus.PARTIAL_OUTAGE, day_start + timedelta(hours=23)),
+        (ServiceStatus.DEGRADED, day_start + timedelta(days=1, hours=2)),
+        (ServiceStatus.OPERATIONAL, day_start + timedelta(days=1, hours=3)),
+    ])
+
+    assert await rollups(service) == {
+        day_start.date(): (2 * 3600, ServiceStatus.PARTIAL_OUTAGE),
+        day_start.date() + timedelta(days=1): (3 * 3600, ServiceStatus.PARTIAL_OUTAGE),
+    }
+
+
+@pytest.mark.anyio
+async def test_backfill_matches_live_rollups_and_is_idempotent(user, organization, service, day_start):
+    await change_statuses(user, organization, service, [
+        (ServiceStatus.DEGRADED, day_start + timedelta(hours=6)),
+        (ServiceStatus.MAJOR_OUTAGE, day_start + timedelta(hours=8)),
+        (ServiceStatus.OPERATIONAL, day_start + timedelta(days=2, hours=1)),
+        (ServiceStatus.MAINTENANCE, day_start + timedelta(days=5)),
+        (ServiceStatus.OPERATIONAL, day_start + timedelta(days=5, hours=3)),
+        # Still open, only counted at read time
+        (ServiceStatus.DEGRADED, day_start + timedelta(days=6)),
+    ])
+    live = await rollups(service)
+    assert live[day_start.date()] == (18 * 3600, ServiceStatus.MAJOR_OUTAGE)
+    assert live[day_start.date() + timedelta(days=2)] == (3600, ServiceStatus.MAJOR_OUTAGE)
+    assert live[day_start.date() + timedelta(days=6)] == (0, ServiceStatus.DEGRADED)
+
+    for _ in range(2):
+        async with get_async_db() as db:
+            assert await rollup_crud.backfill(db, organization_id=organization.organization_id, days=90) == 1
+        assert await rollups(service) == live
+
+
+@pytest.mark.anyio
+async def test_status_changed_through_service_update(user, organization, service, day_start):
+    await change_statuses(user, organization, service, [(ServiceStatus.MAJOR_OUTAGE, day_start)])
+
+    await service_crud.update_service(service.service_id, ServiceUpdate(current_status=ServiceStatus.OPERATIONAL),
+                                      user, organization, BackgroundTasks())
+
+    async with get_async_db() as db:
+        updated = await db.get(Service, service.service_id)
+    assert updated.current_status == ServiceStatus.OPERATIONAL
+    assert ensure_utc(updated.status_changed_at) > day_start + timedelta(days=10)
+    history = await rollups(service)
+    assert history[day_start.date()] == (DAY, ServiceStatus.MAJOR_OUTAGE)
+    assert len(history) == 11
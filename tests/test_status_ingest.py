@@ -0,0 +1,57 @@
+"""Batches of monitor samples against the retained status history"""
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.DTO.status_history import StatusSample
+from app.config import settings
+from app.db.database import get_async_db
+from app.db.models import Service, ServiceStatus
+from app.db.partitions import retention_start
+from app.services.services import ServiceCRUD
+from helpers import create_services, service_status, status_history
+
+pytestmark = pytest.mark.anyio
+
+service_crud = ServiceCRUD()
+
+
+def retained_from() -> datetime:
+    return datetime.combine(retention_start(settings.STATUS_HISTORY_RETENTION_MONTHS), time.min, tzinfo=timezone.utc)
+
+
+async def test_samples_before_the_retention_are_rejected(user, organization):
+    service, = await create_services(organization, "api")
+    samples = [
+        StatusSample(service_id=service.service_id, status=ServiceStatus.DEGRADED),
+        StatusSample(service_id=service.service_id, status=ServiceStatus.MAJOR_OUTAGE,
+                     observed_at=retained_from() - timedelta(seconds=1)),
+        StatusSample(service_id=service.service_id, status=ServiceStatus.OPERATIONAL,
+                     observed_at=datetime(2001, 1, 1)),
+    ]
+
+    with pytest.raises(HTTPException) as error:
+        await service_crud.ingest_status_samples(samples, user, organization, BackgroundTasks())
+
+    assert error.value.status_code == 422
+    assert [detail["loc"] for detail in error.value.detail] == [
+        ["body", "samples", 1, "observed_at"], ["body", "samples", 2, "observed_at"],
+    ]
+    # Nothing of the batch is applied
+    assert await service_status(service.service_id) == ServiceStatus.OPERATIONAL
+    assert await status_history(service.service_id) == []
+
+
+async def test_samples_at_the_start_of_the_retention_are_accepted(user, organization):
+    async with get_async_db() as db:
+        service = Service(name="api", organization_id=organization.organization_id,
+                          current_status=ServiceStatus.OPERATIONAL, status_changed_at=datetime(2001, 1, 1))
+        db.add(service)
+    samples = [StatusSample(service_id=service.service_id, status=ServiceStatus.DEGRADED,
+                            observed_at=retained_from())]
+
+    response = await service_crud.ingest_status_samples(samples, user, organization, BackgroundTasks())
+
+    assert response.written == 1
+    assert await status_history(service.service_id) == [ServiceStatus.DEGRADED]
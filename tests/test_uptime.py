@@ -0,0 +1,144 @@
+"""Uptime of arbitrary ranges from the cumulative downtime counters"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import update
+
+from app.DTO.services import ServiceUpdate
+
+from app.db.database import engine, get_async_db
+from app.db.migrations import m0006_backfill_status_changed_at
+from app.db.models import STATUS_SEVERITY, Service, ServiceStatus, StatusHistory
+from app.services.services import ServiceCRUD
+from app.services.uptime import UptimeCRUD
+
+pytestmark = pytest.mark.anyio
+
+DAY = 86400
+uptime_crud = UptimeCRUD()
+service_crud = ServiceCRUD()
+
+
+async def uptime(organization, service, start, end=None):
+    async with get_async_db() as db:
+        return (await uptime_crud.get_indexed_uptime(db, organization.organization_id, [service], start, end))[
+            service.service_id]
+
+
+async def test_range_starting_before_archived_history(user, organization):
+    """The oldest retained change carries the downtime of the archived months in its counters"""
+    now = datetime.now(timezone.utc)
+    async with get_async_db() as db:
+        service = Service(name="api", organization_id=organization.organization_id, created_at=now - timedelta(days=400),
+                          current_status=ServiceStatus.OPERATIONAL, status_changed_at=now - timedelta(days=99),
+                          cumulative_downtime_seconds=5 * DAY + DAY, cumulative_weighted_downtime_seconds=6 * DAY)
+        db.add(service)
+        await db.flush()
+        db.add_all([
+            StatusHistory(service_id=service.service_id, organization_id=organization.organization_id,
+                          status=ServiceStatus.MAJOR_OUTAGE, created_by_id=user.user_id,
+                          created_at=now - timedelta(days=100), cumulative_downtime_seconds=5 * DAY,
+                          cumulative_weighted_downtime_seconds=5 * DAY),
+            StatusHistory(service_id=service.service_id, organization_id=organization.organization_id,
+                          status=ServiceStatus.OPERATIONAL, created_by_id=user.user_id,
+                          created_at=now - timedelta(days=99), cumulative_downtime_seconds=6 * DAY,
+                          cumulative_weighted_downtime_seconds=6 * DAY),
+        ])
+
+    # Starts in the archived months, only the retained outage day is known to fall inside
+    report = await uptime(organization, service, now - timedelta(days=200))
+    assert report.downtime_seconds == pytest.approx(DAY)
+    assert report.weighted_downtime_seconds == pytest.approx(DAY)
+
+    # Ends before the oldest retained change, nothing is known about it
+    report = await uptime(organization, service, now - timedelta(days=300), now - timedelta(days=150))
+    assert report.downtime_seconds == 0.0
+
+    report = await uptime(organization, service, now - timedelta(days=99, hours=12))
+    assert report.downtime_seconds == pytest.approx(DAY / 2)
+
+
+async def test_backfill_of_services_without_status_changed_at(user, organization):
+    """Databases migrated before 0006: SQLite counters were never backfilled, status_changed_at is NULL"""
+    now = datetime.now(timezone.utc)
+    async with get_async_db() as db:
+        down = Service(name="api", organization_id=organization.organization_id, created_at=now - timedelta(days=2),
+                       current_status=ServiceStatus.MAJOR_OUTAGE)
+        history = Service(name="web", organization_id=organization.organization_id,
+                          created_at=now - timedelta(days=10), current_status=ServiceStatus.DEGRADED)
+        db.add_all([down, history])
+        await db.flush()
+        db.add_all([
+            StatusHistory(service_id=history.service_id, organization_id=organization.organization_id,
+                          status=status, created_by_id=user.user_id, created_at=now - timedelta(days=days))
+            for status, days in [(ServiceStatus.OPERATIONAL, 10), (ServiceStatus.MAJOR_OUTAGE, 6),
+                                 (ServiceStatus.OPERATIONAL, 5), (ServiceStatus.DEGRADED, 1)]
+        ])
+    with engine.begin() as conn:
+        conn.execute(update(Service.__table__).values(status_changed_at=None, cumulative_downtime_seconds=0,
+                                                      cumulative_weighted_downtime_seconds=0))
+        m0006_backfill_status_changed_at.upgrade(conn)
+
+    async with get_async_db() as db:
+        down, history = await db.get(Service, down.service_id), await db.get(Service, history.service_id)
+
+    # Down since it was created
+    report = await uptime(organization, down, now - timedelta(days=30))
+    assert report.downtime_seconds == pytest.approx(2 * DAY, abs=60)
+    assert report.uptime_percentage() < 100
+
+    assert history.cumulative_downtime_seconds == pytest.approx(DAY, abs=1)
+    report = await uptime(organization, history, now - timedelta(days=30))
+    assert report.downtime_seconds == pytest.approx(2 * DAY, abs=60)
+    assert report.weighted_downtime_seconds == pytest.approx(1.5 * DAY, abs=60)
+
+
+async def test_status_set_through_service_update(user, organization):
+    """The outage ended by the update is charged to the counters, not lost with the stale status_changed_at"""
+    now = datetime.now(timezone.utc)
+    async with get_async_db() as db:
+        service = Service(name="api", organization_id=organization.organization_id, created_at=now - timedelta(days=5),
+                          current_status=ServiceStatus.MAJOR_OUTAGE, status_changed_at=now - timedelta(days=2))
+        db.add(service)
+        await db.flush()
+        db.add(StatusHistory(service_id=service.service_id, organization_id=organization.organization_id,
+                             status=ServiceStatus.MAJOR_OUTAGE, created_by_id=user.user_id,
+                             created_at=now - timedelta(days=2)))
+
+    await service_crud.update_service(service.service_id, ServiceUpdate(current_status=ServiceStatus.OPERATIONAL),
+                                      user, organization, BackgroundTasks())
+
+    async with get_async_db() as db:
+        service = await db.get(Service, service.service_id)
+    assert service.cumulative_downtime_seconds == pytest.approx(2 * DAY, abs=60)
+    report = await uptime(organization, service, now - timedelta(days=30))
+    assert report.downtime_seconds == pytest.approx(2 * DAY, abs=60)
+    assert report.weighted_downtime_seconds == pytest.approx(2 * DAY, abs=60)
+
+
+async def test_daily_buckets_add_up_to_the_range_totals(user, organization):
+    now = datetime.now(timezone.utc)
+    start_day = (now - timedelta(days=10)).date()
+    async with get_async_db() as db:
+        service = Service(name="api", organization_id=organization.organization_id, created_at=now - timedelta(days=30),
+                          current_status=ServiceStatus.OPERATIONAL, status_changed_at=now - timedelta(days=30))
+        db.add(service)
+    for status, ago in [(ServiceStatus.MAJOR_OUTAGE, timedelta(days=8, hours=3)),
+                        (ServiceStatus.DEGRADED, timedelta(days=7, hours=20)),
+                        (ServiceStatus.OPERATIONAL, timedelta(days=6)),
+                        # Still open
+                        (ServiceStatus.PARTIAL_OUTAGE, timedelta(hours=5))]:
+        async with get_async_db() as db:
+            service = await db.get(Service, service.service_id)
+            await service_crud._record_status_change(db, service, status, user, organization, changed_at=now - ago)
+
+    async with get_async_db() as db:
+        service = await db.get(Service, service.service_id)
+        downtime, worst = await uptime_crud.get_daily_downtime(db, organization.organization_id, [service], start_day,
+                                                               11, now)
+    report = await uptime(organization, service, datetime.combine(start_day, datetime.min.time(), timezone.utc), now)
+
+    assert downtime.sum() == pytest.approx(report.downtime_seconds, abs=1)
+    assert report.downtime_seconds == pytest.approx(2 * DAY + 3 * 3600 + 5 * 3600, abs=60)
+    assert worst[0].max() == STATUS_SEVERITY[ServiceStatus.MAJOR_OUTAGE]
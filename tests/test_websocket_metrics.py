@@ -0,0 +1,67 @@
+"""WebSocket send queue gauges and overflow counters on /metrics"""
+import asyncio
+
+import pytest
+
+from app.core.metrics import render_metrics
+from app.websocket.manager import OverflowPolicy, manager
+
+pytestmark = pytest.mark.anyio
+
+ORG_ID = "org_metrics"
+
+
+class StalledWebSocket:
+    """Client that never reads, its send queue only fills up"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.Event().wait()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def metric_lines() -> set:
+    return {line for line in render_metrics().splitlines() if f'org_id="{ORG_ID}"' in line}
+
+
+async def test_send_queue_metrics(monkeypatch):
+    monkeypatch.setattr(manager, "max_queue_size", 2)
+    monkeypatch.setattr(manager, "overflow_policy", OverflowPolicy.DROP_OLDEST)
+    sockets = [StalledWebSocket(), StalledWebSocket()]
+    for websocket in sockets:
+        await manager.connect(websocket, ORG_ID)
+
+    # Nothing is awaited in between, the writers don't get to take any message off the queues
+    for seq in range(3):
+        await manager.broadcast_to_organization(ORG_ID, {"event": "updated", "seq": seq})
+
+    assert metric_lines() == {
+        f'websocket_connections{{org_id="{ORG_ID}"}} 2',
+        f'websocket_send_queue_messages{{org_id="{ORG_ID}"}} 4',
+        f'websocket_send_queue_max_depth{{org_id="{ORG_ID}"}} 2',
+        f'websocket_dropped_messages_total{{org_id="{ORG_ID}"}} 2',
+    }
+    assert "websocket_send_queue_capacity 2" in render_metrics().splitlines()
+
+    monkeypatch.setattr(manager, "overflow_policy", OverflowPolicy.DISCONNECT)
+    await manager.broadcast_to_organization(ORG_ID, {"event": "updated", "seq": 3})
+
+    # The closes are kept until they finish
+    assert len(manager._close_tasks) == 2
+    await asyncio.gather(*manager._close_tasks)
+    # Done callbacks run on the next loop iteration
+    await asyncio.sleep(0)
+    assert manager._close_tasks == set()
+
+    # Counters outlive the connections
+    assert metric_lines() == {
+        f'websocket_dropped_messages_total{{org_id="{ORG_ID}"}} 4',
+        f'websocket_slow_disconnects_total{{org_id="{ORG_ID}"}} 2',
+    }
+    manager.dropped_messages.pop(ORG_ID)
+    manager.slow_disconnects.pop(ORG_ID)
+    manager.replay_buffers.pop(ORG_ID)
@@ -0,0 +1,97 @@
+"""Clients reconnecting with ?since=<seq> through the in-memory pubsub"""
+import asyncio
+
+import pytest
+
+from app.core.objects import Event, Object
+from app.websocket.manager import ConnectionManager
+from app.websocket.pubsub import InMemoryPubSub
+from helpers import RecordingWebSocket
+
+pytestmark = pytest.mark.anyio
+
+ORG_ID = "org_acme"
+
+
+@pytest.fixture
+async def fan_out():
+    """(pubsub, manager) wired like the app, the replay buffer keeps the last 3 messages"""
+    manager = ConnectionManager(max_queue_size=10, replay_buffer_size=3)
+    pubsub = InMemoryPubSub()
+    await pubsub.start(manager.broadcast_to_organization)
+    yield pubsub, manager
+    await pubsub.stop()
+    for connections in list(manager.active_connections.values()):
+        for connection in list(connections):
+            manager.disconnect(connection.websocket, connection.auth0_org_id)
+
+
+async def publish(pubsub, count: int, auth0_org_id: str = ORG_ID):
+    for _ in range(count):
+        await pubsub.publish(auth0_org_id, {"object": Object.SERVICE.value, "event": Event.UPDATED.value})
+
+
+async def reconnect(pubsub, manager, since: int) -> RecordingWebSocket:
+    websocket = RecordingWebSocket()
+    await manager.connect(websocket, ORG_ID, since=since, latest_seq=await pubsub.latest_sequence(ORG_ID))
+    # Lets the writer drain the queue
+    for _ in range(3):
+        await asyncio.sleep(0)
+    return websocket
+
+
+async def test_sequence_is_per_organization(fan_out):
+    pubsub, manager = fan_out
+    websocket = RecordingWebSocket()
+    await manager.connect(websocket, ORG_ID)
+
+    await publish(pubsub, 2)
+    await publish(pubsub, 1, "org_other")
+    await publish(pubsub, 1)
+    await asyncio.sleep(0)
+
+    assert [message["seq"] for message in websocket.received] == [1, 2, 3]
+    assert await pubsub.latest_sequence(ORG_ID) == 3
+    assert await pubsub.latest_sequence("org_other") == 1
+
+
+async def test_gap_within_the_buffer_is_replayed(fan_out):
+    pubsub, manager = fan_out
+    await publish(pubsub, 5)
+
+    websocket = await reconnect(pubsub, manager, since=3)
+    await publish(pubsub, 1)
+    await asyncio.sleep(0)
+
+    # Missed messages first, then the live ones
+    assert [message["seq"] for message in websocket.received] == [4, 5, 6]
+
+
+async def test_oldest_buffered_message_is_replayed(fan_out):
+    pubsub, manager = fan_out
+    await publish(pubsub, 5)
+
+    websocket = await reconnect(pubsub, manager, since=2)
+
+    assert [message["seq"] for message in websocket.received] == [3, 4, 5]
+
+
+@pytest.mark.parametrize("since", [1, 0, 9])
+async def test_gap_beyond_the_buffer_asks_for_a_resync(fan_out, since):
+    pubsub, manager = fan_out
+    await publish(pubsub, 5)
+
+    websocket = await reconnect(pubsub, manager, since=since)
+
+    assert [(m["object"], m["event"], m["seq"]) for m in websocket.received] == [
+        (Object.STREAM.value, Event.RESYNC.value, 5),
+    ]
+
+
+async def test_up_to_date_client_gets_nothing(fan_out):
+    pubsub, manager = fan_out
+    await publish(pubsub, 5)
+
+    websocket = await reconnect(pubsub, manager, since=5)
+
+    assert websocket.received == []